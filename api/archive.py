@@ -0,0 +1,87 @@
+# api/archive.py
+# Bulk label changes with users.messages.batchModify (up to 1,000 IDs per call).
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config # Import config directly
+from . import utils
+from . import batching
+
+# batchModify rejects the whole call for one bad ID; only these errors are narrowed down by splitting.
+# Other 400s (e.g. an unknown label) would fail for every half, so they aren't split.
+SPLITTABLE_STATUSES = {400, 404}
+INVALID_ID_MESSAGES = ('Invalid id value', 'Requested entity was not found')
+
+def is_invalid_ids_error(exception):
+    """True when a batchModify HttpError blames the message IDs."""
+    if exception.resp.status not in SPLITTABLE_STATUSES:
+        return False
+    content = exception.content.decode('utf-8', 'replace') if isinstance(exception.content, bytes) else str(exception.content)
+    return any(message in content for message in INVALID_ID_MESSAGES)
+
+def batch_modify(service, msg_ids, remove_label_ids=None, add_label_ids=None, chunk_size=None, max_workers=None):
+    """Applies a label change to message IDs with batchModify, in chunks run concurrently.
+    Each chunk is retried on 429/5xx and transport errors with backoff. A chunk rejected for an invalid ID is split in half
+    and retried, so one bad ID doesn't fail its neighbours; at most config.BATCH_MODIFY_MAX_SPLIT_DEPTH
+    times, which bounds the calls when many IDs are bad.
+    Returns a list of per-chunk results: {'ids', 'ok', 'attempts', 'error', 'retryable'};
+    retryable marks chunks that ran out of retries on a transient error and may succeed if sent again."""
+    from googleapiclient.errors import HttpError
+    msg_ids = list(dict.fromkeys(msg_ids)) # batchModify counts duplicates against the limit
+    if not msg_ids:
+        return []
+    chunk_size = min(chunk_size or config.BATCH_MODIFY_CHUNK_SIZE, config.BATCH_MODIFY_CHUNK_LIMIT)
+    max_workers = max_workers or config.BATCH_WORKERS
+    body = {'ids': None}
+    if remove_label_ids:
+        body['removeLabelIds'] = list(remove_label_ids)
+    if add_label_ids:
+        body['addLabelIds'] = list(add_label_ids)
+
+    messages_resource = service.users().messages() # Build the resource once, not per request
+    # Same scheme as batching.execute_batches: each running chunk gets its own http object
+    idle_https = queue.SimpleQueue()
+    idle_https.put(service._http)
+
+    def modify_chunk(chunk, depth=0):
+        results = []
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                http = idle_https.get_nowait()
+            except queue.Empty:
+                http = batching.new_authorized_http(service)
+            try:
+                messages_resource.batchModify(userId='me', body=dict(body, ids=chunk)).execute(http=http)
+                results.append({'ids': chunk, 'ok': True, 'attempts': attempts, 'error': None, 'retryable': False})
+                return results
+            except Exception as e:
+                # HttpErrors and transport errors alike become this chunk's result; raising would
+                # discard the results of chunks that already succeeded
+                if batching.is_retryable_error(e, 'gmail.users.messages.batchModify') and attempts <= config.BATCH_MAX_RETRIES:
+                    time.sleep(batching.backoff_delay(attempts - 1))
+                    continue
+                if (isinstance(e, HttpError) and is_invalid_ids_error(e) and len(chunk) > 1
+                        and depth < config.BATCH_MODIFY_MAX_SPLIT_DEPTH):
+                    middle = len(chunk) // 2
+                    return modify_chunk(chunk[:middle], depth + 1) + modify_chunk(chunk[middle:], depth + 1)
+                results.append({'ids': chunk, 'ok': False, 'attempts': attempts, 'error': str(e),
+                                'retryable': batching.is_retryable_error(e, 'gmail.users.messages.batchModify')})
+                return results
+            finally:
+                idle_https.put(http)
+
+    chunks = batching.chunked(msg_ids, chunk_size)
+    if utils.should_log(): print(f"--- BATCH MODIFY: {len(msg_ids)} messages in {len(chunks)} chunks of <= {chunk_size} ---")
+    if len(chunks) == 1:
+        return modify_chunk(chunks[0])
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+        return [result for chunk_results in pool.map(modify_chunk, chunks) for result in chunk_results]
+
+def archive_messages(service, msg_ids, chunk_size=None):
+    """Archives messages by removing the INBOX label. Returns (archived IDs, per-chunk results)."""
+    results = batch_modify(service, msg_ids, remove_label_ids=['INBOX'], chunk_size=chunk_size)
+    archived_ids = [msg_id for result in results if result['ok'] for msg_id in result['ids']]
+    return archived_ids, results
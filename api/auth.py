@@ -1,11 +1,12 @@
 import os
 import json
 from flask import Blueprint, redirect, url_for, request, session, flash, get_flashed_messages
-from google_auth_oauthlib.flow import Flow
 
 # Import constants and utils from other modules in the api package
 from . import config # Import config directly
 from . import utils
+from . import scan_index
+from . import sender_archive
 
 # Define the Blueprint
 # Using url_prefix simplifies route definitions within this file
@@ -19,6 +20,8 @@ def get_google_auth_flow(scopes_list=None):
     Falls back to loading from CREDENTIALS_FILE if the env var is not set.
     Uses provided scopes or SCOPES from config as fallback.
     """
+    # google_auth_oauthlib is slow to import and only the OAuth routes need it
+    from google_auth_oauthlib.flow import Flow
     if utils.should_log(): print("--- GET_GOOGLE_AUTH_FLOW START ---")
 
     # Use provided scopes or fallback to config scopes
@@ -83,7 +86,10 @@ def login():
     # --- Check if already authenticated AND not requesting scope upgrade ---
     service = utils.get_gmail_service()
     requested_scope_type = request.args.get('scope') # Get scope early
-    if service and requested_scope_type != 'modify':
+    # Keep optional permissions the user already granted when upgrading another one
+    had_modify_scope = bool(service) and utils.has_modify_scope()
+    had_send_scope = bool(service) and utils.has_send_scope()
+    if service and requested_scope_type not in ('modify', 'send'):
         # The service object doesn't have a credentials attribute, so get creds directly
         creds = utils.load_credentials()
         if utils.should_log(): print(f"User already authenticated (scopes: {creds.scopes if creds and hasattr(creds, 'scopes') else 'N/A'}) and not requesting modify scope. Redirecting to dashboard.")
@@ -108,11 +114,22 @@ def login():
             'https://www.googleapis.com/auth/gmail.modify', 
             'https://www.googleapis.com/auth/gmail.readonly'
         ]
+        if had_send_scope:
+            scopes_for_flow.append(config.SEND_SCOPE)
         # Store return URL for redirecting back after permissions granted
         if return_to_url:
             session['post_auth_redirect'] = return_to_url
             if utils.should_log(): print(f"Stored post-auth redirect URL: {return_to_url}")
         flash("Requesting additional permissions for archiving.", "info")
+    elif requested_scope_type == 'send':
+        if utils.should_log(): print("User requested send scope for automatic mailto unsubscribes")
+        scopes_for_flow = [config.SEND_SCOPE, 'https://www.googleapis.com/auth/gmail.readonly']
+        if had_modify_scope:
+            scopes_for_flow.append(config.MODIFY_SCOPE)
+        if return_to_url:
+            session['post_auth_redirect'] = return_to_url
+            if utils.should_log(): print(f"Stored post-auth redirect URL: {return_to_url}")
+        flash("Requesting permission to send unsubscribe emails.", "info")
     else:
         if utils.should_log(): print("Using default read-only scope")
         scopes_for_flow = config.SCOPES.copy()
@@ -257,8 +274,17 @@ def oauth2callback():
 @auth_bp.route('/logout')
 def logout():
     """Clears the session and logs the user out completely."""
-    # First, clear credentials
+    # First, clear credentials (loading them lets clear_credentials drop the pooled service)
+    utils.load_credentials()
     utils.clear_credentials()
+
+    # Forget this mailbox's scan index
+    index_user = session.get('scan_index_user')
+    index = scan_index.get_scan_index()
+    if index_user and index:
+        index.delete_user(index_user)
+    if index_user:
+        sender_archive.get_job_store().delete_user(index_user)
     
     # Clear all OAuth-related session data
     session.pop('oauth_state', None)
@@ -0,0 +1,245 @@
+# api/batching.py
+# Concurrent execution of Gmail batch requests, with retries and adaptive batch sizing.
+import time
+import queue
+import hashlib
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config # Import config directly
+from . import utils
+from . import metrics
+
+# --- Error Classification ---
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Gmail reports some per-user rate limits as 403 with one of these reasons
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+# Google client imports are deferred into the functions below to keep cold starts light
+
+def _error_status(exception):
+    from googleapiclient.errors import HttpError
+    if isinstance(exception, HttpError):
+        return exception.resp.status
+    return None
+
+def is_rate_limit_error(exception):
+    """True for 429s and Gmail's 403 rate-limit responses."""
+    status = _error_status(exception)
+    if status == 429:
+        return True
+    if status == 403:
+        content = exception.content.decode('utf-8', 'replace') if isinstance(exception.content, bytes) else str(exception.content)
+        return any(reason in content for reason in RATE_LIMIT_REASONS)
+    return False
+
+def is_transport_error(exception):
+    """True for connection-level failures (refused, reset, timed out) that got no HTTP response."""
+    import httplib2
+    from google.auth.exceptions import TransportError
+    return isinstance(exception, (OSError, httplib2.HttpLib2Error, TransportError))
+
+def is_retryable_error(exception, method_id=None):
+    """True for errors worth retrying: rate limits for any method, and transient server or transport
+    errors for methods in config.BATCH_RETRY_SERVER_ERROR_METHODS (those may already have been applied)."""
+    if is_rate_limit_error(exception):
+        return True
+    transient = _error_status(exception) in RETRYABLE_STATUSES or is_transport_error(exception)
+    return transient and method_id in config.BATCH_RETRY_SERVER_ERROR_METHODS
+
+def backoff_delay(attempt):
+    """Exponential backoff with jitter: half the delay is fixed, half is random."""
+    delay = min(config.BATCH_RETRY_MAX_DELAY, config.BATCH_RETRY_BASE_DELAY * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+# --- Adaptive Batch Size ---
+
+class AIMDBatchSizer:
+    """Additive-increase/multiplicative-decrease batch sizing.
+    Shrinks batches when a round hits rate limits and grows them back while rounds stay clean."""
+
+    def __init__(self, initial, minimum, maximum, increase, decrease_factor):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self._size = initial
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        with self._lock:
+            return self._size
+
+    def record(self, rate_limited):
+        """Adjusts the batch size after a round and returns the new size."""
+        with self._lock:
+            if rate_limited:
+                self._size = max(self.minimum, int(self._size * self.decrease_factor))
+            else:
+                self._size = min(self.maximum, self._size + self.increase)
+            return self._size
+
+_sizers = OrderedDict() # credentials digest -> AIMDBatchSizer
+_sizers_lock = threading.Lock()
+
+def _new_sizer():
+    return AIMDBatchSizer(
+        initial=config.BATCH_SIZE,
+        minimum=config.BATCH_SIZE_MIN,
+        maximum=config.BATCH_SIZE,
+        increase=config.BATCH_SIZE_INCREASE,
+        decrease_factor=config.BATCH_SIZE_DECREASE_FACTOR
+    )
+
+def credentials_key(service):
+    """Digest of the service's refresh token (or access token) identifying its user in per-process caches."""
+    credentials = getattr(service._http, 'credentials', None)
+    secret = getattr(credentials, 'refresh_token', None) or getattr(credentials, 'token', None) or ''
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()
+
+def sizer_for(service):
+    """Returns the batch sizer for the service's user. Gmail quotas are per user, so one user's
+    rate limits mustn't shrink batches for everyone else in the process. LRU-bounded."""
+    key = credentials_key(service)
+    with _sizers_lock:
+        sizer = _sizers.get(key)
+        if sizer is None:
+            sizer = _sizers[key] = _new_sizer()
+            while len(_sizers) > config.BATCH_SIZER_CACHE_SIZE:
+                _sizers.popitem(last=False)
+        _sizers.move_to_end(key)
+        return sizer
+
+# --- Execution ---
+
+def gmail_batch_uri(service):
+    """Returns the Gmail-specific batch endpoint for a service."""
+    return f"{service._baseUrl.rstrip('/')}/batch/gmail/v1"
+
+def new_authorized_http(service):
+    """Returns a fresh authorized http object sharing the service's credentials.
+    httplib2 connections aren't thread-safe, so each worker needs its own."""
+    import google_auth_httplib2
+    from googleapiclient.http import build_http
+    credentials = getattr(service._http, 'credentials', None)
+    if credentials is None:
+        return service._http # Unauthenticated (e.g. test) service; nothing to copy
+    return google_auth_httplib2.AuthorizedHttp(credentials, http=build_http())
+
+def chunked(items, size):
+    """Splits a list into consecutive chunks of at most size items."""
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+def execute_batches(service, requests, callback, batch_size=None, max_workers=None,
+                    max_retries=None, sizer=None):
+    """Executes (request_id, HttpRequest) pairs as Gmail batches on a bounded thread pool.
+
+    Requests are split into batches; each running batch uses its own authorized http object.
+    Sub-requests failing with a retryable error (see is_retryable_error) are re-queued and retried
+    in a later round after a jittered exponential backoff; only the failed IDs are resent. A batch
+    rejected as a whole or lost to a transport error (connection refused or reset, timeout) counts
+    as that failure for each of its requests not yet answered. Unless batch_size is fixed,
+    the batch size adapts between rounds with AIMD via sizer (by default the user's, see sizer_for).
+
+    callback(request_id, response, exception) is called exactly once per request with its final
+    outcome, as with BatchHttpRequest; calls are serialized so it needn't be thread-safe.
+    Returns {request_id: {'ok': bool, 'attempts': int, 'error': str or None}}."""
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import BatchHttpRequest
+    outcomes = {}
+    if not requests:
+        return outcomes
+    max_workers = max_workers or config.BATCH_WORKERS
+    max_retries = config.BATCH_MAX_RETRIES if max_retries is None else max_retries
+    sizer = sizer or sizer_for(service)
+    batch_uri = gmail_batch_uri(service)
+    callback_lock = threading.Lock()
+    requests_by_id = dict(requests)
+    attempts = {request_id: 0 for request_id in requests_by_id}
+
+    # Idle http objects. The service's own http is safe to lend out because services are pooled
+    # per thread (utils.get_pooled_service) and the calling thread just waits; extra workers get
+    # a new one, so at most max_workers are created.
+    idle_https = queue.SimpleQueue()
+    idle_https.put(service._http)
+
+    def finish(request_id, response, exception):
+        # Caller holds callback_lock
+        outcomes[request_id] = {
+            'ok': exception is None,
+            'attempts': attempts[request_id],
+            'error': str(exception) if exception is not None else None
+        }
+        callback(request_id, response, exception)
+
+    pending = list(requests_by_id)
+    for attempt in range(max_retries + 1):
+        retry_ids = []
+        rate_limited = []
+        answered = set() # Request IDs that got this round's callback
+        last_attempt = attempt == max_retries
+
+        def round_callback(request_id, response, exception):
+            with callback_lock:
+                if request_id in answered:
+                    return
+                answered.add(request_id)
+                metrics.record_api_call(requests_by_id[request_id].methodId,
+                                        (_error_status(exception) or 'error') if exception is not None else None)
+                attempts[request_id] += 1
+                if (exception is not None and not last_attempt
+                        and is_retryable_error(exception, requests_by_id[request_id].methodId)):
+                    retry_ids.append(request_id)
+                    if is_rate_limit_error(exception):
+                        rate_limited.append(request_id)
+                    return
+                finish(request_id, response, exception)
+
+        def run_batch(chunk):
+            try:
+                http = idle_https.get_nowait()
+            except queue.Empty:
+                http = new_authorized_http(service)
+            try:
+                batch = BatchHttpRequest(batch_uri=batch_uri, callback=round_callback)
+                for request_id in chunk:
+                    batch.add(requests_by_id[request_id], request_id=request_id)
+                started = time.perf_counter()
+                batch.execute(http=http)
+                metrics.record_batch(len(chunk), time.perf_counter() - started)
+            except Exception as e:
+                # The whole batch was rejected (HttpError) or the connection failed; treat it like
+                # every unanswered sub-request failed, so each still gets retried or its one final callback
+                if not isinstance(e, HttpError) and not is_transport_error(e):
+                    print(f"!!! ERROR executing batch: {e!r} !!!")
+                for request_id in chunk:
+                    round_callback(request_id, None, e)
+            finally:
+                idle_https.put(http)
+
+        size = min(batch_size or sizer.size, config.BATCH_SIZE_LIMIT)
+        chunks = chunked(pending, size)
+        if utils.should_log(): print(f"--- BATCHING: attempt {attempt + 1}, {len(pending)} requests in {len(chunks)} batches of <= {size} ---")
+
+        if len(chunks) == 1:
+            run_batch(chunks[0]) # No point spinning up a pool for one round trip
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+                list(pool.map(run_batch, chunks))
+
+        if batch_size is None:
+            new_size = sizer.record(bool(rate_limited))
+            if rate_limited and utils.should_log(): print(f"--- BATCHING: {len(rate_limited)} rate-limited, batch size now {new_size} ---")
+
+        if not retry_ids:
+            break
+        delay = backoff_delay(attempt)
+        if utils.should_log(): print(f"--- BATCHING: re-queueing {len(retry_ids)} requests after {delay:.2f}s ---")
+        time.sleep(delay)
+        pending = retry_ids
+
+    return outcomes
@@ -0,0 +1,506 @@
+# api/cassettes.py
+# Record/replay of Gmail API traffic ("cassettes") for offline regression and performance runs.
+# In record mode every Gmail call, including each call inside a batch, is written to a JSON-lines
+# cassette after PII is pseudonymized. In replay mode the app is served from the cassette instead of
+# the network, with the recorded timings scaled by config.GMAIL_CASSETTE_TIME_SCALE (0 = no waiting).
+import os
+import re
+import json
+import gzip
+import time
+import hmac
+import base64
+import hashlib
+import secrets
+import threading
+from email.parser import BytesParser
+from email.utils import getaddresses, formataddr
+from urllib.parse import urlparse, parse_qsl, urlencode, quote, unquote
+
+from . import config # Import config directly
+from . import utils
+from . import extract
+
+CASSETTE_VERSION = 1
+BATCH_PATH_SUFFIXES = ('/batch/gmail/v1', '/batch')
+
+# --- Batch Wire Format ---
+
+def _http_reason(status):
+    from http.client import responses
+    return responses.get(status, 'Unknown')
+
+def _split_multipart(content_type, body):
+    message = BytesParser().parsebytes(b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body)
+    for part in message.get_payload():
+        raw = part.get_payload(decode=False)
+        raw = raw if isinstance(raw, str) else str(raw)
+        head, _, part_body = raw.replace('\r\n', '\n').partition('\n\n')
+        lines = head.split('\n')
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        yield part.get('Content-ID', ''), lines[0], headers, part_body.strip() or None
+
+def parse_batch_request(content_type, body):
+    """Splits a multipart/mixed batch request into [(content_id, method, target, headers, body)]."""
+    calls = []
+    for content_id, request_line, headers, part_body in _split_multipart(content_type, body):
+        method, target = request_line.split(' ')[:2]
+        calls.append((content_id, method, target, headers, part_body))
+    return calls
+
+def parse_batch_response(content_type, body):
+    """Splits a multipart/mixed batch response into {request content_id: (status, content_type, body)}."""
+    responses = {}
+    for content_id, status_line, headers, part_body in _split_multipart(content_type, body):
+        status = int(status_line.split(' ')[1])
+        request_id = content_id.replace('<response-', '<', 1)
+        responses[request_id] = (status, headers.get('content-type', 'application/json'), part_body)
+    return responses
+
+def format_batch_response(responses, boundary):
+    """Builds a multipart/mixed batch response body from [(content_id, status, body text or None)]."""
+    chunks = []
+    for content_id, status, body in responses:
+        response_id = content_id.replace('<', '<response-', 1) if content_id else ''
+        body = body or ''
+        chunks.append(f'--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {response_id}\r\n\r\n'
+                      f'HTTP/1.1 {status} {_http_reason(status)}\r\n'
+                      f'Content-Type: application/json; charset=UTF-8\r\nContent-Length: {len(body.encode())}\r\n\r\n'
+                      f'{body}\r\n')
+    chunks.append(f'--{boundary}--\r\n')
+    return ''.join(chunks).encode('utf-8')
+
+def is_batch_uri(uri):
+    return urlparse(uri).path.rstrip('/').endswith(BATCH_PATH_SUFFIXES)
+
+# --- Request Keys ---
+
+def request_key(method, uri, body=None):
+    """Matches a recorded call to a replayed one: method, path and sorted query, plus a body digest.
+    Host and base path differences (real API, stand-in) don't matter."""
+    parsed = urlparse(uri)
+    path = parsed.path
+    gmail_index = path.find('/gmail/v1/')
+    if gmail_index > 0:
+        path = path[gmail_index:]
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    key = f'{method} {path}?{query}'
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        except ValueError:
+            pass
+        key += ' #' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:16]
+    return key
+
+def _without_body_digest(key):
+    return key.split(' #', 1)[0]
+
+# --- Sanitization ---
+
+# Words kept when masking text: what link scoring and search depend on. Everything else becomes x's.
+KEEP_WORDS = frozenset(
+    word
+    for term in config.UNSUBSCRIBE_SEARCH_TERMS + config.UNSUBSCRIBE_SEARCH_TERMS_ES_PT
+    for word in term.strip('"').lower().split()
+) | frozenset(('unsubscribe', 'opt', 'out', 'cancel', 'subscription', 'newsletter', 'preferences',
+               'preference', 'manage', 'click', 'here', 'email', 'update', 'your', 'list', 'this', 'from',
+               'view', 'browser', 'privacy', 'policy', 'optout'))
+
+WORD_RE = re.compile(r'[^\W\d_]+')
+DIGIT_RE = re.compile(r'\d')
+ADDRESS_RE = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+HTML_SPLIT_RE = re.compile(r'(<[^>]*>)')
+URL_ATTRIBUTE_RE = re.compile(r'''((?:href|src)\s*=\s*)(["'])(.*?)\2''', re.IGNORECASE | re.DOTALL)
+TEXT_ATTRIBUTE_RE = re.compile(r'''((?:alt|title)\s*=\s*)(["'])(.*?)\2''', re.IGNORECASE | re.DOTALL)
+TEXT_URL_RE = re.compile(r'(?:https?|mailto):[^\s<>"\')\]]+', re.IGNORECASE)
+HEADER_URL_RE = re.compile(r'<([^>]+)>|((?:https?|mailto):[^\s,]+)', re.IGNORECASE)
+# Path segments that look like tokens rather than words
+TOKEN_SEGMENT_RE = re.compile(r'^(?=.*\d)[\w-]{8,}$|^[\w-]{24,}$')
+
+ADDRESS_HEADERS = frozenset(('from', 'to', 'cc', 'bcc', 'reply-to', 'sender', 'delivered-to', 'return-path'))
+UNSUBSCRIBE_HEADERS = frozenset(('list-unsubscribe', 'x-list-unsubscribe'))
+KEPT_HEADERS = frozenset(('list-unsubscribe-post', 'content-type', 'content-transfer-encoding',
+                          'mime-version', 'date'))
+TEXT_HEADERS = frozenset(('subject',))
+
+class Sanitizer:
+    """Pseudonymizes PII in Gmail API traffic, deterministically for one salt.
+    Email local parts and display names become stable pseudonyms (sender domains are kept, so grouping
+    still works); text keeps its length and structure but only the words link scoring looks at;
+    URL tokens and query values are hashed; the mailbox owner's address becomes me@example.org.
+    Headers not needed by the app are masked."""
+
+    def __init__(self, salt=None, owner_address=None):
+        self.salt = (salt or secrets.token_hex(16)).encode('utf-8')
+        self.owner_address = (owner_address or '').lower()
+
+    def _digest(self, value, length):
+        digest = hmac.new(self.salt, value.encode('utf-8'), hashlib.sha256).hexdigest()
+        return (digest * (length // len(digest) + 1))[:length]
+
+    # --- Strings ---
+
+    def address(self, address):
+        local, _, domain = address.rpartition('@')
+        if not local:
+            return address
+        if address.lower() == self.owner_address:
+            return 'me@example.org'
+        return f'u{self._digest(address.lower(), 10)}@{domain.lower()}'
+
+    def addresses_in(self, text):
+        return ADDRESS_RE.sub(lambda match: self.address(match.group(0)), text)
+
+    def display_name(self, name):
+        return f'Sender {self._digest(name, 6)}' if name else ''
+
+    def text(self, text):
+        """Masks words outside KEEP_WORDS and digits, after pseudonymizing addresses and URLs."""
+        pieces = []
+        last = 0
+        for match in TEXT_URL_RE.finditer(text):
+            pieces.append(self._mask_words(self.addresses_in(text[last:match.start()])))
+            pieces.append(self.url(match.group(0)))
+            last = match.end()
+        pieces.append(self._mask_words(self.addresses_in(text[last:])))
+        return ''.join(pieces)
+
+    def _mask_words(self, text):
+        # Pseudonymized addresses are already safe; mask everything else word by word
+        parts = ADDRESS_RE.split(text)
+        found = ADDRESS_RE.findall(text)
+        out = []
+        for index, part in enumerate(parts):
+            out.append(DIGIT_RE.sub('0', WORD_RE.sub(lambda m: m.group(0) if m.group(0).lower() in KEEP_WORDS
+                                                      else 'x' * len(m.group(0)), part)))
+            if index < len(found):
+                out.append(found[index])
+        return ''.join(out)
+
+    def url(self, url):
+        """Keeps scheme, host and word-like path segments; hashes tokens and query values.
+        Query values holding another URL (tracking redirects) are sanitized recursively."""
+        if url.lower().startswith('mailto:'):
+            address, _, query = url[7:].partition('?')
+            sanitized = 'mailto:' + self.address(unquote(address))
+            if query:
+                pairs = [(key, self.text(value)) for key, value in parse_qsl(query, keep_blank_values=True)]
+                sanitized += '?' + urlencode(pairs, quote_via=quote)
+            return sanitized
+        parsed = urlparse(url)
+        segments = [self._digest(segment, len(segment)) if TOKEN_SEGMENT_RE.match(segment) else segment
+                    for segment in parsed.path.split('/')]
+        pairs = []
+        for key, value in parse_qsl(parsed.query, keep_blank_values=True):
+            if value.lower().startswith(('http://', 'https://', 'mailto:')):
+                pairs.append((key, self.url(value)))
+            elif value:
+                pairs.append((key, self._digest(value, len(value))))
+            else:
+                pairs.append((key, value))
+        sanitized = parsed._replace(path='/'.join(segments), query=urlencode(pairs), fragment='',
+                                    netloc=parsed.netloc.rpartition('@')[2]) # Drop any userinfo
+        return sanitized.geturl()
+
+    def html(self, html):
+        pieces = []
+        for piece in HTML_SPLIT_RE.split(html):
+            if piece.startswith('<'):
+                piece = URL_ATTRIBUTE_RE.sub(lambda m: m.group(1) + m.group(2) + self.url(m.group(3)) + m.group(2), piece)
+                piece = TEXT_ATTRIBUTE_RE.sub(lambda m: m.group(1) + m.group(2) + self.text(m.group(3)) + m.group(2), piece)
+                pieces.append(piece)
+            else:
+                pieces.append(self.text(piece))
+        return ''.join(pieces)
+
+    # --- Gmail Resources ---
+
+    def header(self, name, value):
+        lowered = name.lower()
+        if lowered in ADDRESS_HEADERS:
+            return ', '.join(formataddr((self.display_name(display), self.address(address)))
+                             if address else self.display_name(display)
+                             for display, address in getaddresses([value]))
+        if lowered in UNSUBSCRIBE_HEADERS:
+            return HEADER_URL_RE.sub(lambda m: f'<{self.url(m.group(1))}>' if m.group(1) else self.url(m.group(2)), value)
+        if lowered in KEPT_HEADERS:
+            return value
+        if lowered in TEXT_HEADERS:
+            return self.text(value)
+        return 'x' * len(value)
+
+    def part(self, part):
+        part = dict(part)
+        part['headers'] = [{'name': h.get('name', ''), 'value': self.header(h.get('name', ''), h.get('value', ''))}
+                           for h in part.get('headers', []) or []]
+        if part.get('filename'):
+            part['filename'] = self.text(part['filename'])
+        body = dict(part.get('body') or {})
+        if body.get('attachmentId'):
+            body['attachmentId'] = self._digest(body['attachmentId'], 32)
+        data = body.get('data')
+        mime_type = part.get('mimeType', '')
+        if data and mime_type in ('text/html', 'text/plain') and not part.get('filename'):
+            charset = extract.get_part_charset(part)
+            text = ''.join(extract.iter_part_text(part, max_bytes=len(data)))
+            text = self.html(text) if mime_type == 'text/html' else self.text(text)
+            encoded = text.encode(charset, errors='xmlcharrefreplace')
+            body['data'] = base64.urlsafe_b64encode(encoded).decode('ascii').rstrip('=')
+            body['size'] = len(encoded)
+        elif data:
+            body.pop('data') # Attachment content is never kept
+        part['body'] = body
+        if part.get('parts'):
+            part['parts'] = [self.part(sub_part) for sub_part in part['parts']]
+        return part
+
+    def resource(self, value):
+        """Sanitizes any decoded Gmail JSON response."""
+        if isinstance(value, list):
+            return [self.resource(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        sanitized = {}
+        for key, item in value.items():
+            if key == 'payload' and isinstance(item, dict):
+                sanitized[key] = self.part(item)
+            elif key == 'snippet' and isinstance(item, str):
+                sanitized[key] = self.text(item)
+            elif key == 'emailAddress' and isinstance(item, str):
+                self.owner_address = item.lower() # users.getProfile names the mailbox owner
+                sanitized[key] = self.address(item)
+            elif key == 'raw' and isinstance(item, str):
+                sanitized[key] = '' # Full RFC 822 messages (messages.send) are never kept
+            else:
+                sanitized[key] = self.resource(item)
+        return sanitized
+
+    def body_text(self, body):
+        """Sanitizes a JSON request or response body given as text."""
+        if not body:
+            return body
+        try:
+            return json.dumps(self.resource(json.loads(body)), separators=(',', ':'), ensure_ascii=False)
+        except ValueError:
+            return 'x' * len(body)
+
+    def uri(self, uri):
+        """Sanitizes a request URI: search queries may name senders (from:address)."""
+        parsed = urlparse(uri)
+        pairs = [(key, self.addresses_in(value) if key == 'q' else value)
+                 for key, value in parse_qsl(parsed.query, keep_blank_values=True)]
+        path = parsed.path
+        gmail_index = path.find('/gmail/v1/')
+        if gmail_index > 0:
+            path = path[gmail_index:]
+        return parsed._replace(scheme='', netloc='', path=path, query=urlencode(pairs)).geturl()
+
+# --- Cassette Files ---
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+class Cassette:
+    """A JSON-lines file: one metadata line, then one line per recorded call.
+    Call lines: {'key', 'method', 'uri', 'status', 'content_type', 'body', 'elapsed_ms', 'batch'}.
+    Gzipped when the path ends in .gz. Appends are thread-safe."""
+
+    def __init__(self, path, meta=None, entries=None):
+        self.path = path
+        self.meta = meta or {}
+        self.entries = entries or []
+        self._lock = threading.Lock()
+        self._queues = None
+        self._positions = {}
+
+    @classmethod
+    def load(cls, path):
+        with _open(path, 'r') as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if not lines or lines[0].get('cassette') != CASSETTE_VERSION:
+            raise ValueError(f"{path} is not a version {CASSETTE_VERSION} cassette")
+        return cls(path, meta=lines[0], entries=lines[1:])
+
+    @classmethod
+    def create(cls, path, **meta):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        meta = dict(meta, cassette=CASSETTE_VERSION, recorded_at=time.strftime('%Y-%m-%dT%H:%M:%S'))
+        with _open(path, 'w') as f:
+            f.write(json.dumps(meta) + '\n')
+        return cls(path, meta=meta)
+
+    def append(self, entry):
+        with self._lock:
+            self.entries.append(entry)
+            with _open(self.path, 'a') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def next_response(self, key):
+        """Returns the next recorded entry for key. Calls recorded several times (paging, history)
+        replay in order; once exhausted the last one repeats. Falls back to ignoring the body."""
+        with self._lock:
+            if self._queues is None:
+                self._queues = {}
+                for entry in self.entries:
+                    self._queues.setdefault(entry['key'], []).append(entry)
+                    self._queues.setdefault(_without_body_digest(entry['key']), []).append(entry)
+            queue = self._queues.get(key) or self._queues.get(_without_body_digest(key))
+            if not queue:
+                return None
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            return queue[min(position, len(queue) - 1)]
+
+# --- HTTP Adapters (httplib2 interface, as used by googleapiclient) ---
+
+def _response(status, content_type='application/json; charset=UTF-8'):
+    import httplib2 # Deferred: only needed when recording or replaying
+    return httplib2.Response({'status': str(status), 'content-type': content_type})
+
+class RecordingHttp:
+    """Wraps an authorized http, recording each call. Holds one authorized http per thread, so one
+    instance can be shared by batching's worker threads (httplib2 itself isn't thread-safe)."""
+
+    def __init__(self, credentials, cassette, sanitizer):
+        self._credentials = credentials # Not 'credentials': batching would bypass the recorder
+        self.cassette = cassette
+        self.sanitizer = sanitizer
+        self._local = threading.local()
+
+    def _http(self):
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import google_auth_httplib2
+            from googleapiclient.http import build_http
+            http = self._local.http = google_auth_httplib2.AuthorizedHttp(self._credentials, http=build_http())
+        return http
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        started = time.perf_counter()
+        response, content = self._http().request(uri, method=method, body=body, headers=headers, **kwargs)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        try:
+            if is_batch_uri(uri):
+                self._record_batch(headers or {}, body, response, content, elapsed_ms)
+            else:
+                self._record(method, uri, body, response.status, response.get('content-type'),
+                             content, elapsed_ms, batch=False)
+        except Exception as e:
+            print(f"!!! CASSETTE: could not record {method} {urlparse(uri).path}: {e} !!!")
+        return response, content
+
+    def _record(self, method, uri, body, status, content_type, content, elapsed_ms, batch):
+        body = body.decode('utf-8') if isinstance(body, bytes) else body
+        content = content.decode('utf-8', 'replace') if isinstance(content, bytes) else content
+        sanitized_uri = self.sanitizer.uri(uri)
+        sanitized_body = self.sanitizer.body_text(body)
+        self.cassette.append({
+            'key': request_key(method, sanitized_uri, sanitized_body),
+            'method': method,
+            'uri': sanitized_uri,
+            'status': int(status),
+            'content_type': content_type or 'application/json; charset=UTF-8',
+            'body': self.sanitizer.body_text(content),
+            'elapsed_ms': round(elapsed_ms, 2),
+            'batch': batch
+        })
+
+    def _record_batch(self, headers, body, response, content, elapsed_ms):
+        request_content_type = next((v for k, v in headers.items() if k.lower() == 'content-type'), '')
+        body = body.encode('utf-8') if isinstance(body, str) else body
+        calls = parse_batch_request(request_content_type, body)
+        if int(response.status) != 200:
+            # The whole batch failed; record it against every call so replay fails the same way
+            for _, method, target, _, call_body in calls:
+                self._record(method, target, call_body, response.status, response.get('content-type'),
+                             content, elapsed_ms / max(len(calls), 1), batch=True)
+            return
+        responses = parse_batch_response(response.get('content-type', ''), content)
+        share_ms = elapsed_ms / max(len(calls), 1) # Batch time is split evenly across its calls
+        for content_id, method, target, _, call_body in calls:
+            status, content_type, call_content = responses.get(content_id, (500, None, None))
+            self._record(method, target, call_body, status, content_type, call_content, share_ms, batch=True)
+
+class ReplayHttp:
+    """Answers googleapiclient requests from a cassette, batch requests included, without network access.
+    Waits for the recorded time multiplied by time_scale (batches: the sum over their calls)."""
+
+    def __init__(self, cassette, time_scale=1.0):
+        self.cassette = cassette
+        self.time_scale = time_scale
+        self.unmatched = 0
+
+    def _lookup(self, method, uri, body):
+        body = body.decode('utf-8') if isinstance(body, bytes) else body
+        entry = self.cassette.next_response(request_key(method, uri, body))
+        if entry is None:
+            self.unmatched += 1
+            if utils.should_log(): print(f"--- CASSETTE: no recording for {method} {uri} ---")
+            error = {'error': {'code': 404, 'message': f'No cassette recording for {method} {urlparse(uri).path}'}}
+            return 404, json.dumps(error), 0
+        return entry['status'], entry['body'], entry['elapsed_ms']
+
+    def _wait(self, elapsed_ms):
+        if self.time_scale > 0 and elapsed_ms > 0:
+            time.sleep(elapsed_ms * self.time_scale / 1000)
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        if not is_batch_uri(uri):
+            status, content, elapsed_ms = self._lookup(method, uri, body)
+            self._wait(elapsed_ms)
+            return _response(status), (content or '').encode('utf-8')
+
+        request_content_type = next((v for k, v in (headers or {}).items() if k.lower() == 'content-type'), '')
+        body = body.encode('utf-8') if isinstance(body, str) else body
+        responses = []
+        total_ms = 0
+        for content_id, call_method, target, _, call_body in parse_batch_request(request_content_type, body):
+            status, content, elapsed_ms = self._lookup(call_method, target, call_body)
+            responses.append((content_id, status, content))
+            total_ms += elapsed_ms
+        self._wait(total_ms)
+        boundary = f'batch_{secrets.token_hex(8)}'
+        return _response(200, f'multipart/mixed; boundary={boundary}'), format_batch_response(responses, boundary)
+
+# --- App Wiring (config.GMAIL_CASSETTE_MODE) ---
+
+_cassette = None
+_cassette_lock = threading.Lock()
+_sanitizer = None
+
+def get_cassette(scopes=None):
+    """Returns the process-wide cassette: loaded for replay, created on first use for recording."""
+    global _cassette, _sanitizer
+    if _cassette is None:
+        with _cassette_lock:
+            if _cassette is None:
+                if config.GMAIL_CASSETTE_MODE == 'replay':
+                    _cassette = Cassette.load(config.GMAIL_CASSETTE_PATH)
+                else:
+                    _cassette = Cassette.create(config.GMAIL_CASSETTE_PATH, scopes=list(scopes or []))
+                    _sanitizer = Sanitizer()
+                if utils.should_log(): print(f"--- CASSETTE: {config.GMAIL_CASSETTE_MODE} {config.GMAIL_CASSETTE_PATH} ---")
+    return _cassette
+
+def build_http(creds):
+    """Returns the http object for a Gmail service in the configured cassette mode, or None."""
+    mode = config.GMAIL_CASSETTE_MODE
+    if mode == 'replay':
+        return ReplayHttp(get_cassette(), config.GMAIL_CASSETTE_TIME_SCALE)
+    if mode == 'record':
+        cassette = get_cassette(scopes=getattr(creds, 'scopes', None))
+        return RecordingHttp(creds, cassette, _sanitizer)
+    return None
+
+def replay_credentials():
+    """Credentials standing in for a signed-in user during replay, with the recorded scopes."""
+    from google.oauth2.credentials import Credentials # Deferred: heavy import
+    return Credentials(token='cassette-replay', scopes=get_cassette().meta.get('scopes') or config.SCOPES)
@@ -0,0 +1,106 @@
+# api/census.py
+# Full-mailbox sender census: streams pages of a query into per-sender aggregates, a time-budgeted slice per call.
+import time
+
+from . import config # Import config directly
+from . import utils
+
+# Lower rank is a better link to act on: HTTPS header, HTTP header, mailto, body link
+def _link_rank(entry):
+    if entry.header_link:
+        return (0 if entry.header_link.startswith('https') else 1), entry.header_link
+    if entry.mailto_link:
+        return 2, entry.mailto_link
+    if entry.body_link:
+        return 3, entry.body_link
+    return None, None
+
+class SenderCensus:
+    """Per-sender running aggregates. Memory grows with the number of distinct senders,
+    never with the number of messages: each entry is folded in and then discarded."""
+
+    def __init__(self, sender_key):
+        self.sender_key = sender_key # Maps a From header to the grouping key
+        self.senders = {}
+        self.messages_seen = 0
+        self.errors = 0
+
+    def add(self, entry):
+        """Folds one ScannedEmail into its sender's aggregate."""
+        self.messages_seen += 1
+        sender = entry.sender or 'Unknown Sender'
+        key = self.sender_key(sender)
+        internal_date = entry.internal_date
+        rank, link = _link_rank(entry)
+
+        aggregate = self.senders.get(key)
+        if aggregate is None:
+            self.senders[key] = {
+                'sender': key,
+                'full_sender': sender,
+                'count': 1,
+                'newest_date': internal_date,
+                'oldest_date': internal_date,
+                'best_link': link,
+                'best_link_rank': rank,
+                'sample_subject': entry.subject
+            }
+            return
+
+        aggregate['count'] += 1
+        if internal_date > aggregate['newest_date']:
+            aggregate['newest_date'] = internal_date
+            aggregate['sample_subject'] = entry.subject # Show the most recent subject
+            aggregate['full_sender'] = sender
+        if internal_date < aggregate['oldest_date']:
+            aggregate['oldest_date'] = internal_date
+        if rank is not None and (aggregate['best_link_rank'] is None or rank < aggregate['best_link_rank']):
+            aggregate['best_link'] = link
+            aggregate['best_link_rank'] = rank
+
+    def top(self, n):
+        """Returns the n senders with the most messages, largest first; every sender when n is 0."""
+        ranked = sorted(self.senders.values(), key=lambda a: (-a['count'], -a['newest_date']))
+        return ranked[:n] if n else ranked
+
+def list_message_id_page(service, query, page_size, page_token=None, label_ids=None):
+    """Lists one page of message IDs only. Returns (IDs, next page token or None)."""
+    response = service.users().messages().list(
+        userId='me',
+        q=query,
+        maxResults=page_size,
+        pageToken=page_token,
+        labelIds=label_ids,
+        fields='messages/id,nextPageToken'
+    ).execute()
+    return [m['id'] for m in response.get('messages', [])], response.get('nextPageToken')
+
+def run_census(service, get_entries, sender_key, query=None, page_size=None, max_messages=None,
+               page_token=None, time_budget=None):
+    """Walks pages of the query from page_token and returns (SenderCensus, next page token or None).
+    get_entries(service, msg_ids) -> (entries, errors) supplies per-message links and headers;
+    each page's entries are folded in and released before the next page is listed.
+    Stops after time_budget seconds (whole pages only); call again with the returned token to continue.
+    With max_messages, the token is None once that many messages have been listed."""
+    census = SenderCensus(sender_key)
+    query = query or config.CENSUS_QUERY
+    page_size = page_size or config.CENSUS_PAGE_SIZE
+    time_budget = config.CENSUS_TIME_BUDGET if time_budget is None else time_budget
+    deadline = time.monotonic() + time_budget
+    listed = 0
+
+    while True:
+        if max_messages is not None:
+            page_size = min(page_size, max_messages - listed)
+            if page_size <= 0:
+                return census, None
+        msg_ids, page_token = list_message_id_page(service, query, page_size, page_token, label_ids=['INBOX'])
+        listed += len(msg_ids)
+        if msg_ids:
+            entries, batch_errors = get_entries(service, msg_ids)
+            census.errors += len(batch_errors)
+            for entry in entries.values():
+                census.add(entry)
+        if utils.should_log(): print(f"--- CENSUS: {census.messages_seen} messages, {len(census.senders)} senders so far ---")
+        if not page_token or time.monotonic() >= deadline:
+            return census, page_token
@@ -8,6 +8,9 @@ if utils.should_log(): print("--- Loading api/config.py ---") # Debug print
 
 # Google API Scopes - using only readonly for minimum permissions
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+# Optional scopes: modify enables archiving, send enables automatic mailto unsubscribes
+MODIFY_SCOPE = 'https://www.googleapis.com/auth/gmail.modify'
+SEND_SCOPE = 'https://www.googleapis.com/auth/gmail.send'
 
 # Credentials file path (relative to project root)
 CREDENTIALS_FILE = 'credentials.json'
@@ -19,6 +22,142 @@ MOCK_API = False
 MAX_SCAN_EMAILS = 25
 EMAILS_PER_PAGE = 25 # Consistent page size for listing emails
 
+# Gmail API endpoint override, e.g. http://127.0.0.1:8765/ for the local stand-in server
+# (benchmarks/gmail_standin.py). Unset means the real API.
+GMAIL_API_BASE_URL = os.environ.get('GMAIL_API_BASE_URL')
+
+# Gmail traffic cassettes (api/cassettes.py): 'record' saves sanitized Gmail calls to GMAIL_CASSETTE_PATH,
+# 'replay' serves them back without network access. Unset means live traffic.
+GMAIL_CASSETTE_MODE = os.environ.get('GMAIL_CASSETTE_MODE') or None
+GMAIL_CASSETTE_PATH = os.environ.get('GMAIL_CASSETTE_PATH', '/tmp/unsubscriber/gmail-cassette.jsonl.gz')
+# Replay waits for the recorded latency times this factor: 1 = original timing, 0 = as fast as possible
+GMAIL_CASSETTE_TIME_SCALE = float(os.environ.get('GMAIL_CASSETTE_TIME_SCALE', '1.0'))
+
+# Maximum number of ready Gmail service objects kept per process (keyed by access token and thread)
+SERVICE_POOL_SIZE = 32
+
+# Credential store backend: 'cookie' (default) keeps compact credentials in the signed session cookie,
+# which works on every serverless instance. 'sqlite' and 'memory' keep them server-side with only a
+# handle in the cookie; they are per instance, so only use them where all requests share that storage
+# (a single long-running server). /tmp is the only writable path on Vercel, and it is per instance.
+CREDENTIAL_STORE_BACKEND = os.environ.get('CREDENTIAL_STORE_BACKEND', 'cookie')
+CREDENTIAL_STORE_PATH = os.environ.get('CREDENTIAL_STORE_PATH', '/tmp/unsubscriber/credentials.sqlite3')
+CREDENTIAL_STORE_MAX_AGE_SECONDS = 30 * 24 * 3600
+CREDENTIAL_CACHE_SIZE = 256
+
+# Persistent index of already-scanned messages, kept current with users.history.list
+SCAN_INDEX_ENABLED = os.environ.get('SCAN_INDEX_ENABLED', 'True').lower() == 'true'
+SCAN_INDEX_PATH = os.environ.get('SCAN_INDEX_PATH', '/tmp/unsubscriber/scan_index.sqlite3')
+
+# Archive-everything-from-sender jobs: progress counts are checkpointed after every round. 'session' (default)
+# keeps jobs in the signed session cookie so any instance can resume them; 'sqlite' keeps them in a
+# per-instance file at SENDER_ARCHIVE_JOB_PATH, only for a single long-running server.
+SENDER_ARCHIVE_JOB_BACKEND = os.environ.get('SENDER_ARCHIVE_JOB_BACKEND', 'session')
+SENDER_ARCHIVE_JOB_PATH = os.environ.get('SENDER_ARCHIVE_JOB_PATH', '/tmp/unsubscriber/sender_archive_jobs.sqlite3')
+SENDER_ARCHIVE_JOB_MAX_AGE_SECONDS = 7 * 24 * 3600
+SENDER_ARCHIVE_SESSION_JOBS = 4 # Most recent jobs kept in the cookie
+SENDER_ARCHIVE_PAGE_SIZE = 500 # messages.list maximum
+SENDER_ARCHIVE_TIME_BUDGET = 20 # seconds of work per request before handing back progress
+
+# Calls per Gmail batch request (Gmail allows 100, but recommends 50 to avoid rate limiting)
+BATCH_SIZE = 50
+BATCH_SIZE_LIMIT = 100
+# Gmail batch requests run concurrently on at most this many threads
+BATCH_WORKERS = 8
+# Failed sub-requests are retried with jittered exponential backoff. Rate-limited calls were never
+# applied, so they're retried for any method; a 5xx may have been, so only these methods retry it
+# (safe to repeat: reads and label changes, never messages.send).
+BATCH_MAX_RETRIES = 4
+BATCH_RETRY_BASE_DELAY = 0.5 # seconds
+BATCH_RETRY_MAX_DELAY = 8.0 # seconds
+BATCH_RETRY_SERVER_ERROR_METHODS = frozenset((
+    'gmail.users.getProfile',
+    'gmail.users.history.list',
+    'gmail.users.labels.list',
+    'gmail.users.messages.list',
+    'gmail.users.messages.get',
+    'gmail.users.messages.modify',
+    'gmail.users.messages.batchModify',
+    'gmail.users.threads.get',
+))
+# AIMD batch sizing per user: shrink on rate limits, grow back while rounds are clean
+BATCH_SIZE_MIN = 5
+BATCH_SIZE_INCREASE = 5
+BATCH_SIZE_DECREASE_FACTOR = 0.5
+BATCH_SIZER_CACHE_SIZE = 256 # Users whose batch size is remembered per process
+# messages.batchModify accepts up to 1,000 IDs per call
+BATCH_MODIFY_CHUNK_SIZE = 1000
+BATCH_MODIFY_CHUNK_LIMIT = 1000
+# Halvings of a chunk rejected for invalid IDs: a 1,000-ID chunk ends in pieces of ~16, at most 127 calls
+BATCH_MODIFY_MAX_SPLIT_DEPTH = 6
+
+# Census mode: page size for walking the whole mailbox and how many senders to report
+CENSUS_QUERY = 'has:list-unsubscribe'
+CENSUS_PAGE_SIZE = 500
+CENSUS_TOP_N = 50
+CENSUS_TIME_BUDGET = 20 # seconds of listing and fetching per request before handing back a page token
+
+# JSON scan API: gzip responses at least this large
+API_GZIP_MIN_BYTES = 1024
+API_GZIP_LEVEL = 6
+
+# Per-phase timings are sent to the browser as a Server-Timing header (see timing.py).
+# The per-request JSON log line is controlled by LOG_LEVEL ('info' or lower) instead.
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+
+# In-process Gmail API metrics served at /api/metrics in Prometheus text format (see metrics.py).
+# The endpoint stays off until METRICS_TOKEN is set; scrapes must send 'Authorization: Bearer <token>'.
+# METRICS_ENABLED=false also stops collecting the counters.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+# Gmail quota units per call, by discovery method ID; per-user limit is 250 units/second
+GMAIL_QUOTA_UNITS = {
+    'gmail.users.getProfile': 1,
+    'gmail.users.history.list': 2,
+    'gmail.users.labels.list': 1,
+    'gmail.users.messages.list': 5,
+    'gmail.users.messages.get': 5,
+    'gmail.users.messages.modify': 5,
+    'gmail.users.messages.batchModify': 50,
+    'gmail.users.messages.send': 100,
+    'gmail.users.threads.get': 10,
+}
+GMAIL_QUOTA_UNITS_DEFAULT = 5
+
+# Streamed scans fetch and emit results in sub-batches of this many messages
+STREAM_CHUNK_SIZE = 10
+
+# Server-side HTTP unsubscribe requests (RFC 8058 one-click POSTs, GETs otherwise)
+UNSUBSCRIBE_HTTP_WORKERS = 8
+UNSUBSCRIBE_PER_HOST_LIMIT = 2 # Concurrent requests per host
+UNSUBSCRIBE_HTTP_TIMEOUT = (3.05, 10) # (connect, read) seconds
+UNSUBSCRIBE_MAX_REDIRECTS = 5
+UNSUBSCRIBE_USER_AGENT = 'Unsubscriber/1.0 (+List-Unsubscribe)'
+# Only for testing against a local stand-in server; links from mail must never reach internal hosts
+UNSUBSCRIBE_ALLOW_PRIVATE_HOSTS = os.getenv('UNSUBSCRIBE_ALLOW_PRIVATE_HOSTS', 'False').lower() == 'true'
+
+# mailto: unsubscribes sent via users.messages.send (100 quota units each, 250 units/s per user)
+MAILTO_SEND_BATCH_SIZE = 10
+MAILTO_SENDS_PER_SECOND = 2
+# Seconds a request may spend waiting on the rate limit. The first batch goes out as a burst, so the cap
+# is that burst plus what the rate allows in the budget (20 sends, ~5s); the client posts the rest again.
+MAILTO_TIME_BUDGET = 5
+MAILTO_MAX_SENDS_PER_REQUEST = MAILTO_SEND_BATCH_SIZE + int(MAILTO_SENDS_PER_SECOND * MAILTO_TIME_BUDGET)
+MAILTO_LIMITER_CACHE_SIZE = 256 # Users whose send pacing is remembered per process
+
+# Headers requested in the metadata-only first pass of a scan.
+# Messages without a List-Unsubscribe link in these are re-fetched in full.
+METADATA_HEADERS = [
+    'List-Unsubscribe',
+    'List-Unsubscribe-Post',
+    'X-List-Unsubscribe',
+    'From',
+    'Subject'
+]
+
+# Upper bound on decoded bytes scanned per message body part for unsubscribe links
+BODY_SCAN_MAX_BYTES = 256 * 1024
+
 # Colors for sender groups in the UI
 SENDER_COLORS = [
     '217 91% 60%', # Blue
@@ -31,7 +170,7 @@ SENDER_COLORS = [
 ]
 
 # Debug Logging Flag
-# DEBUG_LOGGING = os.getenv('FLASK_DEBUG_MODE', 'False').lower() == 'true' # REMOVED - Use utils.should_log() instead
+# The log level (FLASK_DEBUG_MODE or LOG_LEVEL) is read once at startup; see utils.LOG_LEVEL and utils.should_log()
 
 # Gmail API search query terms
 # These terms are combined with OR to find emails that might have unsubscribe options
@@ -46,6 +185,21 @@ UNSUBSCRIBE_SEARCH_TERMS = [
     'newsletter'
 ]
 
+# Spanish and Portuguese variants, also used as anchor keywords when scoring body links
+UNSUBSCRIBE_SEARCH_TERMS_ES_PT = [
+    '"cancelar suscripción"',
+    '"desuscribirse"',
+    '"darse de baja"',
+    '"cancelar inscrição"',
+    '"descadastrar"',
+    '"desinscrever"'
+]
+
+# Scan search passes, in order (see query_plan.py): header-bearing mail first, then keyword matches
+# without a List-Unsubscribe header. 'combined' is the single OR query of both.
+SCAN_QUERY_STRATEGIES = [name.strip() for name in
+                         os.environ.get('SCAN_QUERY_STRATEGIES', 'list-unsubscribe,keywords').split(',') if name.strip()]
+
 # --- Base URL / Redirect URI (Calculated based on Env Vars) ---
 # Calculating these here means they are fixed at import time.
 PROD_URL = os.environ.get('VERCEL_PROJECT_PRODUCTION_URL')
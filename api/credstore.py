@@ -0,0 +1,219 @@
+# api/credstore.py
+# OAuth credential storage behind an opaque session handle: in the signed session cookie by default,
+# or server-side (SQLite, memory) where every request reaches the same storage.
+import os
+import json
+import time
+import hashlib
+import secrets
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from . import config # Import config directly
+from . import utils
+
+# --- Serialization ---
+# Only the fields needed to rebuild and refresh the credentials, as compact JSON.
+
+def serialize_credentials(creds):
+    """Serializes OAuth credentials to a compact JSON string."""
+    expiry = None
+    if creds.expiry:
+        expiry = int(creds.expiry.replace(tzinfo=timezone.utc).timestamp())
+    data = {
+        't': creds.token,
+        'r': creds.refresh_token,
+        'u': creds.token_uri,
+        'c': creds.client_id,
+        's': creds.client_secret,
+        'sc': list(creds.scopes) if creds.scopes else None,
+        'e': expiry
+    }
+    return json.dumps({k: v for k, v in data.items() if v is not None}, separators=(',', ':'))
+
+def deserialize_credentials(payload):
+    """Rebuilds OAuth credentials from serialize_credentials output."""
+    from google.oauth2.credentials import Credentials # Deferred to keep cold starts light
+    data = json.loads(payload)
+    creds = Credentials(
+        token=data.get('t'),
+        refresh_token=data.get('r'),
+        token_uri=data.get('u'),
+        client_id=data.get('c'),
+        client_secret=data.get('s'),
+        scopes=data.get('sc')
+    )
+    if data.get('e'):
+        # google-auth compares expiry against naive UTC datetimes
+        creds.expiry = datetime.fromtimestamp(data['e'], tz=timezone.utc).replace(tzinfo=None)
+    return creds
+
+def new_handle():
+    """Returns a new opaque credential handle for the session cookie."""
+    return secrets.token_urlsafe(24)
+
+def _handle_key(handle):
+    # Store a digest so a copy of the store alone can't be replayed as session handles
+    return hashlib.sha256(handle.encode('utf-8')).hexdigest()
+
+# --- Backends ---
+# Every backend stores serialized credential strings by handle: get/put/delete.
+
+class CookieCredentialStore:
+    """Keeps the serialized credentials in the signed Flask session cookie, next to the handle.
+    Needs no shared storage, so sessions survive cold starts and requests landing on another
+    serverless instance. The default backend."""
+
+    SESSION_KEY = 'credentials_payload'
+    # The payload travels with each request, and another instance may have replaced it under the
+    # same handle (e.g. a scope upgrade); CachedCredentialStore keys its cache by the payload instead
+    payload_is_local = True
+
+    def get(self, handle):
+        from flask import session
+        if session.get('credentials_handle') != handle:
+            return None
+        return session.get(self.SESSION_KEY)
+
+    def put(self, handle, payload):
+        from flask import session
+        session[self.SESSION_KEY] = payload
+
+    def delete(self, handle):
+        from flask import session
+        session.pop(self.SESSION_KEY, None)
+
+class MemoryCredentialStore:
+    """Process-local store. Useful for local development and tests."""
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, handle):
+        with self._lock:
+            return self._items.get(_handle_key(handle))
+
+    def put(self, handle, payload):
+        with self._lock:
+            self._items[_handle_key(handle)] = payload
+
+    def delete(self, handle):
+        with self._lock:
+            self._items.pop(_handle_key(handle), None)
+
+class SQLiteCredentialStore:
+    """SQLite-backed store. Entries unused for max_age_seconds are purged on write."""
+
+    def __init__(self, path, max_age_seconds=None):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS credentials ('
+                'handle TEXT PRIMARY KEY, payload TEXT NOT NULL, updated_at REAL NOT NULL)'
+            )
+
+    def get(self, handle):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT payload FROM credentials WHERE handle = ?', (_handle_key(handle),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, handle, payload):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO credentials (handle, payload, updated_at) VALUES (?, ?, ?)',
+                (_handle_key(handle), payload, now)
+            )
+            if self.max_age_seconds:
+                self._conn.execute('DELETE FROM credentials WHERE updated_at < ?', (now - self.max_age_seconds,))
+
+    def delete(self, handle):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM credentials WHERE handle = ?', (_handle_key(handle),))
+
+class CachedCredentialStore:
+    """In-memory LRU of deserialized credentials in front of a backend store.
+    Works with Credentials objects rather than strings, so cache hits skip deserialization.
+    For backends whose payload is local to the request (the cookie), entries are keyed by a digest
+    of the payload, so the backend is always consulted and a cache hit can't be stale."""
+
+    def __init__(self, backend, max_entries=256):
+        self.backend = backend
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, handle, creds):
+        with self._lock:
+            self._cache[handle] = creds
+            self._cache.move_to_end(handle)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _payload_key(self, payload):
+        return 'payload:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def load(self, handle):
+        payload = None
+        key = handle
+        if getattr(self.backend, 'payload_is_local', False):
+            payload = self.backend.get(handle)
+            if payload is None:
+                return None
+            key = self._payload_key(payload)
+        with self._lock:
+            creds = self._cache.get(key)
+            if creds is not None:
+                self._cache.move_to_end(key)
+                return creds
+        if payload is None:
+            payload = self.backend.get(handle)
+            if payload is None:
+                return None
+        creds = deserialize_credentials(payload)
+        self._remember(key, creds)
+        return creds
+
+    def save(self, handle, creds):
+        payload = serialize_credentials(creds)
+        self.backend.put(handle, payload)
+        self._remember(self._payload_key(payload) if getattr(self.backend, 'payload_is_local', False) else handle, creds)
+
+    def delete(self, handle):
+        with self._lock:
+            self._cache.pop(handle, None)
+        self.backend.delete(handle)
+
+# --- Store Factory ---
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_credential_store():
+    """Returns the process-wide credential store configured by config.CREDENTIAL_STORE_BACKEND."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend_name = config.CREDENTIAL_STORE_BACKEND
+                if backend_name == 'memory':
+                    backend = MemoryCredentialStore()
+                elif backend_name == 'cookie':
+                    backend = CookieCredentialStore()
+                else:
+                    backend = SQLiteCredentialStore(config.CREDENTIAL_STORE_PATH,
+                                                    max_age_seconds=config.CREDENTIAL_STORE_MAX_AGE_SECONDS)
+                if utils.should_log(): print(f"--- Credential store initialized: {backend_name} ---")
+                _store = CachedCredentialStore(backend, max_entries=config.CREDENTIAL_CACHE_SIZE)
+    return _store
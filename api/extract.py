@@ -0,0 +1,147 @@
+# api/extract.py
+# Streaming unsubscribe link extraction from Gmail message payloads.
+import re
+import base64
+import codecs
+
+from . import config # Import config directly
+from . import scoring
+
+# --- Extraction Constants ---
+
+# Base64 characters decoded per step (must be a multiple of 4)
+DECODE_CHUNK_CHARS = 16 * 1024
+
+# Characters kept between chunks so anchors split across a chunk boundary still match
+ANCHOR_CARRY_CHARS = 4 * 1024
+
+# Anchor tags with an http(s) href. Inner HTML is bounded so unclosed anchors can't run away.
+ANCHOR_RE = re.compile(
+    r'<a\s[^>]*?href\s*=\s*["\'](https?://[^"\']+)["\'][^>]*>(.{0,2000}?)</a\s*>',
+    re.IGNORECASE | re.DOTALL
+)
+TAG_RE = re.compile(r'<[^>]+>')
+PLAIN_URL_RE = re.compile(r'https?://[^\s<>"\')\]]+', re.IGNORECASE)
+
+# --- MIME Tree Helpers ---
+
+def iter_parts(payload):
+    """Yields every leaf part of a Gmail payload, depth first.
+    Handles HTML nested inside multipart/alternative inside multipart/mixed."""
+    if not payload:
+        return
+    sub_parts = payload.get('parts')
+    if sub_parts:
+        for sub_part in sub_parts:
+            yield from iter_parts(sub_part)
+    else:
+        yield payload
+
+def get_part_charset(part):
+    """Returns the charset declared in a part's Content-Type header, defaulting to utf-8."""
+    for header in part.get('headers', []) or []:
+        if header.get('name', '').lower() == 'content-type':
+            match = re.search(r'charset\s*=\s*"?([\w.:-]+)"?', header.get('value', ''), re.IGNORECASE)
+            if match:
+                try:
+                    return codecs.lookup(match.group(1)).name
+                except LookupError:
+                    break
+    return 'utf-8'
+
+def iter_part_text(part, max_bytes=None):
+    """Lazily decodes a part's base64url body into text chunks.
+    Only the last max_bytes of the decoded body are read: unsubscribe links live in footers,
+    so oversized bodies are scanned from the end instead of being decoded in full."""
+    data = part.get('body', {}).get('data', '')
+    if not data:
+        return
+    if max_bytes is None:
+        max_bytes = config.BODY_SCAN_MAX_BYTES
+
+    start = 0
+    max_chars = (max_bytes // 3) * 4
+    if len(data) > max_chars:
+        start = len(data) - max_chars
+        start += -start % 4 # Keep the offset on a base64 quantum boundary
+
+    decoder = codecs.getincrementaldecoder(get_part_charset(part))(errors='replace')
+    for offset in range(start, len(data), DECODE_CHUNK_CHARS):
+        chunk = data[offset:offset + DECODE_CHUNK_CHARS]
+        if len(chunk) % 4:
+            chunk += '=' * (-len(chunk) % 4) # Gmail sometimes drops trailing padding
+        try:
+            raw = base64.urlsafe_b64decode(chunk)
+        except (ValueError, TypeError) as e:
+            print(f"Error decoding message part: {e}")
+            return
+        text = decoder.decode(raw)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+# --- Link Extraction ---
+
+def iter_html_anchors(text_chunks):
+    """Tokenizes anchors incrementally from a stream of HTML text chunks.
+    Yields one list of (url, anchor_text) pairs per chunk, with inner tags stripped."""
+    buffer = ''
+    for chunk in text_chunks:
+        buffer += chunk
+        last_end = 0
+        anchors = []
+        for match in ANCHOR_RE.finditer(buffer):
+            last_end = match.end()
+            anchors.append((match.group(1), TAG_RE.sub(' ', match.group(2)).strip()))
+        buffer = buffer[max(last_end, len(buffer) - ANCHOR_CARRY_CHARS):]
+        if anchors:
+            yield anchors
+
+def iter_plain_links(text_chunks):
+    """Yields lists of (url, line_text) pairs from a stream of text/plain chunks.
+    The surrounding line stands in for anchor text when scoring."""
+    buffer = ''
+    for chunk in text_chunks:
+        buffer += chunk
+        complete, _, buffer = buffer.rpartition('\n')
+        links = [(match.group(0), line)
+                 for line in complete.splitlines()
+                 for match in PLAIN_URL_RE.finditer(line)]
+        buffer = buffer[-ANCHOR_CARRY_CHARS:]
+        if links:
+            yield links
+    links = [(match.group(0), buffer) for match in PLAIN_URL_RE.finditer(buffer)]
+    if links:
+        yield links
+
+def find_body_link(payload, max_bytes=None, scorer=None):
+    """Finds the best unsubscribe link in a message body.
+    Scans every text/html part in the MIME tree, falling back to text/plain parts.
+    Returns (link, score); link is None when nothing was found."""
+    if scorer is None:
+        scorer = scoring.get_default_scorer()
+    parts = list(iter_parts(payload))
+    best_link, best_score = None, 0
+
+    for part in parts:
+        if part.get('mimeType') == 'text/html':
+            link, score = scorer.pick_best(iter_html_anchors(iter_part_text(part, max_bytes)))
+            if link and score > best_score:
+                best_link, best_score = link, score
+                if best_score >= scoring.WINNING_SCORE:
+                    return best_link, best_score
+
+    if best_link:
+        return best_link, best_score
+
+    for part in parts:
+        if part.get('mimeType') == 'text/plain':
+            link, score = scorer.pick_best(iter_plain_links(iter_part_text(part, max_bytes)))
+            if link and score > best_score:
+                best_link, best_score = link, score
+                if best_score >= scoring.WINNING_SCORE:
+                    break
+
+    return best_link, best_score
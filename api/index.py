@@ -1,28 +1,21 @@
 import os
+import hmac
 # Set OAuth environment variables to relax token scope validation
 os.environ['OAUTHLIB_RELAX_TOKEN_SCOPE'] = 'True'
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = 'True'  # For development only
 os.environ['OAUTHLIB_IGNORE_SCOPE_CHANGE'] = 'True'  # Ignore scope changes during auth flow
 
-import pickle
-import base64
-import email
-from google_auth_oauthlib.flow import Flow, InstalledAppFlow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
-from flask import Flask, render_template, redirect, url_for, request, session, flash
-import requests
-import json
-import sys
-import argparse
-from urllib.parse import urlparse, parse_qs
-from email.mime.text import MIMEText
+# Keep module-level imports light: this runs on every cold start. Google client libraries
+# are imported where they're used (see benchmarks/bench_startup.py).
+from flask import Flask, render_template, redirect, url_for, request, session, flash, Response, abort
 
 # Import Blueprints and utils
 from .auth import auth_bp
 from .scan import scan_bp
 from . import utils # Import utils to access get_gmail_service
 from . import config # Import the config module
+from . import timing
+from . import metrics
 
 # Explicitly tell Flask the template folder is in the root directory
 # Calculate the path to the root directory relative to this file (api/index.py)
@@ -66,6 +59,9 @@ if utils.should_log():
 if utils.should_log(): print(f"--- Final REDIRECT_URI from config: {config.REDIRECT_URI} ---")
 # --- End Vercel Specific Configuration ---
 
+# --- Request Timing (Server-Timing header and per-request log line) ---
+timing.init_app(app)
+
 # --- Register Blueprints ---
 app.register_blueprint(auth_bp)
 app.register_blueprint(scan_bp)
@@ -88,8 +84,21 @@ def dashboard():
     return render_template('index.html', authenticated=True)
 
 
+# Under /api/ so vercel.json routes it to this function
+@app.route('/api/metrics')
+def metrics_endpoint():
+    """Gmail API usage counters for this process, in Prometheus text format.
+    Off (404) unless METRICS_TOKEN is set; scrapes must send it as a bearer token."""
+    if not config.METRICS_ENABLED or not config.METRICS_TOKEN:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {config.METRICS_TOKEN}'):
+        abort(401)
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
 # --- Main Execution (for local non-Vercel CLI development) ---
 if __name__ == '__main__':
+    import argparse
     parser = argparse.ArgumentParser(description='Gmail Unsubscriber Flask App')
     parser.add_argument('--port', type=int, default=5001, help='Port number.')
     parser.add_argument('--debug', action='store_true', help='Run in debug mode.')
@@ -102,6 +111,8 @@ if __name__ == '__main__':
     args = parser.parse_args()
 
     # Apply overrides if provided via command line for direct run
+    if args.debug:
+        utils.set_log_level('debug')
     if args.mock:
         config.MOCK_API = True
         if utils.should_log(): print("--- CLI Override: Using Mock API --- ")
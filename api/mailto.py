@@ -0,0 +1,156 @@
+# api/mailto.py
+# Bulk dispatch of mailto: unsubscribe requests through batched users.messages.send calls.
+import time
+import base64
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs, unquote
+from email.mime.text import MIMEText
+
+from . import config # Import config directly
+from . import utils
+from . import batching
+
+# --- Parsing ---
+
+def _single_line(value):
+    """Joins a header value's lines. CR/LF from a link (e.g. subject=hi%0ABcc:...) must not
+    reach a message header, where they would add headers or fail to serialize."""
+    return ' '.join(part.strip() for part in value.splitlines() if part.strip())
+
+def parse_mailto(link):
+    """Parses a mailto: link into {'to', 'subject', 'body'}, or returns None if it has no usable recipient.
+    Recipients containing line breaks are rejected; line breaks in the subject become spaces."""
+    parsed = urlparse(link)
+    if parsed.scheme.lower() != 'mailto':
+        return None
+    params = parse_qs(parsed.query)
+    recipients = [unquote(address).strip() for address in parsed.path.split(',') if address.strip()]
+    recipients += [address.strip() for value in params.get('to', []) for address in value.split(',') if address.strip()]
+    if not recipients or _single_line(recipients[0]) != recipients[0]:
+        return None
+    return {
+        'to': recipients[0], # Unsubscribe mailboxes only ever need one copy
+        'subject': _single_line(params.get('subject', [''])[0]) or 'Unsubscribe',
+        'body': params.get('body', ['Please unsubscribe me.'])[0]
+    }
+
+def plan_dispatch(emails_data):
+    """Groups selected emails by unsubscribe recipient so each address is mailed once.
+    emails_data items need 'id' and 'mailto_link'.
+    Returns ({recipient: {'to', 'subject', 'body', 'message_ids'}}, [IDs with unusable links])."""
+    planned = {}
+    invalid_ids = []
+    for email_data in emails_data:
+        link = email_data.get("mailto_link")
+        if not link:
+            continue
+        details = parse_mailto(link)
+        if not details:
+            invalid_ids.append(email_data["id"])
+            continue
+        recipient = details['to'].lower()
+        if recipient in planned:
+            planned[recipient]['message_ids'].append(email_data["id"])
+        else:
+            planned[recipient] = dict(details, message_ids=[email_data["id"]])
+    return planned, invalid_ids
+
+def build_unsubscribe_message(to, subject, body):
+    """Returns a users.messages.send body for one unsubscribe email."""
+    message = MIMEText(body)
+    message['to'] = to
+    message['subject'] = subject
+    return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode('ascii')}
+
+# --- Rate Limiting ---
+
+class RateLimiter:
+    """Token bucket: acquire(n) blocks until n sends fit under rate_per_second."""
+
+    def __init__(self, rate_per_second, burst=None):
+        self.rate = rate_per_second
+        self.capacity = burst or rate_per_second
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1, max_wait=None):
+        """Takes n tokens, sleeping until they're available. If that would take longer than max_wait
+        seconds, takes nothing and returns False."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = (n - self._tokens) / self.rate if self._tokens < n else 0
+            if max_wait is not None and wait > max_wait:
+                return False
+            self._tokens -= n
+        if wait:
+            time.sleep(wait)
+        return True
+
+_limiters = OrderedDict() # credentials digest -> RateLimiter
+_limiters_lock = threading.Lock()
+
+def limiter_for(service):
+    """Returns the send limiter for the service's user, shared by every request in the process,
+    so pacing carries over from one dispatch call to the next. LRU-bounded like batching.sizer_for."""
+    key = batching.credentials_key(service)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter(config.MAILTO_SENDS_PER_SECOND, burst=config.MAILTO_SEND_BATCH_SIZE)
+            while len(_limiters) > config.MAILTO_LIMITER_CACHE_SIZE:
+                _limiters.popitem(last=False)
+        _limiters.move_to_end(key)
+        return limiter
+
+# --- Dispatch ---
+
+def dispatch(service, planned, max_sends=None, limiter=None):
+    """Sends one unsubscribe email per planned recipient, in batches of config.MAILTO_SEND_BATCH_SIZE
+    paced by limiter (the user's process-wide limiter_for by default). At most max_sends are sent per
+    call, and a batch that would wait past config.MAILTO_TIME_BUDGET isn't sent; the rest are returned
+    for a follow-up call. A recipient whose message can't be built is reported as failed without
+    stopping the others. Returns ({recipient: {'ok', 'error', 'message_ids'}}, [remaining recipients])."""
+    max_sends = max_sends or config.MAILTO_MAX_SENDS_PER_REQUEST
+    limiter = limiter or limiter_for(service)
+    deadline = time.monotonic() + config.MAILTO_TIME_BUDGET
+    recipients = list(planned)
+    to_send, remaining = recipients[:max_sends], recipients[max_sends:]
+    results = {}
+
+    messages_resource = service.users().messages() # Build the resource once, not per request
+    chunks = batching.chunked(to_send, config.MAILTO_SEND_BATCH_SIZE)
+    for index, chunk in enumerate(chunks):
+        requests = []
+        for recipient in chunk:
+            details = planned[recipient]
+            try:
+                body = build_unsubscribe_message(details['to'], details['subject'], details['body'])
+            except Exception as e:
+                print(f"!!! ERROR building unsubscribe email to {recipient}: {e} !!!")
+                results[recipient] = {'ok': False, 'error': f"Invalid mailto link: {e}",
+                                      'message_ids': details['message_ids']}
+                continue
+            requests.append((recipient, messages_resource.send(userId='me', body=body)))
+        if not requests:
+            continue
+        if not limiter.acquire(len(requests), max_wait=max(0, deadline - time.monotonic())):
+            # Earlier calls used up this user's allowance; hand the rest back rather than wait
+            unsent = [recipient for recipient, _ in requests] + [r for later in chunks[index + 1:] for r in later]
+            return results, unsent + remaining
+
+        def callback(recipient, response, exception):
+            results[recipient] = {
+                'ok': exception is None,
+                'error': str(exception) if exception is not None else None,
+                'message_ids': planned[recipient]['message_ids']
+            }
+
+        # Sends are paced here, so run each chunk as a single batch
+        batching.execute_batches(service, requests, callback, batch_size=len(chunk), max_workers=1)
+        if utils.should_log(): print(f"--- MAILTO DISPATCH: {len(results)}/{len(to_send)} sent ---")
+
+    return results, remaining
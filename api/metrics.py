@@ -0,0 +1,208 @@
+# api/metrics.py
+# In-process counters and histograms for Gmail API usage, exposed in Prometheus text format.
+# Recording is a lock and a dict update; the text is only built when /api/metrics is scraped.
+import bisect
+import threading
+
+from . import config # Import config directly
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labelnames, label_values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, label_values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """A monotonically increasing count, optionally split by label values."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield self.name + _format_labels(self.labelnames, label_values), value
+
+class Histogram:
+    """Counts observations into cumulative buckets (upper bounds), plus their sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {} # label values -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            return sum(series[0]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            series_list = sorted((label_values, (list(counts), total))
+                                 for label_values, (counts, total) in self._series.items())
+        for label_values, (counts, total) in series_list:
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, label_values, extra=(('le', _format_number(upper_bound)),))
+                yield f'{self.name}_bucket{labels}', cumulative
+            yield self.name + '_sum' + _format_labels(self.labelnames, label_values), total
+            yield self.name + '_count' + _format_labels(self.labelnames, label_values), cumulative
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text exposition format (0.0.4)."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, buckets, labelnames=()):
+        return self.register(Histogram(name, help, buckets, labelnames))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{sample} {_format_number(value)}' for sample, value in metric.samples())
+        return '\n'.join(lines) + '\n'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+REGISTRY = Registry()
+
+# --- Gmail API Metrics ---
+
+API_CALLS = REGISTRY.counter(
+    'gmail_api_calls_total', 'Gmail API calls, including batch sub-requests and retries.', ('method',))
+QUOTA_UNITS = REGISTRY.counter(
+    'gmail_quota_units_total', 'Estimated Gmail quota units consumed (see config.GMAIL_QUOTA_UNITS).', ('method',))
+API_ERRORS = REGISTRY.counter(
+    'gmail_api_errors_total', 'Failed Gmail API calls by HTTP status.', ('method', 'status'))
+BATCH_SIZE = REGISTRY.histogram(
+    'gmail_batch_size', 'Sub-requests per Gmail batch request.', (1, 5, 10, 25, 50, 100))
+BATCH_SECONDS = REGISTRY.histogram(
+    'gmail_batch_duration_seconds', 'Wall time of one Gmail batch request.',
+    (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+PARSE_SECONDS = REGISTRY.histogram(
+    'unsubscribe_parse_duration_seconds', 'Time spent in find_unsubscribe_links per message.',
+    (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+
+# --- Scan Search Metrics (see query_plan.py) ---
+
+SEARCH_SECONDS = REGISTRY.histogram(
+    'scan_search_duration_seconds', 'Wall time of one messages.list call per search strategy.',
+    (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10), ('strategy',))
+SEARCH_MESSAGES = REGISTRY.counter(
+    'scan_search_messages_total', 'Messages listed per search strategy.', ('strategy',))
+SEARCH_HITS = REGISTRY.counter(
+    'scan_search_hits_total', 'Listed messages that had an unsubscribe link, per search strategy.', ('strategy',))
+
+def quota_units(method_id):
+    """Estimated quota units for one call, by discovery method ID (e.g. 'gmail.users.messages.get')."""
+    return config.GMAIL_QUOTA_UNITS.get(method_id, config.GMAIL_QUOTA_UNITS_DEFAULT)
+
+def record_api_call(method_id, error_status=None):
+    """Counts one Gmail API call and its estimated quota cost; error_status marks a failure."""
+    if not config.METRICS_ENABLED:
+        return
+    method_id = method_id or 'unknown'
+    API_CALLS.inc(method_id)
+    QUOTA_UNITS.inc(method_id, amount=quota_units(method_id))
+    if error_status is not None:
+        API_ERRORS.inc(method_id, str(error_status))
+
+def record_batch(size, seconds):
+    if not config.METRICS_ENABLED:
+        return
+    BATCH_SIZE.observe(size)
+    BATCH_SECONDS.observe(seconds)
+
+def observe_parse(seconds):
+    if config.METRICS_ENABLED:
+        PARSE_SECONDS.observe(seconds)
+
+def record_search(strategy, seconds, listed):
+    if not config.METRICS_ENABLED:
+        return
+    SEARCH_SECONDS.observe(seconds, strategy)
+    SEARCH_MESSAGES.inc(strategy, amount=listed)
+
+def record_search_hits(strategy, hits):
+    if config.METRICS_ENABLED:
+        SEARCH_HITS.inc(strategy, amount=hits)
+
+# --- Metered Requests ---
+
+_metered_request_class = None
+
+def metered_request_class():
+    """Returns an HttpRequest subclass that records each directly executed call.
+    Pass it to the discovery build as requestBuilder. Batched sub-requests aren't executed
+    individually, so batching.execute_batches records those."""
+    global _metered_request_class
+    if _metered_request_class is None:
+        from googleapiclient.http import HttpRequest # Deferred: heavy import
+        from googleapiclient.errors import HttpError
+
+        class MeteredHttpRequest(HttpRequest):
+            def execute(self, http=None, num_retries=0):
+                error_status = None
+                try:
+                    return super().execute(http=http, num_retries=num_retries)
+                except HttpError as e:
+                    error_status = e.resp.status
+                    raise
+                except Exception:
+                    error_status = 'error'
+                    raise
+                finally:
+                    record_api_call(self.methodId, error_status)
+
+        _metered_request_class = MeteredHttpRequest
+    return _metered_request_class
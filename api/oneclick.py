@@ -0,0 +1,230 @@
+# api/oneclick.py
+# Server-side execution of List-Unsubscribe HTTP links (RFC 8058 one-click POSTs, plain GETs otherwise).
+import time
+import socket
+import ipaddress
+import threading
+from urllib.parse import urlparse, urljoin
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config # Import config directly
+from . import utils
+
+# RFC 8058 section 3.1: the POST body is exactly this key/value pair
+ONE_CLICK_BODY = 'List-Unsubscribe=One-Click'
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+# --- Planning ---
+
+def is_one_click(list_unsubscribe_post, header_link):
+    """True when List-Unsubscribe-Post advertises one-click and the header link is HTTPS (RFC 8058)."""
+    if not list_unsubscribe_post or not header_link:
+        return False
+    return (list_unsubscribe_post.replace(' ', '').lower() == ONE_CLICK_BODY.lower()
+            and header_link.lower().startswith('https://'))
+
+def plan_requests(emails_data):
+    """Turns selected emails into deduplicated HTTP unsubscribe requests.
+    emails_data items need 'id', 'header_link' and optionally 'one_click'.
+    Returns {(method, url): [message IDs]}; identical targets are sent once."""
+    planned = {}
+    for email_data in emails_data:
+        link = email_data.get("header_link")
+        if not link:
+            continue
+        method = 'POST' if email_data.get("one_click") else 'GET'
+        planned.setdefault((method, link), []).append(email_data["id"])
+    return planned
+
+# --- Target Validation ---
+
+def _is_public_address(address):
+    ip = ipaddress.ip_address(address)
+    return not (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved
+                or ip.is_multicast or ip.is_unspecified)
+
+def check_url(url):
+    """Returns None for a well-formed HTTP(S) URL, else the reason it can't be requested.
+    Doesn't resolve the host; see resolve_target."""
+    try:
+        parsed = urlparse(url)
+        parsed.port # Raises ValueError for an out-of-range or non-numeric port
+    except ValueError as e:
+        return f"Malformed URL: {e}"
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return "Not an HTTP(S) URL"
+    return None
+
+def resolve_target(url, allow_private=None):
+    """Resolves the URL's host once. Returns (address to connect to, None) or (None, blocked reason).
+    Links come from untrusted mail, so hosts resolving to internal addresses are refused
+    unless config.UNSUBSCRIBE_ALLOW_PRIVATE_HOSTS is set (e.g. for a local stand-in server);
+    then the address is None and the host is resolved as usual."""
+    allow_private = config.UNSUBSCRIBE_ALLOW_PRIVATE_HOSTS if allow_private is None else allow_private
+    blocked = check_url(url)
+    if blocked or allow_private:
+        return None, blocked
+    parsed = urlparse(url)
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(parsed.hostname, parsed.port or None)]
+    except (socket.gaierror, UnicodeError) as e:
+        return None, f"Could not resolve host: {e}"
+    addresses = [address.split('%')[0] for address in addresses]
+    if not addresses or not all(_is_public_address(address) for address in addresses):
+        return None, "Host resolves to a private address"
+    return addresses[0], None
+
+def check_target(url, allow_private=None):
+    """Returns None if the URL may be requested, else the reason it was blocked."""
+    return resolve_target(url, allow_private)[1]
+
+class BlockedTargetError(Exception):
+    """Raised by PinnedAddressAdapter for a URL that must not be requested."""
+
+def _pinned_adapter_class():
+    # Built on first use: requests is only imported when unsubscribe requests are sent
+    from requests.adapters import HTTPAdapter
+
+    class PinnedAddressAdapter(HTTPAdapter):
+        """Validates each request's host (redirect hops included) and connects to the address it
+        validated, so a second DNS lookup can't rebind the host to an internal address. The URL's
+        host is still used for the Host header, TLS SNI and certificate checks."""
+
+        def __init__(self, allow_private=None, **kwargs):
+            self.allow_private = allow_private
+            super().__init__(**kwargs)
+
+        def send(self, request, **kwargs):
+            address, blocked = resolve_target(request.url, self.allow_private)
+            if blocked:
+                raise BlockedTargetError(blocked)
+            if address:
+                parsed = urlparse(request.url)
+                request.pinned_address = address
+                request.headers['Host'] = parsed.netloc.rpartition('@')[2]
+            return super().send(request, **kwargs)
+
+        def build_connection_pool_key_attributes(self, request, verify, cert=None):
+            host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+            address = getattr(request, 'pinned_address', None)
+            if address:
+                hostname = host_params['host']
+                host_params['host'] = f'[{address}]' if ':' in address else address
+                if host_params['scheme'] == 'https':
+                    pool_kwargs['server_hostname'] = hostname
+                    pool_kwargs['assert_hostname'] = hostname
+            return host_params, pool_kwargs
+
+    return PinnedAddressAdapter
+
+# --- Execution ---
+
+class OneClickExecutor:
+    """Sends unsubscribe requests on a pooled requests.Session.
+    Requests run on a bounded thread pool, with at most per_host_limit in flight per host."""
+
+    def __init__(self, session=None, max_workers=None, per_host_limit=None, timeout=None,
+                 max_redirects=None, allow_private=None):
+        self.max_workers = max_workers or config.UNSUBSCRIBE_HTTP_WORKERS
+        self.per_host_limit = per_host_limit or config.UNSUBSCRIBE_PER_HOST_LIMIT
+        self.timeout = timeout or config.UNSUBSCRIBE_HTTP_TIMEOUT
+        self.max_redirects = config.UNSUBSCRIBE_MAX_REDIRECTS if max_redirects is None else max_redirects
+        self.allow_private = allow_private
+        self.session = session or self._new_session()
+        self._host_limits = {}
+        self._host_limits_lock = threading.Lock()
+
+    def _new_session(self):
+        # requests is imported here rather than at module load; only unsubscribe requests need it
+        import requests
+        session = requests.Session()
+        session.trust_env = False # No proxies from the environment: connections go to the pinned address
+        adapter = _pinned_adapter_class()(allow_private=self.allow_private,
+                                          pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['User-Agent'] = config.UNSUBSCRIBE_USER_AGENT
+        return session
+
+    def _host_limit(self, url):
+        host = (urlparse(url).hostname or '').lower()
+        with self._host_limits_lock:
+            semaphore = self._host_limits.get(host)
+            if semaphore is None:
+                semaphore = self._host_limits[host] = threading.BoundedSemaphore(self.per_host_limit)
+        return semaphore
+
+    def _send(self, method, url):
+        import requests
+        if method == 'POST':
+            # One-click POSTs aren't redirected: a 3xx still means the sender received it
+            return self.session.post(url, data=ONE_CLICK_BODY, allow_redirects=False, timeout=self.timeout,
+                                     headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        # Follow GET redirects by hand so every hop is validated
+        for _ in range(self.max_redirects + 1):
+            response = self.session.get(url, allow_redirects=False, timeout=self.timeout)
+            location = response.headers.get('Location')
+            if response.status_code not in REDIRECT_STATUSES or not location:
+                return response
+            response.close()
+            url = urljoin(url, location)
+            blocked = check_url(url)
+            if blocked:
+                raise BlockedTargetError(f"Redirect blocked: {blocked}") # Hosts are checked by the adapter
+        raise requests.exceptions.TooManyRedirects(f"More than {self.max_redirects} redirects")
+
+    def execute_one(self, method, url):
+        """Sends one request. Returns a result dict: status is 'unsubscribed' (one-click accepted),
+        'requested' (GET succeeded, which may only have opened a confirmation page),
+        'failed' (HTTP error status), 'blocked' or 'error'."""
+        import requests
+        result = {'method': method, 'url': url, 'status': None, 'ok': False,
+                  'status_code': None, 'error': None, 'elapsed_ms': 0}
+        blocked = check_url(url) # The adapter resolves and checks the host when connecting
+        if blocked:
+            result.update(status='blocked', error=blocked)
+            return result
+
+        started = time.monotonic()
+        try:
+            with self._host_limit(url):
+                response = self._send(method, url)
+            response.close()
+            result['status_code'] = response.status_code
+            if response.status_code < 400:
+                result.update(status='unsubscribed' if method == 'POST' else 'requested', ok=True)
+            else:
+                result.update(status='failed', error=f"HTTP {response.status_code}")
+        except BlockedTargetError as e:
+            result.update(status='blocked', error=str(e))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            result.update(status='error', error=str(e))
+        result['elapsed_ms'] = int((time.monotonic() - started) * 1000)
+        if utils.should_log(): print(f"--- ONE-CLICK: {method} {urlparse(url).hostname} -> {result['status']} ({result['status_code']}) ---")
+        return result
+
+    def execute(self, planned):
+        """Runs planned requests ({(method, url): [message IDs]}) concurrently.
+        Returns {message_id: result dict}; messages sharing a target share its result."""
+        results = {}
+        if not planned:
+            return results
+        targets = list(planned)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets))) as pool:
+            outcomes = pool.map(lambda target: self.execute_one(*target), targets)
+            for target, outcome in zip(targets, outcomes):
+                for msg_id in planned[target]:
+                    results[msg_id] = outcome
+        return results
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Returns the process-wide executor, so warm invocations reuse pooled connections."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = OneClickExecutor()
+    return _executor
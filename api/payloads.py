@@ -0,0 +1,80 @@
+# api/payloads.py
+# Compact columnar JSON for scan results, served with ETag revalidation and gzip.
+import gzip
+import json
+import hashlib
+
+from flask import Response
+
+from . import config # Import config directly
+
+PAYLOAD_VERSION = 1
+
+class StringTable:
+    """Assigns each distinct string an index into a shared list. None is encoded as -1."""
+
+    def __init__(self):
+        self.strings = []
+        self._indexes = {}
+
+    def add(self, value):
+        if value is None:
+            return -1
+        index = self._indexes.get(value)
+        if index is None:
+            index = self._indexes[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+def build_columnar_payload(found_subscriptions, next_page_token=None, errors=0):
+    """Encodes grouped scan results (as built by scan.group_email_entries) column by column.
+
+    Layout:
+      strings: shared string table; every other string field is an index into it (-1 for None)
+      senders: {key, name, count} columns; each sender's emails are the next `count` rows of `emails`
+      emails:  {id, subject, date, full_sender, header_link, mailto_link, body_link, one_click} columns
+    Links, dates and subjects repeat heavily within a sender, so each is sent once."""
+    table = StringTable()
+    sender_columns = {'key': [], 'name': [], 'count': []}
+    email_columns = {'id': [], 'subject': [], 'date': [], 'full_sender': [],
+                     'header_link': [], 'mailto_link': [], 'body_link': [], 'one_click': []}
+
+    for sender_key, group in found_subscriptions.items():
+        sender_columns['key'].append(table.add(sender_key))
+        sender_columns['name'].append(table.add(group.get('display_name', sender_key)))
+        sender_columns['count'].append(len(group['emails']))
+        for email_data in group['emails']:
+            email_columns['id'].append(email_data['id']) # Unique per email; nothing to share
+            for field in ('subject', 'date', 'full_sender', 'header_link', 'mailto_link', 'body_link'):
+                email_columns[field].append(table.add(email_data.get(field)))
+            email_columns['one_click'].append(1 if email_data.get('one_click') else 0)
+
+    return {
+        'v': PAYLOAD_VERSION,
+        'strings': table.strings,
+        'senders': sender_columns,
+        'emails': email_columns,
+        'next_page_token': next_page_token,
+        'errors': errors
+    }
+
+def _accepts_gzip(request):
+    return 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+
+def conditional_json_response(payload, request):
+    """Returns payload as compact JSON with a weak ETag. Answers 304 when If-None-Match matches,
+    and gzips bodies over config.API_GZIP_MIN_BYTES for clients that accept it."""
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    response = Response(body, mimetype='application/json')
+    # Weak, because the gzipped and identity representations carry the same content
+    response.set_etag(hashlib.sha256(body).hexdigest()[:32], weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache' # Always revalidate; never shared
+    response.headers['Vary'] = 'Accept-Encoding, Cookie'
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        return response
+
+    if len(body) >= config.API_GZIP_MIN_BYTES and _accepts_gzip(request):
+        response.set_data(gzip.compress(body, compresslevel=config.API_GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
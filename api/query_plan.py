@@ -0,0 +1,117 @@
+# api/query_plan.py
+# Plans the candidate search behind a scan page as ordered passes (search strategies) instead of one
+# large OR query: the cheap has:list-unsubscribe pass comes first, then a keyword pass that excludes
+# its results. Scan page tokens record which pass a page continues, as '<pass>.<Gmail page token>'.
+import re
+import time
+
+from . import config # Import config directly
+from . import utils
+from . import timing
+from . import metrics
+
+PAGE_TOKEN_RE = re.compile(r'^(\d+)\.(.*)$')
+
+class SearchStrategy:
+    """One search pass: a Gmail query and label filter, listed page by page."""
+
+    def __init__(self, name, query, label_ids=('INBOX',)):
+        self.name = name
+        self.query = query
+        self.label_ids = list(label_ids)
+
+    def list_page(self, service, page_token, max_results):
+        """Lists one page. Returns (message stubs, Gmail next page token)."""
+        start = time.perf_counter()
+        with timing.span('gmail-list'):
+            list_response = service.users().messages().list(
+                userId='me',
+                maxResults=max_results,
+                pageToken=page_token,
+                q=self.query,
+                labelIds=self.label_ids
+            ).execute()
+        messages = list_response.get('messages', [])
+        metrics.record_search(self.name, time.perf_counter() - start, len(messages))
+        return messages, list_response.get('nextPageToken')
+
+    def __repr__(self):
+        return f"SearchStrategy({self.name!r}, {self.query!r})"
+
+# --- Strategy Registry ---
+
+STRATEGIES = {}
+
+def register_strategy(strategy):
+    """Makes a strategy available by name to config.SCAN_QUERY_STRATEGIES."""
+    STRATEGIES[strategy.name] = strategy
+    return strategy
+
+def keyword_query():
+    return ' OR '.join(config.UNSUBSCRIBE_SEARCH_TERMS + config.UNSUBSCRIBE_SEARCH_TERMS_ES_PT)
+
+# Header-bearing mail: an indexed attribute, cheap for Gmail to evaluate, and the best links
+register_strategy(SearchStrategy('list-unsubscribe', 'has:list-unsubscribe'))
+# Full-text keywords, only over what the first pass didn't already return
+register_strategy(SearchStrategy('keywords', f'-has:list-unsubscribe ({keyword_query()})'))
+# The previous single query, for comparison: SCAN_QUERY_STRATEGIES=combined
+register_strategy(SearchStrategy('combined', f'has:list-unsubscribe OR ({keyword_query()})'))
+
+def get_plan():
+    """The configured strategies, in order. Unknown names are skipped."""
+    plan = [STRATEGIES[name] for name in config.SCAN_QUERY_STRATEGIES if name in STRATEGIES]
+    return plan or [STRATEGIES['combined']]
+
+# --- Page Tokens ---
+
+def encode_page_token(pass_index, gmail_token):
+    return f"{pass_index}.{gmail_token or ''}"
+
+def decode_page_token(page_token):
+    """Returns (pass index, Gmail page token) for a scan page token; None starts the plan.
+    Tokens from before query planning (plain Gmail tokens) restart it too."""
+    if not page_token:
+        return 0, None
+    match = PAGE_TOKEN_RE.match(page_token)
+    if not match:
+        if utils.should_log(): print(f"--- QUERY PLAN: Unrecognized page token {page_token!r}, starting over ---")
+        return 0, None
+    return int(match.group(1)), match.group(2) or None
+
+# --- Planning ---
+
+def list_scan_page(service, page_token=None, page_size=None):
+    """Lists one scan page across the plan's passes. When a pass runs out mid-page, the page is
+    filled from the next pass. Stubs carry the 'strategy' that found them; IDs are deduplicated.
+    Returns (message stubs, next scan page token)."""
+    plan = get_plan()
+    page_size = page_size or config.EMAILS_PER_PAGE
+    pass_index, gmail_token = decode_page_token(page_token)
+    messages = []
+    seen_ids = set()
+    while pass_index < len(plan) and len(messages) < page_size:
+        strategy = plan[pass_index]
+        stubs, gmail_token = strategy.list_page(service, gmail_token, page_size - len(messages))
+        for stub in stubs:
+            if stub['id'] not in seen_ids:
+                seen_ids.add(stub['id'])
+                stub['strategy'] = strategy.name
+                messages.append(stub)
+        if utils.should_log(): print(f"--- QUERY PLAN: Pass '{strategy.name}' returned {len(stubs)} messages, more: {bool(gmail_token)} ---")
+        if gmail_token:
+            break # This pass continues on the next page
+        pass_index += 1
+
+    next_page_token = encode_page_token(pass_index, gmail_token) if pass_index < len(plan) else None
+    return messages, next_page_token
+
+def record_hits(messages, email_entries):
+    """Counts, per strategy, the listed messages that turned out to have an unsubscribe link.
+    Only messages present in email_entries are counted, so it can be called once per fetched chunk."""
+    hits = {}
+    for stub in messages:
+        entry = email_entries.get(stub['id'])
+        if entry is not None and entry.primary_link and stub.get('strategy'):
+            hits[stub['strategy']] = hits.get(stub['strategy'], 0) + 1
+    for strategy_name, count in hits.items():
+        metrics.record_search_hits(strategy_name, count)
@@ -0,0 +1,43 @@
+# api/records.py
+# Compact per-message scan records. Raw Gmail payloads are parsed into these and dropped.
+
+# Headers the scan reads; anything else is skipped while indexing
+INDEXED_HEADERS = frozenset(('from', 'subject', 'list-unsubscribe', 'x-list-unsubscribe', 'list-unsubscribe-post'))
+
+def index_headers(headers, wanted=INDEXED_HEADERS):
+    """Indexes a Gmail header list in one pass: {lowercase name: [values in order]}, wanted names only."""
+    index = {}
+    for header in headers:
+        name = header.get('name', '').lower()
+        if name in wanted:
+            index.setdefault(name, []).append(header.get('value', ''))
+    return index
+
+class ScannedEmail:
+    """What a scan keeps for one message: its unsubscribe links and display headers.
+    Uses __slots__ so thousands of records stay small; internal_date is an int (ms since epoch)."""
+
+    __slots__ = ('id', 'header_link', 'mailto_link', 'body_link', 'one_click',
+                 'sender', 'subject', 'internal_date')
+
+    def __init__(self, id, header_link=None, mailto_link=None, body_link=None, one_click=False,
+                 sender='Unknown Sender', subject='No Subject', internal_date=0):
+        self.id = id
+        self.header_link = header_link
+        self.mailto_link = mailto_link
+        self.body_link = body_link
+        self.one_click = bool(one_click)
+        self.sender = sender
+        self.subject = subject
+        self.internal_date = int(internal_date or 0)
+
+    @property
+    def primary_link(self):
+        """The link to act on first: header > mailto > body."""
+        return self.header_link or self.mailto_link or self.body_link
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f"ScannedEmail(id={self.id!r}, sender={self.sender!r}, primary_link={self.primary_link!r})"
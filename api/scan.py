@@ -1,17 +1,26 @@
-import os
-import re
-import base64
-import email
+import json
+import time
 from urllib.parse import urlparse, parse_qs
-from email.mime.text import MIMEText
-from flask import Blueprint, redirect, url_for, request, session, flash, render_template, jsonify
-from googleapiclient.discovery import build # Needed?
+from flask import Blueprint, redirect, url_for, request, session, flash, render_template, jsonify, Response, stream_with_context
 from datetime import datetime # Add datetime import
-from googleapiclient.http import BatchHttpRequest # Import BatchHttpRequest
 
 # Import utils and constants
 from . import utils
 from . import config # Import config directly
+from . import extract
+from . import records
+from . import senders
+from . import payloads
+from . import scan_index
+from . import census
+from . import batching
+from . import oneclick
+from . import mailto
+from . import archive
+from . import sender_archive
+from . import timing
+from . import metrics
+from . import query_plan
 
 # Add url_prefix to the blueprint
 scan_bp = Blueprint('scan', __name__, url_prefix='/scan')
@@ -62,17 +71,20 @@ def _get_mock_message_details(msg_id):
 
 # --- Helper Functions --- 
 
-def find_unsubscribe_links(message_data):
-    """Parses email for unsubscribe links from headers and body"""
+def find_unsubscribe_links(message_data, header_index=None):
+    """Parses email for unsubscribe links from headers and body.
+    Pass a records.index_headers result to reuse an existing header index."""
     unsubscribe_info = {
         "header_link": None, 
         "mailto_link": None,
         "body_link": None,  # New field for body links
-        "body_link_score": 0  # Score to prioritize better body links
+        "body_link_score": 0,  # Score to prioritize better body links
+        "one_click": False  # RFC 8058: header link accepts a one-click POST
     }
     
     try:
-        headers = message_data.get('payload', {}).get('headers', [])
+        if header_index is None:
+            header_index = records.index_headers(message_data.get('payload', {}).get('headers', []))
         
         # Define the headers to check (in priority order)
         unsubscribe_headers = [
@@ -81,89 +93,27 @@ def find_unsubscribe_links(message_data):
             'list-unsubscribe-post'  # Sometimes contains different links
         ]
         
+        list_unsubscribe_post = next(iter(header_index.get('list-unsubscribe-post', [])), None)
+
         # First pass: Check standard unsubscribe headers
         for header_name in unsubscribe_headers:
-            for header in headers:
-                if header['name'].lower() == header_name:
-                    value = header['value']
-                    parse_unsubscribe_header_value(value, unsubscribe_info)
-                    # If we found an HTTP link, we can break early
-                    if unsubscribe_info["header_link"]:
-                        break
+            for value in header_index.get(header_name, []):
+                parse_unsubscribe_header_value(value, unsubscribe_info)
+                # If we found an HTTP link, we can break early
+                if unsubscribe_info["header_link"]:
+                    break
         
+        unsubscribe_info["one_click"] = oneclick.is_one_click(list_unsubscribe_post, unsubscribe_info["header_link"])
+
         # Always parse body for links, regardless of whether we found header links
         try:
-            # Get message body parts
-            parts = message_data.get('payload', {}).get('parts', [])
-            if not parts and message_data.get('payload'):
-                parts = [message_data.get('payload')]
-                
-            for part in parts:
-                if part.get('mimeType') == 'text/html':
-                    # Get and decode body data
-                    data = part.get('body', {}).get('data', '')
-                    if data:
-                        body_html = base64.urlsafe_b64decode(data).decode('utf-8')
-                        
-                        # More comprehensive search for unsubscribe links with context
-                        # First look for links with unsubscribe text in the anchor text itself
-                        unsubscribe_anchors = re.findall(r'<a\s+[^>]*href=["\'](https?://[^"\']+)["\'][^>]*>([^<]+)</a>', body_html, re.IGNORECASE)
-                        
-                        best_score = 0
-                        best_link = None
-                        
-                        # Check anchor text links first
-                        for url, anchor_text in unsubscribe_anchors:
-                            score = 0
-                            anchor_lower = anchor_text.lower()
-                            
-                            # Score based on anchor text quality
-                            if 'unsubscribe' in anchor_lower:
-                                score += 10
-                            elif 'opt out' in anchor_lower or 'opt-out' in anchor_lower:
-                                score += 8
-                            elif 'cancel' in anchor_lower and ('subscription' in anchor_lower or 'newsletter' in anchor_lower):
-                                score += 7
-                            elif 'preferences' in anchor_lower or 'manage' in anchor_lower:
-                                score += 5
-                            
-                            # Score based on URL quality
-                            url_lower = url.lower()
-                            if 'unsubscribe' in url_lower:
-                                score += 5
-                            elif 'opt-out' in url_lower or 'optout' in url_lower:
-                                score += 4
-                            elif 'preference' in url_lower:
-                                score += 3
-                                
-                            # Penalize likely webhook or tracking URLs
-                            if 'webhook' in url_lower or 'callback' in url_lower or 'track' in url_lower:
-                                score -= 5
-                            
-                            # If this link is better than what we've found so far
-                            if score > best_score:
-                                best_score = score
-                                best_link = url
-                        
-                        # If we didn't find a good link with anchor text, try the older regex patterns
-                        if best_score < 5:
-                            unsubscribe_patterns = [
-                                r'href=["\'](https?://[^"\']*unsubscribe[^"\']*)["\']',
-                                r'href=["\'](https?://[^"\']*opt.?out[^"\']*)["\']',
-                                r'href=["\'](https?://[^"\']*preferences[^"\']*)["\']'
-                            ]
-                            
-                            for pattern in unsubscribe_patterns:
-                                matches = re.findall(pattern, body_html, re.IGNORECASE)
-                                if matches:
-                                    best_link = matches[0]
-                                    best_score = 2  # Lower priority than anchor text links
-                                    break
-                        
-                        # Update body link if we found a good one
-                        if best_link and best_score > 0:
-                            unsubscribe_info["body_link"] = best_link
-                            unsubscribe_info["body_link_score"] = best_score
+            # Walk the whole MIME tree, decoding lazily and stopping at a clear winner
+            best_link, best_score = extract.find_body_link(message_data.get('payload', {}))
+
+            # Update body link if we found a good one
+            if best_link and best_score > 0:
+                unsubscribe_info["body_link"] = best_link
+                unsubscribe_info["body_link_score"] = best_score
         except Exception as e:
             print(f"Error parsing body for unsubscribe link: {e}")
             
@@ -263,12 +213,206 @@ def format_email_date(internal_date_ms):
         print(f"Error formatting date {internal_date_ms}: {e}")
         return "Unknown Date"
 
+def _batch_get_messages(service, msg_ids, message_format, metadata_headers=None, parse=None):
+    """Fetches messages with concurrent Gmail batch requests (see batching.py).
+    With parse(msg_id, message), each message is parsed as it arrives and only the result is
+    kept, so raw payloads are released batch by batch rather than held until the end.
+    Returns a tuple of (details or parsed results keyed by message ID, errors keyed by message ID)."""
+    message_details = {}
+    batch_errors = {}
+    timer = timing.current_timer() # Callbacks run on worker threads, outside the request context
+
+    def batch_callback(request_id, response, exception):
+        if exception:
+            # Handle error for this specific request
+            print(f"!!! BATCH ERROR fetching message {request_id}: {exception} !!!")
+            batch_errors[request_id] = str(exception)
+        else:
+            # Store the parsed record (or the raw response if there's no parser)
+            if parse:
+                with timing.span('parse', timer):
+                    message_details[request_id] = parse(request_id, response)
+            else:
+                message_details[request_id] = response
+
+    # Building a Resource is surprisingly costly, so do it once rather than per message
+    messages_resource = service.users().messages()
+    get_requests = []
+    for msg_id in msg_ids:
+        if message_format == 'metadata':
+            get_request = messages_resource.get(
+                userId='me', id=msg_id, format='metadata', metadataHeaders=metadata_headers)
+        else:
+            get_request = messages_resource.get(userId='me', id=msg_id, format=message_format)
+        get_requests.append((msg_id, get_request)) # Use msg_id to map results easily
+
+    if utils.should_log(): print(f"--- Executing {message_format} batches for {len(msg_ids)} emails ---")
+    with timing.span(f'batch-{message_format}'):
+        batching.execute_batches(service, get_requests, batch_callback)
+    if utils.should_log(): print(f"--- {message_format} batches finished. Errors: {len(batch_errors)} ---")
+    return message_details, batch_errors
+
+def build_email_entry(msg_id, message):
+    """Parses one Gmail message into a compact ScannedEmail. Headers are indexed once
+    and shared with link extraction; nothing from the raw payload is kept."""
+    header_index = records.index_headers(message.get('payload', {}).get('headers', []))
+    started = time.perf_counter()
+    unsubscribe_info = find_unsubscribe_links(message, header_index)
+    metrics.observe_parse(time.perf_counter() - started)
+    return records.ScannedEmail(
+        msg_id,
+        header_link=unsubscribe_info.get("header_link"),
+        mailto_link=unsubscribe_info.get("mailto_link"),
+        body_link=unsubscribe_info.get("body_link"),
+        one_click=unsubscribe_info.get("one_click", False),
+        sender=next(iter(header_index.get('from', [])), 'Unknown Sender'),
+        subject=next(iter(header_index.get('subject', [])), 'No Subject'),
+        internal_date=message.get('internalDate', 0)
+    )
+
+def fetch_email_entries(service, msg_ids, fetch_bodies=True):
+    """Fetches and extracts entries for message IDs in two phases.
+    With fetch_bodies=False only the metadata phase runs.
+    Returns a tuple of (entries keyed by message ID in list order, errors keyed by message ID)."""
+    batch_errors = {}
+
+    # Phase 1: headers only. Most bulk mail carries a List-Unsubscribe header,
+    # so this avoids downloading HTML bodies and attachments for them.
+    metadata_entries, metadata_errors = _batch_get_messages(
+        service, msg_ids, 'metadata', metadata_headers=config.METADATA_HEADERS, parse=build_email_entry)
+    batch_errors.update(metadata_errors)
+
+    # Phase 2: full bodies, only for messages without a header link
+    body_ids = [msg_id for msg_id, entry in metadata_entries.items() if not entry.header_link]
+    full_entries = {}
+    if body_ids and fetch_bodies:
+        full_entries, full_errors = _batch_get_messages(service, body_ids, 'full', parse=build_email_entry)
+        batch_errors.update(full_errors)
+    if utils.should_log(): print(f"--- Metadata fetched for {len(metadata_entries)} emails, full bodies for {len(full_entries)} ---")
+
+    # Keep the list order; prefer the full message when we have it
+    entries = {}
+    for msg_id in msg_ids:
+        entry = full_entries.get(msg_id) or metadata_entries.get(msg_id)
+        if entry:
+            entries[msg_id] = entry
+    return entries, batch_errors
+
+def _get_scan_index_user(service):
+    """Returns the scan index key for the signed-in mailbox, cached in the session.
+    Also returns the users.getProfile response when one had to be fetched, else None."""
+    user_key = session.get('scan_index_user')
+    profile = None
+    if not user_key:
+        profile = service.users().getProfile(userId='me').execute()
+        user_key = scan_index.make_user_key(profile['emailAddress'])
+        session['scan_index_user'] = user_key
+    return user_key, profile
+
+def get_email_entries(service, msg_ids, fetch_bodies=True, sync_index=True):
+    """Returns entries for message IDs, serving indexed messages from the scan index
+    and fetching only the rest. Returns (entries in list order, errors).
+    Pass sync_index=False when the index was already synced earlier in the request."""
+    index = scan_index.get_scan_index()
+    if not index:
+        return fetch_email_entries(service, msg_ids, fetch_bodies=fetch_bodies)
+
+    user_key, profile = _get_scan_index_user(service)
+    if sync_index:
+        with timing.span('index-sync'):
+            index.sync(service, user_key, profile=profile)
+    indexed = index.get_entries(user_key, msg_ids)
+    missing_ids = [msg_id for msg_id in msg_ids if msg_id not in indexed]
+    if utils.should_log(): print(f"--- SCAN INDEX: {len(indexed)} indexed, {len(missing_ids)} to fetch ---")
+
+    fetched, batch_errors = {}, {}
+    if missing_ids:
+        fetched, batch_errors = fetch_email_entries(service, missing_ids, fetch_bodies=fetch_bodies)
+        # Without the body phase, entries lacking a header link are incomplete; don't index them
+        index.put_entries(user_key, [entry for entry in fetched.values()
+                                     if fetch_bodies or entry.header_link])
+
+    entries = {}
+    for msg_id in msg_ids:
+        entry = indexed.get(msg_id) or fetched.get(msg_id)
+        if entry:
+            entries[msg_id] = entry
+    return entries, batch_errors
+
+def list_scan_page(service, page_token=None):
+    """Lists one page of candidate messages. Returns (message stubs, next page token).
+    The search runs as the passes in config.SCAN_QUERY_STRATEGIES (see query_plan.py)."""
+    if MOCK_API:
+        list_response = _get_mock_message_list(page_token=page_token)
+        return list_response.get('messages', []), list_response.get('nextPageToken')
+    return query_plan.list_scan_page(service, page_token)
+
+def _get_mock_email_entries(messages):
+    """Builds entries from mock message details, bypassing batch."""
+    email_entries = {}
+    for message_stub in messages:
+        msg_id = message_stub['id']
+        full_message = _get_mock_message_details(msg_id)
+        full_message['internalDate'] = str(int(datetime.now().timestamp() * 1000)) # Mock date
+        email_entries[msg_id] = build_email_entry(msg_id, full_message)
+    return email_entries
+
+def group_email_entries(email_entries, found_subscriptions, sender_index=None):
+    """Adds entries that have at least one unsubscribe link to found_subscriptions, grouped by
+    canonical sender (see senders.SenderIndex; by address unless the index says otherwise).
+    Returns the group keys touched, in first-seen order."""
+    sender_index = sender_index or senders.SenderIndex()
+    touched_senders = []
+    for msg_id, entry in email_entries.items():
+        try: 
+            # Determine the primary link for display/initial action based on priority: header > mailto > body
+            primary_link = entry.primary_link
+
+            if primary_link: # Proceed if at least one type of link was found
+                sender = entry.sender
+                sender_key = sender_index.key(sender)
+                
+                email_data = {
+                    "id": msg_id, 
+                    "subject": sender_index.intern(entry.subject), 
+                    "date": format_email_date(entry.internal_date),
+                    "full_sender": sender,
+                    # Store all potential links
+                    "header_link": entry.header_link, 
+                    "mailto_link": entry.mailto_link, 
+                    "body_link": entry.body_link,
+                    "one_click": entry.one_click,
+                    # Store the primary link determined for this specific email
+                    "unsubscribe_link": primary_link 
+                }
+                
+                if sender_key not in found_subscriptions:
+                    found_subscriptions[sender_key] = {
+                        'display_name': sender_index.display_name(sender_key),
+                        'emails': [email_data],
+                    }
+                else:
+                    found_subscriptions[sender_key]['emails'].append(email_data)
+                if sender_key not in touched_senders:
+                    touched_senders.append(sender_key)
+                    
+        except Exception as msg_error:
+             # Log error processing a specific message after batch fetch
+             print(f"!!! ERROR processing message {msg_id} (post-batch): {msg_error} !!!")
+             # Continue processing other messages
+    return touched_senders
+
+def _sse_event(event, data):
+    """Formats one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 # --- Routes --- 
 
 @scan_bp.route('/emails', methods=['GET'])
 def scan_emails():
     """Scans recent emails for unsubscribe links, supporting pagination.
-    Uses batching to fetch email details efficiently."""
+    Uses batching to fetch email details efficiently.
+    With stream=1 the page is rendered empty and filled in the browser from /scan/emails/stream."""
     if utils.should_log(): print("--- SCAN ROUTE START (Batching Enabled) ---")
     page_token = request.args.get('token', None)
     if utils.should_log(): print(f"--- SCAN ROUTE: Received page token: {page_token} ---")
@@ -277,6 +421,8 @@ def scan_emails():
         session['return_to_scan_token'] = page_token
         if utils.should_log(): print(f"Storing current scan token: {page_token} for possible return")
     
+    group_by = request.args.get('group_by', senders.GROUP_BY_ADDRESS)
+    sender_index = senders.SenderIndex(group_by)
     archive_enabled = request.args.get('archive_enabled') == 'true'
     if utils.should_log(): print(f"--- SCAN ROUTE: Archive just enabled: {archive_enabled} ---")
 
@@ -289,161 +435,68 @@ def scan_emails():
     authenticated = True 
     found_subscriptions = {} 
     next_page_token = None 
+    batch_errors = {}
     
     if utils.should_log(): print("--- SCAN ROUTE: Checking archive permission... ---")
     has_archive_permission = utils.has_modify_scope()
     if utils.should_log(): print(f"--- SCAN ROUTE: Result of has_modify_scope check: {has_archive_permission} ---")
+    has_send_permission = utils.has_send_scope()
     
     colors = config.SENDER_COLORS # Get colors from config
 
+    if request.args.get('stream') == '1':
+        # Render only the page shell; scan-results-stream.js fills it from /scan/emails/stream
+        return render_template('scan_results.html',
+                              subscriptions={},
+                              streaming=True,
+                              stream_url=url_for('scan.stream_scan_emails', token=page_token, group_by=sender_index.group_by),
+                              authenticated=authenticated,
+                              current_page_token=page_token,
+                              next_page_token=None,
+                              colors=colors,
+                              has_archive_permission=has_archive_permission,
+                              has_send_permission=has_send_permission,
+                              group_by=sender_index.group_by,
+                              config=config)
+
     try:
         if utils.should_log(): print("Fetching email list page.")
         max_scan_emails = config.MAX_SCAN_EMAILS # Get constant from config
         
-        list_response = None
-        messages = []
-        
-        if MOCK_API:
-            list_response = _get_mock_message_list(page_token=page_token)
-            messages = list_response.get('messages', [])
-            next_page_token = list_response.get('nextPageToken')
-        else:
-            spanish_portuguese_terms = ['"cancelar suscripción"', '"desuscribirse"', '"darse de baja"', 
-                                       '"cancelar inscrição"', '"descadastrar"', '"desinscrever"']
-            all_search_terms = config.UNSUBSCRIBE_SEARCH_TERMS + spanish_portuguese_terms
-            keyword_query = ' OR '.join(all_search_terms)
-            combined_query = f"has:list-unsubscribe OR ({keyword_query})"
-            if utils.should_log(): print(f"--- SCAN ROUTE: Using combined query: {combined_query} ---")
-
-            list_response = service.users().messages().list(
-                userId='me',
-                maxResults=config.EMAILS_PER_PAGE, # Use config for page size
-                pageToken=page_token,
-                q=combined_query, 
-                labelIds=['INBOX']
-            ).execute()
-            
-            messages = list_response.get('messages', [])
-            next_page_token = list_response.get('nextPageToken')
+        messages, next_page_token = list_scan_page(service, page_token)
 
         if not messages: 
             print("No messages found on this page.")
         else:
-            message_details = {} # To store results from batch
-            batch_errors = {}    # To store errors from batch
-
-            # Define the callback function for the batch request
-            def batch_callback(request_id, response, exception):
-                if exception:
-                    # Handle error for this specific request
-                    print(f"!!! BATCH ERROR fetching message {request_id}: {exception} !!!")
-                    batch_errors[request_id] = str(exception)
-                else:
-                    # Store successful response
-                    message_details[request_id] = response
+            email_entries = {} # Extracted links and headers per message ID
 
-            # Define the correct Gmail batch URI
-            gmail_batch_uri = f"{service._baseUrl}/batch/gmail/v1"
-            if utils.should_log(): print(f"--- SCAN ROUTE: Using Gmail Batch URI: {gmail_batch_uri} ---")
-            
-            # Create a batch request with the specific URI and callback
-            batch = BatchHttpRequest(batch_uri=gmail_batch_uri, callback=batch_callback)
-            
-            # Add each message get request to the batch
-            for message_stub in messages:
-                msg_id = message_stub['id']
-                if MOCK_API:
-                    # If mocking, get details directly, bypass batch
-                    full_message = _get_mock_message_details(msg_id)
-                    full_message['internalDate'] = str(int(datetime.now().timestamp() * 1000)) # Mock date
-                    message_details[msg_id] = full_message
-                else:
-                    batch.add(
-                        service.users().messages().get(userId='me', id=msg_id, format='full'),
-                        # callback=batch_callback, # Callback is now set during BatchHttpRequest init
-                        request_id=msg_id # Use msg_id to map results easily
-                    )
-            
-            # Execute the batch request if not mocking API
-            if not MOCK_API and len(messages) > 0:
-                 if utils.should_log(): print(f"--- SCAN ROUTE: Executing batch request for {len(messages)} emails ---")
-                 try:
-                     batch.execute(http=service._http) # Pass authenticated http object
-                     if utils.should_log(): print(f"--- SCAN ROUTE: Batch execution finished. Errors: {len(batch_errors)}")
-                 except Exception as batch_exec_error:
-                      print(f"!!! FATAL BATCH EXECUTION ERROR: {batch_exec_error} !!!")
-                      flash("A critical error occurred while fetching email details.", "error")
-                      # Render template with error, potentially empty subscriptions
-                      return render_template('scan_results.html', 
-                                subscriptions={}, 
-                                error=f"Batch fetch error: {batch_exec_error}", 
-                                authenticated=authenticated, 
-                                current_page_token=page_token, 
-                                next_page_token=next_page_token, 
-                                colors=colors,
-                                has_archive_permission=has_archive_permission,
-                                config=config)
-
-            # Process the results collected by the batch callback (or directly if mocking)
-            if utils.should_log(): print(f"--- SCAN ROUTE: Processing {len(message_details)} fetched email details ---")
-            for msg_id, full_message in message_details.items():
-                try: 
-                    # Get the dictionary of links
-                    unsubscribe_info = find_unsubscribe_links(full_message)
-                    header_link = unsubscribe_info.get("header_link")
-                    mailto_link = unsubscribe_info.get("mailto_link")
-                    body_link = unsubscribe_info.get("body_link")
-
-                    # Determine the primary link for display/initial action based on priority: header > mailto > body
-                    primary_link = header_link or mailto_link or body_link
-
-                    if primary_link: # Proceed if at least one type of link was found
-                        headers = full_message.get('payload', {}).get('headers', [])
-                        sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown Sender')
-                        subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
-                        
-                        internal_date = full_message.get('internalDate', '0')
-                        email_date_formatted = format_email_date(internal_date)
-                        
-                        # Determine clean sender name
-                        if '<' in sender and '>' in sender:
-                            clean_sender = sender[:sender.find('<')].strip().replace('"', '')
-                            if not clean_sender:
-                                start = sender.find('<') + 1; end = sender.find('>')
-                                clean_sender = sender[start:end] if start < end else sender
-                        else: 
-                            clean_sender = sender
-                        
-                        email_data = {
-                            "id": msg_id, 
-                            "subject": subject, 
-                            "date": email_date_formatted,
-                            "full_sender": sender,
-                            # Store all potential links
-                            "header_link": header_link, 
-                            "mailto_link": mailto_link, 
-                            "body_link": body_link,
-                            # Store the primary link determined for this specific email
-                            "unsubscribe_link": primary_link 
-                        }
-                        
-                        if clean_sender not in found_subscriptions:
-                            found_subscriptions[clean_sender] = {
-                                'emails': [email_data],
-                                # Keep the first primary link found for the sender group 
-                                # for display purposes in the header? Or maybe remove this top-level one.
-                                # Let's remove it for now to avoid confusion. The link per email is more accurate.
-                                # 'unsubscribe_link': primary_link 
-                            }
-                        else:
-                            found_subscriptions[clean_sender]['emails'].append(email_data)
-                            # Update sender group's primary link if a header link is found later? 
-                            # No, keep it simple. Each email has its own links.
-                            
-                except Exception as msg_error:
-                     # Log error processing a specific message after batch fetch
-                     print(f"!!! ERROR processing message {msg_id} (post-batch): {msg_error} !!!")
-                     # Continue processing other messages
+            if MOCK_API:
+                email_entries = _get_mock_email_entries(messages)
+            else:
+                msg_ids = [message_stub['id'] for message_stub in messages]
+                try:
+                    email_entries, batch_errors = get_email_entries(service, msg_ids)
+                except Exception as batch_exec_error:
+                    print(f"!!! FATAL BATCH EXECUTION ERROR: {batch_exec_error} !!!")
+                    flash("A critical error occurred while fetching email details.", "error")
+                    # Render template with error, potentially empty subscriptions
+                    return render_template('scan_results.html', 
+                              subscriptions={}, 
+                              error=f"Batch fetch error: {batch_exec_error}", 
+                              authenticated=authenticated, 
+                              current_page_token=page_token, 
+                              next_page_token=next_page_token, 
+                              colors=colors,
+                              has_archive_permission=has_archive_permission,
+                              has_send_permission=has_send_permission,
+                              group_by=sender_index.group_by,
+                              config=config)
+
+            # Group the extracted entries by sender
+            if utils.should_log(): print(f"--- SCAN ROUTE: Processing {len(email_entries)} email entries ---")
+            query_plan.record_hits(messages, email_entries)
+            with timing.span('group'):
+                group_email_entries(email_entries, found_subscriptions, sender_index)
 
         if utils.should_log(): print(f"--- SCAN ROUTE: Finished processing page. Found {len(found_subscriptions)} unique senders. Next token: {next_page_token} ---")
 
@@ -453,31 +506,191 @@ def scan_emails():
         # Pass colors, archive permission, and config here too
         return render_template('scan_results.html', 
                           subscriptions=found_subscriptions, # Might be partially populated
+                          email_payload=payloads.build_columnar_payload(found_subscriptions, next_page_token),
                           error=str(e), 
                           authenticated=authenticated, 
                           current_page_token=page_token, 
                           next_page_token=next_page_token, # Pass original next token if available
                           colors=colors,
                           has_archive_permission=has_archive_permission,
+                          has_send_permission=has_send_permission,
+                          group_by=sender_index.group_by,
                           config=config)
 
     if not found_subscriptions and not page_token:
         flash("No emails with unsubscribe links found in the initial scan.", "info")
 
     # Pass colors, archive permission, and config to the template context
+    # The email details travel in the page itself (columnar layout, as /scan/api/emails serves it)
     return render_template('scan_results.html', 
                           subscriptions=found_subscriptions, 
+                          email_payload=payloads.build_columnar_payload(found_subscriptions, next_page_token, errors=len(batch_errors)),
                           authenticated=authenticated, 
                           current_page_token=page_token, 
                           next_page_token=next_page_token, 
                           colors=colors,
                           has_archive_permission=has_archive_permission,
+                          has_send_permission=has_send_permission,
+                          group_by=sender_index.group_by,
                           config=config)
 
+@scan_bp.route('/emails/stream', methods=['GET'])
+def stream_scan_emails():
+    """Streams one scan page as Server-Sent Events.
+    Messages are fetched in sub-batches of config.STREAM_CHUNK_SIZE; after each one a `senders`
+    event carries the new emails per sender group, and a final `done` event carries next_page_token.
+    Accepts group_by=address|domain like /scan/emails."""
+    page_token = request.args.get('token', None)
+    sender_index = senders.SenderIndex(request.args.get('group_by', senders.GROUP_BY_ADDRESS))
+    service = utils.get_gmail_service()
+    if not service:
+        return jsonify({"success": False, "error": "Authentication required. Please refresh and log in again."}), 401
+
+    try:
+        messages, next_page_token = list_scan_page(service, page_token)
+        # Resolve and sync the scan index while the session is still writable
+        index = scan_index.get_scan_index()
+        if index and not MOCK_API and messages:
+            user_key, profile = _get_scan_index_user(service)
+            index.sync(service, user_key, profile=profile)
+    except Exception as e:
+        print(f"!!! ERROR listing messages for stream: {e} !!!")
+        return jsonify({"success": False, "error": f"Scan failed: {e}"}), 500
+
+    msg_ids = [message_stub['id'] for message_stub in messages]
+    if utils.should_log(): print(f"--- SCAN STREAM: {len(msg_ids)} messages, next token: {next_page_token} ---")
+
+    def generate():
+        found_subscriptions = {}
+        error_count = 0
+        try:
+            for chunk in batching.chunked(msg_ids, config.STREAM_CHUNK_SIZE):
+                if MOCK_API:
+                    email_entries, batch_errors = _get_mock_email_entries([{'id': msg_id} for msg_id in chunk]), {}
+                else:
+                    email_entries, batch_errors = get_email_entries(service, chunk, sync_index=False)
+                error_count += len(batch_errors)
+                query_plan.record_hits(messages, email_entries)
+                # Only send the emails this sub-batch added to each sender group
+                counts_before = {sender: len(group['emails']) for sender, group in found_subscriptions.items()}
+                touched_senders = group_email_entries(email_entries, found_subscriptions, sender_index)
+                if touched_senders:
+                    yield _sse_event('senders', {
+                        sender: {
+                            "display_name": found_subscriptions[sender]['display_name'],
+                            "emails": found_subscriptions[sender]['emails'][counts_before.get(sender, 0):]
+                        }
+                        for sender in touched_senders
+                    })
+        except Exception as e:
+            print(f"!!! ERROR during streamed scan: {e} !!!")
+            yield _sse_event('error', {"error": str(e)})
+            return
+        yield _sse_event('done', {
+            "next_page_token": next_page_token,
+            "total_messages": len(msg_ids),
+            "total_senders": len(found_subscriptions),
+            "errors": error_count
+        })
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Don't let proxies buffer the stream
+    return response
+
+@scan_bp.route('/api/emails', methods=['GET'])
+def scan_emails_api():
+    """JSON version of /scan/emails for one page (token, group_by params), in the compact
+    columnar layout from payloads.build_columnar_payload. Supports If-None-Match and gzip."""
+    service = utils.get_gmail_service()
+    if not service:
+        return jsonify({"success": False, "error": "Authentication required. Please refresh and log in again."}), 401
+
+    page_token = request.args.get('token', None)
+    sender_index = senders.SenderIndex(request.args.get('group_by', senders.GROUP_BY_ADDRESS))
+    found_subscriptions = {}
+    try:
+        messages, next_page_token = list_scan_page(service, page_token)
+        batch_errors = {}
+        if MOCK_API:
+            email_entries = _get_mock_email_entries(messages)
+        else:
+            email_entries, batch_errors = get_email_entries(service, [m['id'] for m in messages])
+        query_plan.record_hits(messages, email_entries)
+        group_email_entries(email_entries, found_subscriptions, sender_index)
+    except Exception as e:
+        print(f"!!! ERROR during API scan: {e} !!!")
+        return jsonify({"success": False, "error": f"Scan failed: {e}"}), 500
+
+    payload = payloads.build_columnar_payload(found_subscriptions, next_page_token, errors=len(batch_errors))
+    return payloads.conditional_json_response(payload, request)
+
+@scan_bp.route('/census', methods=['GET'])
+def sender_census():
+    """Walks pages of the list-unsubscribe query for up to config.CENSUS_TIME_BUDGET seconds and returns
+    the top senders by volume in those pages, with next_page_token to continue from (token param).
+    Each response covers only its own pages: merge slices by sender (sum counts, keep the newest and
+    oldest timestamps, lowest best_link_rank); top=0 returns every sender so the merge is exact.
+    Only per-sender aggregates are kept; message payloads are discarded page by page."""
+    service = utils.get_gmail_service()
+    if not service:
+        return jsonify({"success": False, "error": "Authentication required. Please refresh and log in again."}), 401
+
+    top_n = request.args.get('top', config.CENSUS_TOP_N, type=int)
+    max_messages = request.args.get('max_messages', None, type=int)
+    page_token = request.args.get('token', None)
+    if utils.should_log(): print(f"--- CENSUS ROUTE: top={top_n}, max_messages={max_messages}, token={page_token} ---")
+
+    def get_census_entries(service, msg_ids):
+        # Header links are enough to rank senders; skip the full-body phase
+        return get_email_entries(service, msg_ids, fetch_bodies=False, sync_index=False)
+
+    sender_index = senders.SenderIndex(request.args.get('group_by', senders.GROUP_BY_ADDRESS))
+    try:
+        # Sync the scan index once up front rather than once per page
+        index = scan_index.get_scan_index()
+        if index and not MOCK_API:
+            user_key, profile = _get_scan_index_user(service)
+            index.sync(service, user_key, profile=profile)
+        result, next_page_token = census.run_census(
+            service, get_census_entries, sender_index.key, max_messages=max_messages, page_token=page_token
+        )
+    except Exception as e:
+        print(f"!!! ERROR during census: {e} !!!")
+        return jsonify({"success": False, "error": f"Census failed: {e}"}), 500
+
+    top_senders = []
+    for aggregate in result.top(top_n):
+        top_senders.append({
+            "sender": aggregate['sender'],
+            "display_name": sender_index.display_name(aggregate['sender']),
+            "full_sender": aggregate['full_sender'],
+            "count": aggregate['count'],
+            "newest_date": format_email_date(aggregate['newest_date']),
+            "oldest_date": format_email_date(aggregate['oldest_date']),
+            "newest_timestamp": aggregate['newest_date'],
+            "oldest_timestamp": aggregate['oldest_date'],
+            "best_link": aggregate['best_link'],
+            "best_link_rank": aggregate['best_link_rank'],
+            "sample_subject": aggregate['sample_subject']
+        })
+
+    return jsonify({
+        "success": True,
+        "done": next_page_token is None,
+        "next_page_token": next_page_token,
+        "total_messages": result.messages_seen,
+        "total_senders": len(result.senders),
+        "errors": result.errors,
+        "senders": top_senders
+    }), 200
+
 @scan_bp.route('/unsubscribe', methods=['POST'])
 def unsubscribe_and_archive():
-    """Handles the unsubscribe action from the form. 
-    Identifies mailto links for manual user action and prepares HTTP links for client-side processing."""
+    """Handles the unsubscribe action from the form.
+    Identifies mailto links for manual user action. With execute_http=true, each email's header link
+    is requested server-side (one-click POST where advertised) and a real status is returned per email.
+    Those links and one-click flags are read from the messages, not taken from the form."""
     service = utils.get_gmail_service()
     if not service:
         return jsonify({"success": False, "error": "Authentication required. Please refresh and log in again."}), 401
@@ -488,6 +701,9 @@ def unsubscribe_and_archive():
     header_links = request.form.getlist('header_links') 
     body_links = request.form.getlist('body_links')
     mailto_links = request.form.getlist('mailto_links')
+    # Optional, parallel to email_ids: 'true' where the header link accepts a one-click POST
+    one_click_flags = request.form.getlist('one_click')
+    execute_http = request.form.get('execute_http') == 'true'
     
     should_archive = request.form.get('archive') == 'true'
     
@@ -503,6 +719,7 @@ def unsubscribe_and_archive():
             "header_link": header_links[i] if header_links[i] != 'null' else None,
             "body_link": body_links[i] if body_links[i] != 'null' else None,
             "mailto_link": mailto_links[i] if mailto_links[i] != 'null' else None,
+            "one_click": i < len(one_click_flags) and one_click_flags[i] == 'true',
         })
 
     mailto_actions = []
@@ -549,6 +766,25 @@ def unsubscribe_and_archive():
     # since we're not automatically sending emails via mailto
     
     if utils.should_log(): print(f"Found {len(mailto_actions)} mailto links for manual handling")
+
+    http_results = {}
+    if execute_http:
+        # Request only the links the messages themselves carry, never URLs or one-click flags
+        # from the form: served from the scan index, or a metadata fetch for unindexed messages
+        if MOCK_API:
+            entries = _get_mock_email_entries([{'id': email_data["id"]} for email_data in emails_data])
+        else:
+            with timing.span('oneclick-links'):
+                entries, _ = get_email_entries(service, [email_data["id"] for email_data in emails_data],
+                                               fetch_bodies=False, sync_index=False)
+        for email_data in emails_data:
+            entry = entries.get(email_data["id"])
+            email_data["header_link"] = entry.header_link if entry else None
+            email_data["one_click"] = bool(entry and entry.one_click)
+        planned = oneclick.plan_requests(emails_data)
+        if utils.should_log(): print(f"--- UNSUBSCRIBE: {len(planned)} distinct HTTP targets for {sum(len(ids) for ids in planned.values())} emails ---")
+        with timing.span('oneclick'):
+            http_results = oneclick.get_executor().execute(planned)
     
     # Construct response for UI display
     # The message should reflect that HTTP links are intended for client-side processing
@@ -556,7 +792,10 @@ def unsubscribe_and_archive():
     http_link_count = sum(1 for e in emails_data if e["header_link"] or e["body_link"])
     
     message_parts = []
-    if http_link_count > 0:
+    if http_results:
+        succeeded = sum(1 for result in http_results.values() if result['ok'])
+        message_parts.append(f"{succeeded} of {len(http_results)} HTTP unsubscribe request{'s' if len(http_results) != 1 else ''} succeeded.")
+    elif http_link_count > 0:
         message_parts.append(f"{http_link_count} HTTP unsubscribe request{'s' if http_link_count != 1 else ''} will be attempted.")
     if len(mailto_actions) > 0:
          message_parts.append(f"Found {len(mailto_actions)} mailto link{'s' if len(mailto_actions) != 1 else ''} requiring manual action.")
@@ -573,7 +812,8 @@ def unsubscribe_and_archive():
         "message": final_message,
         "details": {
             "mailto_links": mailto_actions,
-            "found_count": len(mailto_actions) # Only count mailto links found by backend
+            "found_count": len(mailto_actions), # Only count mailto links found by backend
+            "http_results": http_results # Per email ID, only when execute_http was requested
         },
         "http_link": None # No single HTTP link to return anymore
     }
@@ -581,6 +821,55 @@ def unsubscribe_and_archive():
     status_code = 200 
     return jsonify(response_data), status_code
 
+@scan_bp.route('/unsubscribe/mailto', methods=['POST'])
+def dispatch_mailto_unsubscribes():
+    """Sends the unsubscribe emails for selected mailto: links through batched Gmail sends.
+    Each recipient address is mailed once. Large selections are sent over several calls:
+    the response lists the email IDs still queued, which the client posts again."""
+    service = utils.get_gmail_service()
+    if not service:
+        return jsonify({"success": False, "error": "Authentication required. Please refresh and log in again."}), 401
+    if not utils.has_send_scope():
+        return jsonify({"success": False, "error": "Permission to send email is required.", "needs_permission": True}), 403
+
+    email_ids = request.form.getlist('email_ids')
+    mailto_links = request.form.getlist('mailto_links')
+    if not email_ids or len(email_ids) != len(mailto_links):
+        return jsonify({"success": False, "error": "Missing or mismatched email data."}), 400
+
+    emails_data = [{"id": msg_id, "mailto_link": link if link != 'null' else None}
+                   for msg_id, link in zip(email_ids, mailto_links)]
+    planned, invalid_ids = mailto.plan_dispatch(emails_data)
+    if utils.should_log(): print(f"--- MAILTO DISPATCH: {len(email_ids)} emails, {len(planned)} distinct recipients ---")
+
+    try:
+        # The per-user limiter outlives this request, so back-to-back posts stay within the send rate
+        results, remaining = mailto.dispatch(service, planned, limiter=mailto.limiter_for(service))
+    except Exception as e:
+        print(f"!!! ERROR during mailto dispatch: {e} !!!")
+        return jsonify({"success": False, "error": f"Sending failed: {e}"}), 500
+
+    sent_ids, failed = [], []
+    for recipient, result in results.items():
+        if result['ok']:
+            sent_ids.extend(result['message_ids'])
+        else:
+            failed.extend({"id": msg_id, "error": result['error']} for msg_id in result['message_ids'])
+    failed.extend({"id": msg_id, "error": "Invalid mailto link"} for msg_id in invalid_ids)
+    remaining_ids = [msg_id for recipient in remaining for msg_id in planned[recipient]['message_ids']]
+
+    sent_count = sum(1 for result in results.values() if result['ok'])
+    message = f"Sent {sent_count} unsubscribe email{'s' if sent_count != 1 else ''}."
+    if remaining_ids:
+        message += f" {len(remaining)} more queued."
+    return jsonify({
+        "success": sent_count > 0 or not failed,
+        "message": message,
+        "sent_ids": sent_ids,
+        "failed": failed,
+        "remaining_ids": remaining_ids
+    }), 200
+
 # --- Optimized Route for Batch Archiving --- 
 @scan_bp.route('/archive', methods=['POST'])
 def archive_emails():
@@ -593,6 +882,7 @@ def archive_emails():
     
     if not email_ids:
         return jsonify({"success": False, "error": "Missing email IDs."}), 400
+    email_ids = list(dict.fromkeys(email_ids)) # Drop duplicate IDs before archiving
         
     if utils.should_log(): print(f"--- ARCHIVE ACTION for {len(email_ids)} emails ---")
     
@@ -605,38 +895,28 @@ def archive_emails():
             
         # We have permission and authentication - process the archive request
         try:
-            batch = service.new_batch_http_request()
-            
-            # Track which IDs were successfully archived
-            archived_ids = []
-            archive_errors = []
-            
-            # Use a batch request for efficiency
-            for idx, msg_id in enumerate(email_ids):
-                try:
-                    # Add to batch - modify labels by removing INBOX
-                    batch.add(
-                        service.users().messages().modify(
-                            userId='me',
-                            id=msg_id,
-                            body={'removeLabelIds': ['INBOX']}
-                        ),
-                        request_id=f'archive_{idx}'
-                    )
-                    archived_ids.append(msg_id)
-                except Exception as e:
-                    print(f"Error adding message {msg_id} to batch: {e}")
-                    archive_errors.append(f"Error adding message {msg_id} to batch: {e}")
-            
-            # Execute the batch request
-            if utils.should_log(): print(f"Executing batch archive for {len(email_ids)} emails...")
-            batch.execute()
-            
+            # batchModify takes up to 1,000 IDs per call; chunks run concurrently
+            if utils.should_log(): print(f"Executing bulk archive for {len(email_ids)} emails...")
+            with timing.span('batch-modify'):
+                archived_ids, chunk_results = archive.archive_messages(service, email_ids)
+            archive_errors = [
+                f"Error archiving {len(result['ids'])} message{'s' if len(result['ids']) != 1 else ''}: {result['error']}"
+                for result in chunk_results if not result['ok']
+            ]
+            failed_ids = [msg_id for result in chunk_results if not result['ok'] for msg_id in result['ids']]
+            # Failed on a transient (rate limit, server or connection) error: worth posting again
+            retryable_ids = [msg_id for result in chunk_results
+                             if not result['ok'] and result['retryable'] for msg_id in result['ids']]
+            for error in archive_errors:
+                print(error)
+
             response_data = {
-                "success": True,
-                "message": f"Successfully archived {len(archived_ids)} emails.",
+                "success": len(archived_ids) > 0 or not archive_errors,
+                "message": f"Successfully archived {len(archived_ids)} emails." + (f" {len(failed_ids)} failed." if failed_ids else ""),
                 "details": {
                     "archived_ids": archived_ids,
+                    "failed_ids": failed_ids,
+                    "retryable_ids": retryable_ids,
                     "archive_errors": archive_errors
                 }
             }
@@ -669,4 +949,47 @@ def archive_emails():
         
         return jsonify(response_data), 403  # HTTP 403 Forbidden - correct status code for permission issues
 
+@scan_bp.route('/archive/sender', methods=['POST'])
+def archive_sender():
+    """Archives every INBOX message from a sender address or domain as a resumable job.
+    Each call works for up to config.SENDER_ARCHIVE_TIME_BUDGET seconds and returns progress;
+    post again with job_id (and the sender) until done is true. Interrupted jobs resume with what's
+    left in the INBOX; an unknown job_id with a sender starts a new job for that sender."""
+    if not utils.has_modify_scope():
+        return jsonify({"success": False, "error": "Archiving requires additional permissions.",
+                        "permission_required": config.MODIFY_SCOPE}), 403
+    service = utils.get_gmail_service()
+    if not service:
+        return jsonify({"success": False, "error": "Authentication required."}), 401
+
+    user_key, _ = _get_scan_index_user(service)
+    jobs = sender_archive.get_job_store()
+    job_id = request.form.get('job_id')
+    sender = request.form.get('sender', '')
+    job = jobs.get(user_key, job_id) if job_id else None
+    if job_id and not job and not sender:
+        return jsonify({"success": False, "error": "Unknown archive job."}), 404
+    if not job:
+        # Starting over is safe: each round only lists what is still in the INBOX
+        query = sender_archive.build_sender_query(sender)
+        if not query:
+            return jsonify({"success": False, "error": "Provide a sender email address or domain."}), 400
+        job = jobs.create(user_key, sender, query)
+        if utils.should_log(): print(f"--- SENDER ARCHIVE: new job {job['job_id']} for query {query} ---")
+
+    job = sender_archive.run_job(service, jobs, job)
+    return jsonify(dict(sender_archive.job_progress(job), success=job['status'] != 'interrupted')), 200
+
+@scan_bp.route('/archive/sender/<job_id>', methods=['GET'])
+def archive_sender_progress(job_id):
+    """Returns the progress of an archive-by-sender job without advancing it."""
+    service = utils.get_gmail_service()
+    if not service:
+        return jsonify({"success": False, "error": "Authentication required."}), 401
+    user_key, _ = _get_scan_index_user(service)
+    job = sender_archive.get_job_store().get(user_key, job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Unknown archive job."}), 404
+    return jsonify(dict(sender_archive.job_progress(job), success=True)), 200
+
 # --- End Optimized Route --- 
\ No newline at end of file
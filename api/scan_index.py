@@ -0,0 +1,187 @@
+# api/scan_index.py
+# Persistent per-user index of scanned messages, kept in sync with users.history.list.
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+from . import config # Import config directly
+from . import utils
+from . import records
+
+# Fields stored for each scanned message (the message ID is the key)
+ENTRY_FIELDS = ('header_link', 'mailto_link', 'body_link', 'one_click', 'sender', 'subject', 'internal_date')
+
+def make_user_key(email_address):
+    """Returns the index key for a mailbox. Addresses are hashed so the index doesn't store them."""
+    return hashlib.sha256(email_address.strip().lower().encode('utf-8')).hexdigest()
+
+class ScanIndex:
+    """SQLite index mapping message ID to the links and headers extracted from it,
+    plus the mailbox historyId the index is current as of.
+    Gmail message content is immutable, so an indexed message never needs re-fetching;
+    history.list only tells us which messages left the inbox."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS mailboxes ('
+                'user_key TEXT PRIMARY KEY, history_id TEXT, updated_at REAL NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS messages ('
+                'user_key TEXT NOT NULL, message_id TEXT NOT NULL, '
+                'header_link TEXT, mailto_link TEXT, body_link TEXT, one_click INTEGER, '
+                'sender TEXT, subject TEXT, internal_date TEXT, '
+                'PRIMARY KEY (user_key, message_id))'
+            )
+            self._migrate()
+
+    def _migrate(self):
+        # Indexes created before a field existed are dropped and rebuilt on the next scan,
+        # since indexed messages are never re-fetched. Caller holds the lock.
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(messages)')}
+        missing = [field for field in ENTRY_FIELDS if field not in columns]
+        if not missing:
+            return
+        for field in missing:
+            self._conn.execute(f'ALTER TABLE messages ADD COLUMN {field}')
+        self._conn.execute('DELETE FROM messages')
+        self._conn.execute('DELETE FROM mailboxes')
+
+    # --- Mailbox State ---
+
+    def get_history_id(self, user_key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT history_id FROM mailboxes WHERE user_key = ?', (user_key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_history_id(self, user_key, history_id):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO mailboxes (user_key, history_id, updated_at) VALUES (?, ?, ?)',
+                (user_key, str(history_id), time.time())
+            )
+
+    def delete_user(self, user_key):
+        """Forgets everything indexed for a mailbox."""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM messages WHERE user_key = ?', (user_key,))
+            self._conn.execute('DELETE FROM mailboxes WHERE user_key = ?', (user_key,))
+
+    # --- Messages ---
+
+    def get_entries(self, user_key, message_ids):
+        """Returns {message_id: ScannedEmail} for the IDs that are indexed."""
+        entries = {}
+        ids = list(message_ids)
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            with self._lock:
+                rows = self._conn.execute(
+                    f'SELECT message_id, {", ".join(ENTRY_FIELDS)} FROM messages '
+                    f'WHERE user_key = ? AND message_id IN ({placeholders})',
+                    [user_key] + chunk
+                ).fetchall()
+            for row in rows:
+                entries[row[0]] = records.ScannedEmail(row[0], **dict(zip(ENTRY_FIELDS, row[1:])))
+        return entries
+
+    def put_entries(self, user_key, entries):
+        """Stores ScannedEmail records."""
+        rows = [(user_key, e.id) + tuple(getattr(e, f) for f in ENTRY_FIELDS) for e in entries]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f'INSERT OR REPLACE INTO messages (user_key, message_id, {", ".join(ENTRY_FIELDS)}) '
+                f'VALUES (?, ?, {", ".join("?" * len(ENTRY_FIELDS))})',
+                rows
+            )
+
+    def delete_entries(self, user_key, message_ids):
+        ids = list(message_ids)
+        if not ids:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'DELETE FROM messages WHERE user_key = ? AND message_id = ?',
+                [(user_key, msg_id) for msg_id in ids]
+            )
+
+    # --- History Sync ---
+
+    def sync(self, service, user_key, profile=None):
+        """Brings the index up to date with the mailbox using users.history.list.
+        Messages deleted or removed from INBOX since the stored historyId are dropped.
+        Falls back to a full reset when there is no usable historyId.
+        Pass an already-fetched users.getProfile response to save a call on reset."""
+        from googleapiclient.errors import HttpError
+        stored_history_id = self.get_history_id(user_key)
+        if not stored_history_id:
+            self._reset(service, user_key, profile)
+            return
+
+        removed_ids = set()
+        latest_history_id = stored_history_id
+        page_token = None
+        try:
+            while True:
+                response = service.users().history().list(
+                    userId='me',
+                    startHistoryId=stored_history_id,
+                    historyTypes=['messageDeleted', 'labelRemoved'],
+                    pageToken=page_token
+                ).execute()
+                for record in response.get('history', []):
+                    for deleted in record.get('messagesDeleted', []):
+                        removed_ids.add(deleted['message']['id'])
+                    for label_change in record.get('labelsRemoved', []):
+                        if 'INBOX' in label_change.get('labelIds', []):
+                            removed_ids.add(label_change['message']['id'])
+                latest_history_id = response.get('historyId', latest_history_id)
+                page_token = response.get('nextPageToken')
+                if not page_token:
+                    break
+        except HttpError as e:
+            # 404 means the stored historyId is too old to resume from
+            if e.resp.status == 404:
+                if utils.should_log(): print("--- SCAN INDEX: historyId expired, resetting index ---")
+                self._reset(service, user_key)
+                return
+            raise
+
+        self.delete_entries(user_key, removed_ids)
+        self.set_history_id(user_key, latest_history_id)
+        if utils.should_log(): print(f"--- SCAN INDEX: Synced to historyId {latest_history_id}, dropped {len(removed_ids)} messages ---")
+
+    def _reset(self, service, user_key, profile=None):
+        if profile is None:
+            profile = service.users().getProfile(userId='me').execute()
+        self.delete_user(user_key)
+        self.set_history_id(user_key, profile['historyId'])
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_scan_index():
+    """Returns the process-wide scan index, or None when config.SCAN_INDEX_ENABLED is off."""
+    global _index
+    if not config.SCAN_INDEX_ENABLED:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ScanIndex(config.SCAN_INDEX_PATH)
+    return _index
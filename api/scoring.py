@@ -0,0 +1,187 @@
+# api/scoring.py
+# Data-driven scoring of candidate unsubscribe links.
+import re
+from bisect import bisect_right
+
+from . import config # Import config directly
+
+# --- Default Weights ---
+# Rules are checked in order and only the first matching rule counts (mirrors an if/elif chain).
+# A rule matches when the text contains any of 'any' and all of 'all'.
+
+# The Spanish/Portuguese unsubscribe phrases score like 'unsubscribe' (the legacy if/elif chain only knew English)
+ANCHOR_RULES = [
+    {'weight': 10, 'any': ['unsubscribe'] + [t.strip('"') for t in config.UNSUBSCRIBE_SEARCH_TERMS_ES_PT]},
+    {'weight': 8, 'any': ['opt out', 'opt-out']},
+    {'weight': 7, 'all': ['cancel'], 'any': ['subscription', 'newsletter']},
+    {'weight': 5, 'any': ['preferences', 'manage']}
+]
+
+URL_RULES = [
+    {'weight': 5, 'any': ['unsubscribe']},
+    {'weight': 4, 'any': ['opt-out', 'optout']},
+    {'weight': 3, 'any': ['preference']}
+]
+
+# Penalties are applied once each, on top of the URL rule
+URL_PENALTIES = [
+    {'weight': -5, 'any': ['webhook', 'callback', 'track']}
+]
+
+# URL-only patterns used when no anchor reaches FALLBACK_THRESHOLD, in priority order
+FALLBACK_URL_PATTERNS = [r'unsubscribe', r'opt.?out', r'preferences']
+FALLBACK_THRESHOLD = 5
+FALLBACK_SCORE = 2 # Lower priority than anchor text links
+
+# Unsubscribe in both anchor text and URL: no other link can do better in practice
+WINNING_SCORE = 15
+
+# --- Matching ---
+
+class KeywordMatcher:
+    """Finds which of a fixed set of keywords occur in a text with a single regex scan.
+    Keywords are compiled once, longest first, into one alternation. A match on a long
+    keyword also reports every shorter keyword it contains."""
+
+    SEPARATOR = '\x00'
+
+    def __init__(self, keywords):
+        self.keywords = sorted({k.lower() for k in keywords if k}, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(re.escape(k) for k in self.keywords))
+        self.expansions = {
+            keyword: frozenset(k for k in self.keywords if k in keyword)
+            for keyword in self.keywords
+        }
+
+    def features(self, text):
+        """Returns the set of keywords found in one text."""
+        found = set()
+        for match in self.pattern.finditer(text.lower()):
+            found |= self.expansions[match.group(0)]
+        return found
+
+    def batch_features(self, texts):
+        """Returns one keyword set per text, scanning all texts in one pass."""
+        results = [set() for _ in texts]
+        if not texts:
+            return results
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+        joined = self.SEPARATOR.join(texts).lower()
+        for match in self.pattern.finditer(joined):
+            index = bisect_right(starts, match.start()) - 1
+            results[index] |= self.expansions[match.group(0)]
+        return results
+
+# --- Scoring Engine ---
+
+def _rule_keywords(rules):
+    keywords = []
+    for rule in rules:
+        keywords.extend(rule.get('any', []))
+        keywords.extend(rule.get('all', []))
+    return keywords
+
+def _rule_matches(rule, found):
+    all_of = rule.get('all')
+    if all_of and not found.issuperset(all_of):
+        return False
+    return not found.isdisjoint(rule.get('any', []))
+
+class LinkScorer:
+    """Scores (url, anchor_text) candidates against weight tables.
+    Pass custom rule lists to plug in different weights; the defaults live at module level."""
+
+    def __init__(self, anchor_rules=None, url_rules=None, url_penalties=None,
+                 fallback_patterns=None):
+        self.anchor_rules = anchor_rules if anchor_rules is not None else ANCHOR_RULES
+        self.url_rules = url_rules if url_rules is not None else URL_RULES
+        self.url_penalties = url_penalties if url_penalties is not None else URL_PENALTIES
+        self.fallback_patterns = [
+            re.compile(p, re.IGNORECASE)
+            for p in (fallback_patterns if fallback_patterns is not None else FALLBACK_URL_PATTERNS)
+        ]
+        self.anchor_matcher = KeywordMatcher(_rule_keywords(self.anchor_rules))
+        self.url_matcher = KeywordMatcher(_rule_keywords(self.url_rules + self.url_penalties))
+
+    def weights(self):
+        """Returns the weight tables as plain data."""
+        return {
+            'anchor_rules': self.anchor_rules,
+            'url_rules': self.url_rules,
+            'url_penalties': self.url_penalties,
+            'fallback_patterns': [p.pattern for p in self.fallback_patterns],
+            'fallback_threshold': FALLBACK_THRESHOLD,
+            'fallback_score': FALLBACK_SCORE,
+            'winning_score': WINNING_SCORE
+        }
+
+    def _score_features(self, anchor_found, url_found):
+        score = 0
+        for rule in self.anchor_rules:
+            if _rule_matches(rule, anchor_found):
+                score += rule['weight']
+                break
+        for rule in self.url_rules:
+            if _rule_matches(rule, url_found):
+                score += rule['weight']
+                break
+        for rule in self.url_penalties:
+            if _rule_matches(rule, url_found):
+                score += rule['weight']
+        return score
+
+    def score(self, url, anchor_text):
+        """Scores a single candidate."""
+        return self._score_features(self.anchor_matcher.features(anchor_text),
+                                    self.url_matcher.features(url))
+
+    def score_batch(self, candidates):
+        """Scores a list of (url, anchor_text) candidates in one pass per matcher."""
+        if not candidates:
+            return []
+        anchor_found = self.anchor_matcher.batch_features([text for _, text in candidates])
+        url_found = self.url_matcher.batch_features([url for url, _ in candidates])
+        return [self._score_features(a, u) for a, u in zip(anchor_found, url_found)]
+
+    def fallback_rank(self, url):
+        """Returns the priority of the first fallback pattern matching url, or None."""
+        for rank, pattern in enumerate(self.fallback_patterns):
+            if pattern.search(url):
+                return rank
+        return None
+
+    def pick_best(self, candidate_batches):
+        """Returns (best_link, best_score) over an iterable of candidate batches.
+        Each batch is scored in one pass; iteration stops once a winning link is seen."""
+        best_score = 0
+        best_link = None
+        fallback = None # (rank, url)
+
+        for candidates in candidate_batches:
+            for (url, _), score in zip(candidates, self.score_batch(candidates)):
+                if score > best_score:
+                    best_score = score
+                    best_link = url
+                rank = self.fallback_rank(url) if fallback is None or fallback[0] > 0 else None
+                if rank is not None and (fallback is None or rank < fallback[0]):
+                    fallback = (rank, url)
+            if best_score >= WINNING_SCORE:
+                break
+
+        # If we didn't find a good link with anchor text, fall back to the URL patterns
+        if best_score < FALLBACK_THRESHOLD and fallback:
+            return fallback[1], FALLBACK_SCORE
+        return best_link, best_score
+
+_default_scorer = None
+
+def get_default_scorer():
+    """Returns the process-wide scorer built from the default weights."""
+    global _default_scorer
+    if _default_scorer is None:
+        _default_scorer = LinkScorer()
+    return _default_scorer
@@ -0,0 +1,198 @@
+# api/sender_archive.py
+# Resumable jobs that archive every INBOX message from a sender address or domain.
+import os
+import re
+import time
+import secrets
+import sqlite3
+import threading
+from email.utils import parseaddr
+
+from . import config # Import config directly
+from . import utils
+from . import census
+from . import archive
+
+# Conservative address/domain shapes, so user input can't smuggle extra Gmail search operators
+ADDRESS_RE = re.compile(r'^[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}$')
+DOMAIN_RE = re.compile(r'^(?:[A-Za-z0-9\-]+\.)+[A-Za-z]{2,}$')
+
+JOB_FIELDS = ('job_id', 'user_key', 'sender', 'query', 'status',
+              'pages', 'listed', 'archived', 'failed', 'error', 'created_at', 'updated_at')
+
+def new_job(user_key, sender, query):
+    now = time.time()
+    job = dict.fromkeys(JOB_FIELDS)
+    job.update(job_id=secrets.token_urlsafe(12), user_key=user_key, sender=sender, query=query,
+               status='running', pages=0, listed=0, archived=0, failed=0, created_at=now, updated_at=now)
+    return job
+
+def build_sender_query(sender):
+    """Returns the Gmail from: query for an address, a domain (optionally '@domain'),
+    or a full From header. Returns None if the input is neither."""
+    sender = (sender or '').strip()
+    address = parseaddr(sender)[1] if '<' in sender else sender
+    address = address.strip().lower()
+    if ADDRESS_RE.match(address):
+        return f"from:{address}"
+    domain = address[1:] if address.startswith('@') else address
+    if DOMAIN_RE.match(domain):
+        return f"from:{domain}"
+    return None
+
+class SessionJobStore:
+    """Keeps jobs in the signed Flask session cookie, so a job resumes on whichever serverless
+    instance the next request lands on (like credstore.CookieCredentialStore). Jobs only hold
+    counts, and the config.SENDER_ARCHIVE_SESSION_JOBS most recently updated are kept. The default."""
+
+    SESSION_KEY = 'sender_archive_jobs'
+
+    def create(self, user_key, sender, query):
+        job = new_job(user_key, sender, query)
+        self.save(job)
+        return job
+
+    def get(self, user_key, job_id):
+        """Returns the job dict, or None if it doesn't exist or belongs to another mailbox."""
+        from flask import session
+        job = session.get(self.SESSION_KEY, {}).get(job_id)
+        return dict(job) if job and job.get('user_key') == user_key else None
+
+    def save(self, job):
+        from flask import session
+        job['updated_at'] = time.time()
+        jobs = dict(session.get(self.SESSION_KEY, {}))
+        jobs[job['job_id']] = dict(job)
+        cutoff = job['updated_at'] - config.SENDER_ARCHIVE_JOB_MAX_AGE_SECONDS
+        newest = sorted(jobs.values(), key=lambda item: item['updated_at'], reverse=True)
+        session[self.SESSION_KEY] = {item['job_id']: item for item in newest[:config.SENDER_ARCHIVE_SESSION_JOBS]
+                                     if item['updated_at'] >= cutoff}
+
+    def delete_user(self, user_key):
+        from flask import session
+        session.pop(self.SESSION_KEY, None)
+
+class SenderArchiveJobs:
+    """SQLite store of archive-by-sender jobs. The file is per instance, so only use it where
+    every request reaches the same server (config.SENDER_ARCHIVE_JOB_BACKEND = 'sqlite')."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS sender_archive_jobs ('
+                'job_id TEXT PRIMARY KEY, user_key TEXT NOT NULL, sender TEXT, query TEXT NOT NULL, '
+                'status TEXT NOT NULL, pages INTEGER NOT NULL DEFAULT 0, '
+                'listed INTEGER NOT NULL DEFAULT 0, archived INTEGER NOT NULL DEFAULT 0, '
+                'failed INTEGER NOT NULL DEFAULT 0, error TEXT, '
+                'created_at REAL NOT NULL, updated_at REAL NOT NULL)'
+            )
+
+    def create(self, user_key, sender, query):
+        job = new_job(user_key, sender, query)
+        self.save(job)
+        return job
+
+    def get(self, user_key, job_id):
+        """Returns the job dict, or None if it doesn't exist or belongs to another mailbox."""
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT {", ".join(JOB_FIELDS)} FROM sender_archive_jobs WHERE job_id = ? AND user_key = ?',
+                (job_id, user_key)
+            ).fetchone()
+        return dict(zip(JOB_FIELDS, row)) if row else None
+
+    def save(self, job):
+        job['updated_at'] = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO sender_archive_jobs ({", ".join(JOB_FIELDS)}) '
+                f'VALUES ({", ".join("?" * len(JOB_FIELDS))})',
+                tuple(job[field] for field in JOB_FIELDS)
+            )
+            if config.SENDER_ARCHIVE_JOB_MAX_AGE_SECONDS:
+                self._conn.execute('DELETE FROM sender_archive_jobs WHERE updated_at < ?',
+                                   (job['updated_at'] - config.SENDER_ARCHIVE_JOB_MAX_AGE_SECONDS,))
+
+    def delete_user(self, user_key):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM sender_archive_jobs WHERE user_key = ?', (user_key,))
+
+def run_job(service, jobs, job, time_budget=None):
+    """Advances a job round by round: list the first SENDER_ARCHIVE_PAGE_SIZE INBOX IDs matching
+    the query and archive them with batchModify. Archived messages leave the INBOX listing, so
+    every round lists from the start; following a page token after archiving would skip messages.
+    Stops when nothing new is listed or time_budget seconds have passed; call again with the same
+    job to continue. Only counts are checkpointed, so any instance can resume. Returns the job."""
+    time_budget = config.SENDER_ARCHIVE_TIME_BUDGET if time_budget is None else time_budget
+    deadline = time.monotonic() + time_budget
+    if job['status'] == 'done':
+        return job
+    job['status'] = 'running'
+    job['error'] = None
+    archived_now = set()
+    failed_now = set() # Left in the INBOX; retried on the next call, not again in this one
+
+    try:
+        while True:
+            msg_ids, _ = census.list_message_id_page(
+                service, job['query'], config.SENDER_ARCHIVE_PAGE_SIZE, label_ids=['INBOX']
+            )
+            fresh_ids = [msg_id for msg_id in msg_ids if msg_id not in archived_now and msg_id not in failed_now]
+            if fresh_ids:
+                archived_ids, _ = archive.archive_messages(service, fresh_ids)
+                archived_now.update(archived_ids)
+                failed_now.update(set(fresh_ids) - set(archived_ids))
+                job['archived'] += len(archived_ids)
+                job['pages'] += 1
+                job['listed'] += len(fresh_ids)
+            job['failed'] = len(failed_now)
+            if not fresh_ids and not archived_now.intersection(msg_ids):
+                # Only messages that failed this call are left (or none at all)
+                job['status'] = 'done'
+            jobs.save(job) # Checkpoint after every round
+            if utils.should_log(): print(f"--- SENDER ARCHIVE {job['job_id']}: round {job['pages']}, {job['archived']} archived ---")
+            if job['status'] == 'done' or time.monotonic() >= deadline or not fresh_ids:
+                # No fresh IDs but archived ones still listed: the listing lags; the next call re-lists
+                return job
+    except Exception as e:
+        # Counts from the last checkpoint are kept; the next call re-lists what's left
+        job['status'] = 'interrupted'
+        job['error'] = str(e)
+        jobs.save(job)
+        print(f"!!! ERROR in sender archive job {job['job_id']}: {e} !!!")
+        return job
+
+def job_progress(job):
+    """Returns the client-facing view of a job."""
+    return {
+        "job_id": job['job_id'],
+        "sender": job['sender'],
+        "status": job['status'],
+        "done": job['status'] == 'done',
+        "pages": job['pages'],
+        "listed": job['listed'],
+        "archived": job['archived'],
+        "failed": job['failed'],
+        "error": job['error']
+    }
+
+_jobs = None
+_jobs_lock = threading.Lock()
+
+def get_job_store():
+    """Returns the process-wide job store configured by config.SENDER_ARCHIVE_JOB_BACKEND."""
+    global _jobs
+    if _jobs is None:
+        with _jobs_lock:
+            if _jobs is None:
+                if config.SENDER_ARCHIVE_JOB_BACKEND == 'sqlite':
+                    _jobs = SenderArchiveJobs(config.SENDER_ARCHIVE_JOB_PATH)
+                else:
+                    _jobs = SessionJobStore()
+    return _jobs
@@ -0,0 +1,76 @@
+# api/senders.py
+# Canonical sender identities: group mail by parsed address or registrable domain, not display name.
+from email.utils import parseaddr
+
+# Second-level labels under which registrations happen one level deeper (example.co.uk).
+# A small built-in list rather than the full Public Suffix List, covering common mail domains.
+MULTI_PART_SUFFIX_LABELS = frozenset(('co', 'com', 'net', 'org', 'gov', 'edu', 'ac', 'ne', 'or', 'go'))
+
+GROUP_BY_ADDRESS = 'address'
+GROUP_BY_DOMAIN = 'domain'
+GROUP_BY_CHOICES = (GROUP_BY_ADDRESS, GROUP_BY_DOMAIN)
+
+def parse_sender(from_header):
+    """Splits a From header into (display name, normalized address). Either may be ''."""
+    name, address = parseaddr(from_header or '')
+    address = address.strip().lower()
+    if '@' not in address:
+        # Not an address; parseaddr may have put a bare name in the address slot
+        return (name or from_header or '').strip().strip('"'), ''
+    return name.strip().strip('"'), address
+
+def registrable_domain(domain):
+    """Returns the registrable part of a domain: news.mail.example.com -> example.com,
+    mail.example.co.uk -> example.co.uk."""
+    labels = [label for label in domain.lower().strip('.').split('.') if label]
+    if len(labels) <= 2:
+        return '.'.join(labels)
+    if len(labels[-1]) == 2 and labels[-2] in MULTI_PART_SUFFIX_LABELS:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+class SenderIndex:
+    """Maps From headers to canonical group keys for one scan.
+    Keys are the normalized address, or the registrable domain with group_by='domain'.
+    Strings are interned per index, so repeated senders share one key and one display name;
+    headers are parsed once each."""
+
+    def __init__(self, group_by=GROUP_BY_ADDRESS):
+        if group_by not in GROUP_BY_CHOICES:
+            group_by = GROUP_BY_ADDRESS
+        self.group_by = group_by
+        self._strings = {}
+        self._keys = {} # From header -> group key
+        self._display_names = {} # group key -> first display name seen
+
+    def _intern(self, value):
+        return self._strings.setdefault(value, value)
+
+    def key(self, from_header):
+        """Returns the canonical group key for a From header."""
+        key = self._keys.get(from_header)
+        if key is not None:
+            return key
+        name, address = parse_sender(from_header)
+        if not address:
+            key = name or 'Unknown Sender'
+        elif self.group_by == GROUP_BY_DOMAIN:
+            key = registrable_domain(address.rpartition('@')[2])
+        else:
+            key = address
+        key = self._intern(key)
+        self._keys[self._intern(from_header)] = key
+        if key not in self._display_names:
+            self._display_names[key] = self._intern(name or key)
+        return key
+
+    def display_name(self, key):
+        """Returns the label shown for a group: the first display name seen, or the key itself.
+        Domain groups are labelled by the domain, since they span several senders."""
+        if self.group_by == GROUP_BY_DOMAIN:
+            return key
+        return self._display_names.get(key, key)
+
+    def intern(self, value):
+        """Interns any other per-message string (e.g. subjects repeated by a sender)."""
+        return self._intern(value) if value is not None else None
@@ -0,0 +1,128 @@
+# api/timing.py
+# Per-request timing spans, reported as a Server-Timing header and a structured log line per request.
+import re
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from flask import g, request, has_request_context, before_render_template, template_rendered
+
+from . import config # Import config directly
+from . import utils
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Accept a caller's request ID only if it's short and plain, since it is echoed into logs and headers
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._:-]{1,64}$')
+
+class RequestTimer:
+    """Collects named spans for one request. Spans sharing a name are summed and counted,
+    so a span recorded once per message reports its total. Safe to add to from worker threads."""
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.spans = {} # name -> [total seconds, count], in first-seen order
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            span = self.spans.setdefault(name, [0.0, 0])
+            span[0] += seconds
+            span[1] += 1
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Formats the spans as a Server-Timing header value, ending with the request total."""
+        with self._lock:
+            spans = list(self.spans.items())
+        metrics = []
+        for name, (seconds, count) in spans:
+            metric = f"{name};dur={seconds * 1000:.1f}"
+            if count > 1:
+                metric += f';desc="{count}x"'
+            metrics.append(metric)
+        metrics.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ', '.join(metrics)
+
+    def summary(self):
+        """Spans as {name: {'ms', 'count'}} for structured logs."""
+        with self._lock:
+            return {name: {'ms': round(seconds * 1000, 1), 'count': count}
+                    for name, (seconds, count) in self.spans.items()}
+
+def current_timer():
+    """Returns this request's timer, or None outside a request (e.g. on a worker thread)."""
+    return g.get('request_timer') if has_request_context() else None
+
+def current_request_id():
+    timer = current_timer()
+    return timer.request_id if timer else None
+
+@contextmanager
+def span(name, timer=None):
+    """Times the enclosed block into the request's timer under name.
+    Worker threads have no request context, so pass the timer captured by the caller there.
+    Without a timer, the block just runs."""
+    timer = timer or current_timer()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - started)
+
+def log_event(event, level='info', **fields):
+    """Prints one JSON log line tagged with the current request ID."""
+    if not utils.log_enabled(level):
+        return
+    record = {'event': event, 'level': level, 'request_id': current_request_id()}
+    record.update(fields)
+    print(json.dumps(record, default=str, separators=(',', ':')))
+
+# --- Flask Wiring ---
+
+def _request_id_from_headers():
+    for header in (REQUEST_ID_HEADER, 'X-Vercel-Id'):
+        value = request.headers.get(header, '')
+        if _REQUEST_ID_PATTERN.match(value):
+            return value
+    return uuid.uuid4().hex[:16]
+
+def _start_request():
+    g.request_timer = RequestTimer(_request_id_from_headers())
+
+def _finish_request(response):
+    timer = current_timer()
+    if timer is None:
+        return response
+    response.headers[REQUEST_ID_HEADER] = timer.request_id
+    # Streamed responses (SSE) are sent after this runs, so their spans only cover the setup
+    if config.SERVER_TIMING_ENABLED:
+        response.headers['Server-Timing'] = timer.server_timing()
+    log_event('request', method=request.method, path=request.path, endpoint=request.endpoint,
+              status=response.status_code, duration_ms=round(timer.elapsed() * 1000, 1),
+              spans=timer.summary())
+    return response
+
+def _template_started(sender, template, context, **extra):
+    if has_request_context():
+        g.template_started = time.perf_counter()
+
+def _template_finished(sender, template, context, **extra):
+    timer = current_timer()
+    started = g.pop('template_started', None) if has_request_context() else None
+    if timer and started is not None:
+        timer.add('render', time.perf_counter() - started)
+
+def init_app(app):
+    """Starts a timer for every request and reports it when the response goes out.
+    Template rendering is timed through Flask's render signals as the 'render' span."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
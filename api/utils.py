@@ -1,9 +1,14 @@
 import os
-import pickle
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from flask import session, flash
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from flask import session, flash, g, has_app_context
 from . import config # Import config
+from . import credstore
+from . import timing
+from . import metrics
 
 # Note: We need access to SCOPES, REDIRECT_URI defined in index.py
 # We also need the 'app' context implicitly for session/flash, 
@@ -13,59 +18,218 @@ from . import config # Import config
 # from . import SCOPES # Example if defined in __init__.py, adjust as needed
 
 # --- Debug Logging Utility ---
-def should_log():
-    """Checks the environment variable to determine if debug logging is enabled."""
+# The level is read from the environment once, at import, rather than on every call:
+# FLASK_DEBUG_MODE=True means 'debug'; otherwise LOG_LEVEL (default 'info').
+# It lives here rather than in config.py because config imports utils while loading.
+LOG_LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+
+def _read_log_level():
     debug_value = os.getenv('FLASK_DEBUG_MODE', 'False')
-    result = debug_value.lower() == 'true' if debug_value else False
-    # Add special case for first call to help diagnose
-    if not hasattr(should_log, 'first_call'):
-        print(f"DEBUG INFO: First should_log() call - FLASK_DEBUG_MODE='{debug_value}', returns {result}")
-        should_log.first_call = False
-    return result
+    if debug_value.lower() == 'true':
+        return 'debug'
+    level = os.getenv('LOG_LEVEL', 'info').lower()
+    return level if level in LOG_LEVELS else 'info'
+
+LOG_LEVEL = _read_log_level()
+_log_threshold = LOG_LEVELS[LOG_LEVEL]
+print(f"DEBUG INFO: Log level '{LOG_LEVEL}' (FLASK_DEBUG_MODE='{os.getenv('FLASK_DEBUG_MODE', 'False')}')")
+
+def set_log_level(level):
+    """Changes the cached log level (e.g. from a CLI flag)."""
+    global LOG_LEVEL, _log_threshold
+    LOG_LEVEL = level if level in LOG_LEVELS else 'info'
+    _log_threshold = LOG_LEVELS[LOG_LEVEL]
+
+def log_enabled(level):
+    """True when messages at level ('debug', 'info', ...) should be logged."""
+    return LOG_LEVELS[level] >= _log_threshold
+
+def should_log():
+    """True when debug logging is enabled. Uses the level cached at startup."""
+    return _log_threshold <= LOG_LEVELS['debug']
 # --- End Debug Logging Utility ---
 
-# --- Token Handling Modification for Vercel ---
-# Vercel's filesystem is ephemeral for serverless functions.
-# Storing tokens in session is a simple way for demo purposes, but has limitations.
-# A more robust solution would use a database or secure external storage.
+# --- Token Handling ---
+# Credentials are kept by credstore.py behind a handle in the session. With the default 'cookie'
+# backend the signed session cookie carries the compact credentials themselves, so any instance
+# can load them. The server-side backends ('sqlite', 'memory') put only the handle in the cookie;
+# their storage is per instance, so a handle may not resolve elsewhere and the user logs in again.
 
 def save_credentials(creds):
-    """Saves credentials to the session."""
+    """Saves credentials to the credential store and the handle to the session."""
     if should_log(): print("--- DEBUG: save_credentials: Attempting to save... ---") # Keep debug for now
     try:
-        session['credentials'] = pickle.dumps(creds).decode('latin1') # Store pickled creds as string
-        if should_log(): print("--- DEBUG: save_credentials: Successfully pickled and stored credentials in session. ---")
+        handle = session.get('credentials_handle') or credstore.new_handle()
+        credstore.get_credential_store().save(handle, creds)
+        session['credentials_handle'] = handle
+        _set_request_cache('gmail_credentials', creds)
+        if should_log(): print("--- DEBUG: save_credentials: Successfully stored credentials. ---")
     except Exception as e:
-        if should_log(): print(f"--- DEBUG: save_credentials: ERROR pickling/storing credentials: {e} ---")
+        if should_log(): print(f"--- DEBUG: save_credentials: ERROR storing credentials: {e} ---")
 
 def load_credentials():
-    """Loads credentials from the session."""
-    if should_log(): print("--- DEBUG: load_credentials: Attempting to load credentials from session. ---")
-    creds_pickle = session.get('credentials')
-    if creds_pickle:
-        if should_log(): print("--- DEBUG: load_credentials: Found 'credentials' key in session. Attempting to unpickle. ---")
+    """Loads credentials for the session's handle. Memoized for the length of a request."""
+    cached = _get_request_cache('gmail_credentials')
+    if cached is not None:
+        return cached
+    if config.GMAIL_CASSETTE_MODE == 'replay':
+        from . import cassettes # Deferred: only used for cassette runs
+        creds = cassettes.replay_credentials()
+        _set_request_cache('gmail_credentials', creds)
+        return creds
+    if should_log(): print("--- DEBUG: load_credentials: Attempting to load credentials from store. ---")
+    # Sessions from before the credential store held pickled credentials; never unpickle them
+    if session.pop('credentials', None) is not None:
+        if should_log(): print("--- DEBUG: load_credentials: Dropped legacy pickled credentials from session. ---")
+    handle = session.get('credentials_handle')
+    if handle:
+        if should_log(): print("--- DEBUG: load_credentials: Found 'credentials_handle' in session. Looking it up. ---")
         try:
-            creds = pickle.loads(creds_pickle.encode('latin1'))
-            if should_log(): print("--- DEBUG: load_credentials: Successfully unpickled credentials. ---")
-            return creds
+            creds = credstore.get_credential_store().load(handle)
         except Exception as e:
-            if should_log(): print(f"--- DEBUG: load_credentials: ERROR unpickling credentials: {e} ---")
-            # Optionally clear the corrupted session data
-            session.pop('credentials', None)
+            if should_log(): print(f"--- DEBUG: load_credentials: ERROR loading credentials: {e} ---")
+            creds = None
+        if creds is None:
+            if should_log(): print("--- DEBUG: load_credentials: Handle did not resolve to credentials. ---")
+            session.pop('credentials_handle', None)
             return None
+        if should_log(): print("--- DEBUG: load_credentials: Successfully loaded credentials. ---")
+        _set_request_cache('gmail_credentials', creds)
+        return creds
     else:
-        if should_log(): print("--- DEBUG: load_credentials: 'credentials' key NOT found in session. ---")
+        if should_log(): print("--- DEBUG: load_credentials: 'credentials_handle' key NOT found in session. ---")
         return None
 
 def clear_credentials():
-     """Clears credentials from the session."""
+     """Clears credentials from the store and the session."""
+     evict_pooled_service(_get_request_cache('gmail_credentials'))
+     handle = session.pop('credentials_handle', None)
+     if handle:
+         try:
+             credstore.get_credential_store().delete(handle)
+         except Exception as e:
+             if should_log(): print(f"--- DEBUG: clear_credentials: ERROR deleting stored credentials: {e} ---")
      session.pop('credentials', None)
+     _clear_request_cache()
      if should_log(): print("Cleared credentials from session.")
 
 # --- End Token Handling Modification ---
 
+# --- Request-Scoped Memoization ---
+# Credentials and the service object are kept on flask.g so repeated lookups
+# within one request (get_gmail_service, has_modify_scope, ...) don't hit the store again.
+
+_REQUEST_CACHE_KEYS = ('gmail_credentials', 'gmail_service')
+
+def _get_request_cache(key):
+    if not has_app_context():
+        return None
+    return g.get(key)
+
+def _set_request_cache(key, value):
+    if has_app_context():
+        setattr(g, key, value)
+
+def _clear_request_cache():
+    if has_app_context():
+        for key in _REQUEST_CACHE_KEYS:
+            g.pop(key, None)
+
+# --- Gmail Service Caching ---
+# The Gmail discovery document is parsed once per process, and ready Resource objects
+# are pooled by access token and thread so warm invocations skip building the service and reuse
+# its connections. A Resource owns one httplib2 http object, which isn't thread-safe, so concurrent
+# requests for the same user (threaded server, concurrent invocations) must not share one.
+
+_discovery_document = None
+_service_pool = OrderedDict() # (token hash, thread id) -> (service, expiry)
+_service_pool_lock = threading.Lock()
+
+def get_discovery_document():
+    """Returns the parsed Gmail discovery document bundled with googleapiclient, or None."""
+    global _discovery_document
+    if _discovery_document is None:
+        try:
+            from googleapiclient.discovery_cache import get_static_doc
+            doc = get_static_doc('gmail', 'v1')
+            if doc:
+                _discovery_document = json.loads(doc)
+        except Exception as e:
+            if should_log(): print(f"--- DEBUG: get_discovery_document: Could not load bundled document: {e} ---")
+    return _discovery_document
+
+def build_gmail_service(creds):
+    """Builds a Gmail service from the cached discovery document without a network fetch."""
+    from googleapiclient.discovery import build, build_from_document # Deferred: heavy import
+    request_builder = metrics.metered_request_class() # Counts each executed call for /api/metrics
+    # config.GMAIL_API_BASE_URL points the client at another endpoint (e.g. a local stand-in)
+    client_options = {'api_endpoint': config.GMAIL_API_BASE_URL} if config.GMAIL_API_BASE_URL else None
+    # config.GMAIL_CASSETTE_MODE routes calls through a recording or replaying http object instead
+    auth = {'credentials': creds}
+    if config.GMAIL_CASSETTE_MODE:
+        from . import cassettes # Deferred: only used for cassette runs
+        auth = {'http': cassettes.build_http(creds)}
+    discovery_document = get_discovery_document()
+    if discovery_document:
+        return build_from_document(discovery_document, requestBuilder=request_builder,
+                                   client_options=client_options, **auth)
+    # Disable discovery cache for Vercel's ephemeral filesystem
+    return build('gmail', 'v1', cache_discovery=False, requestBuilder=request_builder,
+                 client_options=client_options, **auth)
+
+def _token_hash(creds):
+    return hashlib.sha256(creds.token.encode('utf-8')).hexdigest()
+
+def _service_pool_key(creds):
+    return _token_hash(creds), threading.get_ident()
+
+def _evict_expired_services():
+    """Drops pooled services whose access token has expired. Caller holds the lock."""
+    now = datetime.utcnow()
+    expired_keys = [key for key, (_, expiry) in _service_pool.items() if expiry and expiry <= now]
+    for key in expired_keys:
+        del _service_pool[key]
+
+def get_pooled_service(creds):
+    """Returns a ready Gmail service for these credentials and the calling thread, building and
+    pooling it if needed. The pool is an LRU bounded by config.SERVICE_POOL_SIZE; expired tokens are evicted."""
+    if not creds.token:
+        return build_gmail_service(creds)
+    key = _service_pool_key(creds)
+    with _service_pool_lock:
+        _evict_expired_services()
+        entry = _service_pool.get(key)
+        if entry:
+            _service_pool.move_to_end(key)
+            if should_log(): print("--- DEBUG: get_pooled_service: Reusing pooled Gmail service. ---")
+            return entry[0]
+
+    service = build_gmail_service(creds)
+    with _service_pool_lock:
+        _service_pool[key] = (service, creds.expiry)
+        while len(_service_pool) > config.SERVICE_POOL_SIZE:
+            _service_pool.popitem(last=False)
+    return service
+
+def evict_pooled_service(creds):
+    """Removes the pooled services (one per thread) for these credentials, if any."""
+    if creds and creds.token:
+        token_hash = _token_hash(creds)
+        with _service_pool_lock:
+            for key in [key for key in _service_pool if key[0] == token_hash]:
+                del _service_pool[key]
+
 def get_gmail_service():
-    """Creates and returns a Gmail API service instance using session storage."""
+    """Creates and returns a Gmail API service instance using session storage.
+    The service is memoized for the request and pooled across requests."""
+    cached_service = _get_request_cache('gmail_service')
+    if cached_service is not None:
+        return cached_service
+    with timing.span('gmail-service'):
+        return _load_gmail_service()
+
+def _load_gmail_service():
+    """Loads (and if needed refreshes) the session's credentials and returns a service, or None."""
     if should_log(): print("--- DEBUG: get_gmail_service: Attempting to get service. --- ")
     creds = load_credentials()
 
@@ -89,7 +253,10 @@ def get_gmail_service():
         if creds.expired and creds.refresh_token:
             if should_log(): print("--- DEBUG: get_gmail_service: Credentials expired and refresh token exists. Attempting refresh... ---")
             try:
-                creds.refresh(Request())
+                # Deferred: pulls in requests, and only expired tokens need it
+                from google.auth.transport.requests import Request
+                with timing.span('token-refresh'):
+                    creds.refresh(Request())
                 if should_log(): print("--- DEBUG: get_gmail_service: Token refreshed successfully. Saving new credentials. ---")
                 save_credentials(creds) 
             except Exception as e:
@@ -110,8 +277,8 @@ def get_gmail_service():
 
     if should_log(): print("--- DEBUG: get_gmail_service: Credentials appear valid. Building Gmail service... ---")
     try:
-        # Disable discovery cache for Vercel's ephemeral filesystem
-        service = build('gmail', 'v1', credentials=creds, cache_discovery=False)
+        service = get_pooled_service(creds)
+        _set_request_cache('gmail_service', service)
         if should_log(): print("--- DEBUG: get_gmail_service: Gmail service built successfully. Returning service object. ---")
         return service
     except Exception as e:
@@ -134,4 +301,13 @@ def has_modify_scope():
     if should_log(): print(f"--- DEBUG: has_modify_scope: Checking scopes in loaded creds: {current_scopes} ---")
     
     # Return True if modify_scope is present
-    return modify_scope in current_scopes
\ No newline at end of file
+    return modify_scope in current_scopes
+
+def has_send_scope():
+    """Check if the current user granted the send scope, their opt-in to automatic mailto unsubscribes.
+    gmail.modify can also send, but granting it for archiving doesn't opt in to sending."""
+    creds = load_credentials()
+    if not creds:
+        return False
+    current_scopes = creds.scopes if hasattr(creds, 'scopes') and isinstance(creds.scopes, list) else []
+    return config.SEND_SCOPE in current_scopes
@@ -0,0 +1,150 @@
+# benchmarks/bench_extraction.py
+# Throughput of unsubscribe extraction over a synthetic Gmail corpus (see corpus.py), in messages/second:
+#   header_parse    parse_unsubscribe_header_value over each message's List-Unsubscribe values
+#   find_links      find_unsubscribe_links over full messages (headers plus MIME body walk)
+#   scan_loop       what a scan does per page: build_email_entry for every message, then grouping
+# Results can be saved as a named baseline and compared on later runs.
+#
+# Usage: python benchmarks/bench_extraction.py --messages 300 --save-baseline main
+#        python benchmarks/bench_extraction.py --messages 300 --compare main --max-regression 0.1
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+
+# Make the api package importable when run as a script
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from api import config # noqa: E402 (config first: it and utils import each other)
+from api import scan # noqa: E402
+from api import senders # noqa: E402
+import corpus # noqa: E402
+
+BASELINE_DIR = os.path.join(BENCH_DIR, 'baselines')
+
+# --- Workloads ---
+
+def bench_header_parse(messages):
+    values = [corpus.header_values(message) for message in messages]
+    def run():
+        for message_values in values:
+            info = {'header_link': None, 'mailto_link': None}
+            for value in message_values:
+                scan.parse_unsubscribe_header_value(value, info)
+    return run
+
+def bench_find_links(messages):
+    def run():
+        for message in messages:
+            scan.find_unsubscribe_links(message)
+    return run
+
+def bench_scan_loop(messages):
+    def run():
+        entries = {message['id']: scan.build_email_entry(message['id'], message) for message in messages}
+        scan.group_email_entries(entries, {}, senders.SenderIndex())
+    return run
+
+WORKLOADS = {
+    'header_parse': bench_header_parse,
+    'find_links': bench_find_links,
+    'scan_loop': bench_scan_loop,
+}
+
+def messages_per_second(run, count, repeat):
+    """Best of repeat runs, as messages per second."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best
+
+# --- Baselines ---
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f'{name}.json')
+
+def save_baseline(name, report):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    with open(baseline_path(name), 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+def load_baseline(name):
+    try:
+        with open(baseline_path(name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise SystemExit(f"No baseline named '{name}' in {BASELINE_DIR}")
+
+def compare(report, baseline, max_regression):
+    """Prints the change per workload. Returns the workloads that slowed down by more than max_regression."""
+    if baseline['corpus'] != report['corpus']:
+        print(f"WARNING: baseline corpus {baseline['corpus']} differs from this run's {report['corpus']}")
+    regressions = []
+    print(f"{'workload':<16}{'baseline/s':>14}{'now/s':>14}{'change':>10}")
+    for name, rate in report['results'].items():
+        before = baseline['results'].get(name)
+        if not before:
+            print(f"{name:<16}{'-':>14}{rate:>14.1f}{'new':>10}")
+            continue
+        change = rate / before - 1
+        flag = ' REGRESSION' if change < -max_regression else ''
+        print(f"{name:<16}{before:>14.1f}{rate:>14.1f}{change:>+10.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark unsubscribe extraction throughput on a synthetic corpus.')
+    parser.add_argument('--messages', type=int, default=300, help='Messages in the corpus.')
+    parser.add_argument('--senders', type=int, default=200, help='Distinct senders.')
+    parser.add_argument('--min-body-bytes', type=int, default=1024, help='Smallest HTML body.')
+    parser.add_argument('--max-body-bytes', type=int, default=1024 * 1024, help='Largest HTML body.')
+    parser.add_argument('--seed', type=int, default=1, help='Corpus seed.')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions (best is reported).')
+    parser.add_argument('--only', nargs='*', choices=sorted(WORKLOADS), help='Run only these workloads.')
+    parser.add_argument('--save-baseline', metavar='NAME', help='Save results as a named baseline.')
+    parser.add_argument('--compare', metavar='NAME', help='Compare against a saved baseline.')
+    parser.add_argument('--max-regression', type=float, default=0.10,
+                        help='With --compare, exit 1 if any workload is this much slower (0.10 = 10%%).')
+    args = parser.parse_args()
+
+    corpus_params = {'messages': args.messages, 'senders': args.senders, 'seed': args.seed,
+                     'min_body_bytes': args.min_body_bytes, 'max_body_bytes': args.max_body_bytes}
+    generator = corpus.CorpusGenerator(seed=args.seed, sender_count=args.senders,
+                                       min_body_bytes=args.min_body_bytes, max_body_bytes=args.max_body_bytes)
+    start = time.perf_counter()
+    messages = list(generator.messages(args.messages))
+    body_bytes = sum(len(part['body'].get('data', '')) for message in messages
+                     for part in corpus.iter_leaves(message['payload']))
+    print(f"Corpus: {args.messages} messages, {body_bytes / 1e6:.1f} MB base64 bodies, "
+          f"generated in {time.perf_counter() - start:.1f}s (seed {args.seed})")
+
+    results = {}
+    for name in args.only or WORKLOADS:
+        results[name] = messages_per_second(WORKLOADS[name](messages), len(messages), args.repeat)
+        print(f"{name:<16}{results[name]:>14.1f} messages/s")
+
+    report = {
+        'corpus': corpus_params,
+        'results': results,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    if args.save_baseline:
+        save_baseline(args.save_baseline, report)
+        print(f"Saved baseline '{args.save_baseline}' to {baseline_path(args.save_baseline)}")
+    if args.compare:
+        regressions = compare(report, load_baseline(args.compare), args.max_regression)
+        if regressions:
+            print(f"FAIL: slower than baseline by more than {args.max_regression:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
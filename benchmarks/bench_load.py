@@ -0,0 +1,230 @@
+# benchmarks/bench_load.py
+# End-to-end load test: many signed-in users driving the Flask app (api/index.py) in this process,
+# backed by the local Gmail stand-in (gmail_standin.py). Each user repeatedly:
+#   scan          GET /scan/emails
+#   scan-page     GET /scan/emails?token=...   (up to --pages follow-up pages)
+#   unsubscribe   POST /scan/unsubscribe       (a few scanned emails; links are reported, not requested)
+#   archive       POST /scan/archive           (the same emails)
+# Reports throughput and p50/p95/p99 latency per route, and how much of it the Gmail batch fetches
+# take (from the app's Server-Timing header), at one or more concurrency levels.
+#
+# Usage: python benchmarks/bench_load.py --users 20 --concurrency 1 4 8 16 --duration 20
+#        python benchmarks/bench_load.py --gmail-url http://127.0.0.1:8765/ --concurrency 8 --iterations 5
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor
+
+# Make the api package importable when run as a script
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+# Sessions' credentials live in memory; must be set before the api package reads its config
+os.environ.setdefault('CREDENTIAL_STORE_BACKEND', 'memory')
+
+from api import config # noqa: E402 (config first: it and utils import each other)
+import gmail_standin # noqa: E402
+
+ROUTES = ('scan', 'scan-page', 'unsubscribe', 'archive')
+BATCH_SPANS = ('batch-metadata', 'batch-full')
+
+# --- Scan Page Parsing ---
+
+class ScanPageParser(HTMLParser):
+    """Collects what a user's browser would post back: the email checkboxes and the next page link."""
+
+    def __init__(self):
+        super().__init__()
+        self.emails = []
+        self.next_token = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'input' and attrs.get('name') == 'email_ids':
+            self.emails.append(attrs)
+        elif tag == 'a' and not self.next_token and '/scan/emails?token=' in (attrs.get('href') or ''):
+            self.next_token = attrs['href'].split('token=', 1)[1].split('&', 1)[0]
+
+def parse_scan_page(html):
+    parser = ScanPageParser()
+    parser.feed(html)
+    return parser.emails, parser.next_token
+
+def parse_server_timing(value):
+    """{'name': ms} from a Server-Timing header value."""
+    spans = {}
+    for metric in (value or '').split(','):
+        name, _, params = metric.strip().partition(';')
+        for param in params.split(';'):
+            if param.startswith('dur='):
+                spans[name] = float(param[4:])
+    return spans
+
+# --- Results ---
+
+class RouteStats:
+    """Latencies and Server-Timing spans per route. Thread-safe."""
+
+    def __init__(self):
+        self.latencies = {route: [] for route in ROUTES}
+        self.errors = {route: 0 for route in ROUTES}
+        self.batch_ms = {route: 0.0 for route in ROUTES}
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, ok, server_timing):
+        spans = parse_server_timing(server_timing)
+        with self._lock:
+            self.latencies[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+            self.batch_ms[route] += sum(spans.get(name, 0.0) for name in BATCH_SPANS)
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def print_report(concurrency, stats, elapsed):
+    total = sum(len(values) for values in stats.latencies.values())
+    print(f"\nConcurrency {concurrency}: {total} requests in {elapsed:.1f}s, {total / elapsed:.1f} req/s")
+    print(f"{'route':<13}{'count':>7}{'errors':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'batch %':>9}")
+    for route in ROUTES:
+        values = sorted(stats.latencies[route])
+        if not values:
+            continue
+        total_ms = sum(values) * 1000
+        batch_share = stats.batch_ms[route] / total_ms if total_ms else 0
+        print(f"{route:<13}{len(values):>7}{stats.errors[route]:>8}{len(values) / elapsed:>8.1f}"
+              f"{percentile(values, 0.50) * 1000:>9.0f}{percentile(values, 0.95) * 1000:>9.0f}"
+              f"{percentile(values, 0.99) * 1000:>9.0f}{batch_share:>9.0%}")
+
+# --- Virtual Users ---
+
+class VirtualUser:
+    """One signed-in browser session: its own cookie jar, credentials and stand-in mailbox
+    (the stand-in keeps a mailbox per access token, so archiving doesn't affect other users)."""
+
+    def __init__(self, app, index, scopes):
+        from google.oauth2.credentials import Credentials
+        from api import credstore
+        self.client = app.test_client()
+        self.index = index
+        handle = f'load-user-{index}'
+        with app.test_request_context():
+            credstore.get_credential_store().save(handle, Credentials(token=f'load-token-{index}', scopes=scopes))
+        with self.client.session_transaction() as session:
+            session['credentials_handle'] = handle
+            session['current_auth_scopes'] = scopes
+
+    def _timed(self, stats, route, send):
+        start = time.perf_counter()
+        response = send()
+        elapsed = time.perf_counter() - start
+        stats.record(route, elapsed, response.status_code < 400, response.headers.get('Server-Timing'))
+        return response
+
+    def run_iteration(self, stats, pages, select, rng):
+        response = self._timed(stats, 'scan', lambda: self.client.get('/scan/emails'))
+        emails, next_token = parse_scan_page(response.get_data(as_text=True))
+        for _ in range(pages):
+            if not next_token:
+                break
+            token = next_token
+            response = self._timed(stats, 'scan-page', lambda: self.client.get(f'/scan/emails?token={token}'))
+            page_emails, next_token = parse_scan_page(response.get_data(as_text=True))
+            emails.extend(page_emails)
+        if not emails:
+            return
+        chosen = rng.sample(emails, min(select, len(emails)))
+        form = {
+            'email_ids': [email['value'] for email in chosen],
+            'header_links': [email.get('data-header-link') or 'null' for email in chosen],
+            'body_links': [email.get('data-body-link') or 'null' for email in chosen],
+            'mailto_links': [email.get('data-mailto-link') or 'null' for email in chosen],
+            'one_click': ['true' if email.get('data-one-click') else 'false' for email in chosen],
+        }
+        self._timed(stats, 'unsubscribe', lambda: self.client.post('/scan/unsubscribe', data=form))
+        self._timed(stats, 'archive', lambda: self.client.post('/scan/archive', data={'email_ids': form['email_ids']}))
+
+def run_level(users, concurrency, args):
+    """Runs users round-robin on concurrency threads until the duration or iteration count is reached."""
+    stats = RouteStats()
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    lock = threading.Lock()
+
+    def worker(worker_index):
+        rng = random.Random(args.seed + worker_index)
+        iterations = 0
+        while True:
+            if deadline and time.perf_counter() >= deadline:
+                return
+            if not deadline and iterations >= args.iterations:
+                return
+            with lock:
+                # Each worker takes the next idle user so one session is never used by two threads
+                user = users.pop(0)
+            try:
+                user.run_iteration(stats, args.pages, args.select, rng)
+            finally:
+                with lock:
+                    users.append(user)
+            iterations += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker, index) for index in range(concurrency)]:
+            future.result()
+    return stats, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the Flask app against a local Gmail stand-in.')
+    parser.add_argument('--users', type=int, default=20, help='Signed-in sessions (at least the highest concurrency).')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8], help='Concurrent users; several values run in turn.')
+    parser.add_argument('--duration', type=float, default=15, help='Seconds per concurrency level (0: use --iterations).')
+    parser.add_argument('--iterations', type=int, default=3, help='Iterations per thread when --duration is 0.')
+    parser.add_argument('--pages', type=int, default=2, help='Follow-up scan pages per iteration.')
+    parser.add_argument('--select', type=int, default=5, help='Emails unsubscribed from and archived per iteration.')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for email selection.')
+    parser.add_argument('--gmail-url', help='Use a running stand-in at this base URL instead of starting one.')
+    parser.add_argument('--messages', type=int, default=2000, help='Stand-in mailbox size.')
+    parser.add_argument('--max-body-bytes', type=int, default=64 * 1024, help='Stand-in largest HTML body.')
+    parser.add_argument('--latency-ms', type=float, default=20, help='Stand-in latency per HTTP request.')
+    parser.add_argument('--call-latency-ms', type=float, default=2, help='Stand-in latency per API call, batched ones included.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Stand-in fraction of calls answered 429.')
+    parser.add_argument('--quota-units-per-second', type=float, default=0, help='Stand-in per-user quota; 0 disables.')
+    parser.add_argument('--scan-index', action='store_true',
+                        help='Keep the persistent scan index on (repeat scans are then mostly served from it).')
+    args = parser.parse_args()
+    if args.users < max(args.concurrency):
+        parser.error('--users must be at least the highest --concurrency')
+
+    if args.gmail_url:
+        base_url = args.gmail_url
+    else:
+        start = time.perf_counter()
+        _, base_url = gmail_standin.start_in_thread(
+            messages=args.messages, max_body_bytes=args.max_body_bytes, latency_ms=args.latency_ms,
+            call_latency_ms=args.call_latency_ms, error_rate=args.error_rate,
+            quota_units_per_second=args.quota_units_per_second, fault_seed=args.seed)
+        print(f"Stand-in: {args.messages} messages at {base_url} (built in {time.perf_counter() - start:.1f}s)")
+    config.GMAIL_API_BASE_URL = base_url
+    config.SCAN_INDEX_ENABLED = args.scan_index
+    config.SERVER_TIMING_ENABLED = True
+
+    from api.index import app
+    from api import utils
+    utils.set_log_level('warning') # Per-request log lines would dominate the run
+    scopes = config.SCOPES + [config.MODIFY_SCOPE]
+    users = [VirtualUser(app, index, scopes) for index in range(args.users)]
+    print(f"{args.users} sessions; {args.pages} follow-up pages and {args.select} emails per iteration")
+
+    for concurrency in args.concurrency:
+        stats, elapsed = run_level(users, concurrency, args)
+        print_report(concurrency, stats, elapsed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/bench_scoring.py
+# Micro-benchmark: per-message link scoring cost, legacy inline scoring vs api.scoring.
+#
+# Usage: python benchmarks/bench_scoring.py --messages 200 --anchors 60
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+# Make the api package importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import scoring # noqa: E402
+from api import extract # noqa: E402
+
+# --- Legacy Implementation (find_unsubscribe_links before the scoring engine) ---
+
+def legacy_best_link(body_html):
+    """Inline anchor scoring as it was in find_unsubscribe_links."""
+    unsubscribe_anchors = re.findall(r'<a\s+[^>]*href=["\'](https?://[^"\']+)["\'][^>]*>([^<]+)</a>', body_html, re.IGNORECASE)
+    best_score = 0
+    best_link = None
+    for url, anchor_text in unsubscribe_anchors:
+        score = 0
+        anchor_lower = anchor_text.lower()
+        if 'unsubscribe' in anchor_lower:
+            score += 10
+        elif 'opt out' in anchor_lower or 'opt-out' in anchor_lower:
+            score += 8
+        elif 'cancel' in anchor_lower and ('subscription' in anchor_lower or 'newsletter' in anchor_lower):
+            score += 7
+        elif 'preferences' in anchor_lower or 'manage' in anchor_lower:
+            score += 5
+        url_lower = url.lower()
+        if 'unsubscribe' in url_lower:
+            score += 5
+        elif 'opt-out' in url_lower or 'optout' in url_lower:
+            score += 4
+        elif 'preference' in url_lower:
+            score += 3
+        if 'webhook' in url_lower or 'callback' in url_lower or 'track' in url_lower:
+            score -= 5
+        if score > best_score:
+            best_score = score
+            best_link = url
+    if best_score < 5:
+        unsubscribe_patterns = [
+            r'href=["\'](https?://[^"\']*unsubscribe[^"\']*)["\']',
+            r'href=["\'](https?://[^"\']*opt.?out[^"\']*)["\']',
+            r'href=["\'](https?://[^"\']*preferences[^"\']*)["\']'
+        ]
+        for pattern in unsubscribe_patterns:
+            matches = re.findall(pattern, body_html, re.IGNORECASE)
+            if matches:
+                best_link = matches[0]
+                best_score = 2
+                break
+    return best_link, best_score
+
+# --- Synthetic Messages ---
+
+ANCHOR_TEXTS = ['Read more', 'Shop now', 'View in browser', 'Manage preferences', 'Opt-out',
+                'Cancel your newsletter subscription', 'Unsubscribe', 'Darse de baja', 'Privacy policy']
+URL_PATHS = ['article', 'track/click', 'shop', 'preferences', 'optout', 'unsubscribe', 'webhook/open']
+
+def make_message_html(rng, anchor_count, filler_bytes):
+    """Builds a marketing-style HTML body with the unsubscribe footer at the end."""
+    blocks = []
+    for i in range(anchor_count):
+        path = rng.choice(URL_PATHS[:3])
+        blocks.append(f'<p>{"lorem ipsum " * 10}</p><a href="https://example.com/{path}/{i}">{rng.choice(ANCHOR_TEXTS[:3])}</a>')
+    filler = '<div>' + 'x' * filler_bytes + '</div>'
+    footer_text = rng.choice(ANCHOR_TEXTS[3:])
+    footer_path = rng.choice(URL_PATHS[3:])
+    footer = f'<a href="https://example.com/{footer_path}?u={rng.randint(0, 10**6)}">{footer_text}</a>'
+    return filler + ''.join(blocks) + footer
+
+def time_per_message(func, bodies, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for body in bodies:
+            func(body)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(bodies)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark unsubscribe link scoring per message.')
+    parser.add_argument('--messages', type=int, default=200, help='Number of synthetic messages.')
+    parser.add_argument('--anchors', type=int, default=60, help='Anchors per message.')
+    parser.add_argument('--filler-bytes', type=int, default=50000, help='Extra HTML per message.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions (best is reported).')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed.')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bodies = [make_message_html(rng, args.anchors, args.filler_bytes) for _ in range(args.messages)]
+    scorer = scoring.get_default_scorer()
+
+    def engine_scoring(body):
+        return scorer.pick_best(extract.iter_html_anchors([body]))
+
+    legacy = time_per_message(legacy_best_link, bodies, args.repeat)
+    engine = time_per_message(engine_scoring, bodies, args.repeat)
+
+    agree = sum(1 for body in bodies if legacy_best_link(body)[0] == engine_scoring(body)[0])
+
+    print(f"Messages: {args.messages}, anchors/message: {args.anchors}, filler: {args.filler_bytes} bytes")
+    print(f"{'implementation':<16}{'us/message':>14}")
+    print(f"{'legacy inline':<16}{legacy * 1e6:>14.1f}")
+    print(f"{'scoring engine':<16}{engine * 1e6:>14.1f}")
+    print(f"Speedup: {legacy / engine:.2f}x, same best link on {agree}/{len(bodies)} messages")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/bench_startup.py
+# Cold-start benchmark: import time of the Flask app (api.index) in fresh interpreters, via -X importtime.
+# Fails (exit 1) when the median exceeds --budget-ms or a --forbid module is loaded at startup.
+#
+# Usage: python benchmarks/bench_startup.py --runs 5 --top 15 --budget-ms 400
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy dependencies that only specific routes need; they must stay out of cold start
+DEFAULT_FORBIDDEN = ('google_auth_oauthlib', 'googleapiclient.discovery', 'requests')
+
+def import_profile(module):
+    """Imports module in a fresh interpreter. Returns {module name: cumulative microseconds}."""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               cwd=PROJECT_ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{completed.stderr}")
+    profile = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cold-start import time of the app.')
+    parser.add_argument('--module', default='api.index', help='Module to import.')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to time (median is reported).')
+    parser.add_argument('--top', type=int, default=15, help='Slowest modules to list.')
+    parser.add_argument('--budget-ms', type=float, default=None, help='Fail if the median import exceeds this.')
+    parser.add_argument('--forbid', nargs='*', default=list(DEFAULT_FORBIDDEN),
+                        help='Modules that must not be imported at startup.')
+    args = parser.parse_args()
+
+    profiles = [import_profile(args.module) for _ in range(args.runs)]
+    # Per-module median across runs; a module missing from a run counts as not imported there
+    names = set().union(*profiles)
+    medians = {name: statistics.median(profile.get(name, 0) for profile in profiles) for name in names}
+    total_ms = medians.get(args.module, 0) / 1000
+
+    print(f"{args.module}: median {total_ms:.1f} ms over {args.runs} runs")
+    print(f"{'module':<48}{'cumulative ms':>14}")
+    ranked = sorted(medians.items(), key=lambda item: item[1], reverse=True)
+    shown = [name for name, _ in ranked[:args.top]]
+    shown += [name for name, _ in ranked if name.startswith('api.') and name not in shown]
+    for name in shown:
+        print(f"{name:<48}{medians[name] / 1000:>14.1f}")
+
+    failures = []
+    loaded = [name for name in args.forbid if any(name in profile for profile in profiles)]
+    if loaded:
+        failures.append(f"Loaded at startup: {', '.join(loaded)}")
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        failures.append(f"Median {total_ms:.1f} ms exceeds budget of {args.budget_ms:.1f} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
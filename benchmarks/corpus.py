@@ -0,0 +1,338 @@
+# benchmarks/corpus.py
+# Synthetic Gmail corpus: realistic users.messages.get JSON at scale, deterministic per seed.
+# Covers nested multipart trees, base64url HTML from 1 KB to 1 MB, the common List-Unsubscribe
+# header styles, non-UTF-8 charsets and tracking/redirect links. Used by the benchmarks and the
+# local Gmail stand-in server.
+#
+# Usage: python benchmarks/corpus.py --messages 1000 --seed 1 --out /tmp/corpus.jsonl
+import sys
+import json
+import math
+import base64
+import random
+import argparse
+from urllib.parse import quote
+from email.utils import formatdate
+
+# --- Vocabulary ---
+
+BRAND_WORDS = ['acme', 'globex', 'initech', 'umbrella', 'hooli', 'vandelay', 'stark', 'wayne', 'wonka',
+               'tyrell', 'soylent', 'cyberdyne', 'oscorp', 'gringotts', 'duff', 'krusty', 'monarch', 'nakatomi']
+BRAND_SUFFIXES = ['', 'shop', 'news', 'mail', 'store', 'labs', 'app', 'travel']
+TLDS = ['com', 'com', 'com', 'net', 'io', 'co.uk', 'com.br', 'de', 'es', 'co.jp']
+MAIL_SUBDOMAINS = ['', '', 'mail.', 'news.', 'email.', 'e.', 'marketing.']
+LOCAL_PARTS = ['newsletter', 'news', 'no-reply', 'noreply', 'hello', 'deals', 'info', 'updates', 'team']
+# Email service providers whose tracking and unsubscribe hosts wrap the brand's links
+ESP_HOSTS = ['click.mlsend.example', 'links.sendgrid.example', 'email.mg.example', 'trk.klaviyo.example',
+             'r.sailthru.example']
+
+SUBJECTS = ['Your weekly digest', 'Last chance: {pct}% off everything', 'New arrivals just for you',
+            'Your order has shipped', 'Ofertas de la semana', 'Novidades desta semana',
+            'Große Rabatte nur heute', 'Les nouveautés de {brand}', '今週のおすすめ', 'Don\'t miss out, {name}']
+FILLER_WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt '
+                'ut labore et dolore magna aliqua olá café naïve über señor crème brûlée').split()
+
+# (unsubscribe anchor text, weight). None means the body has no unsubscribe footer at all.
+FOOTER_TEXTS = [
+    ('Unsubscribe', 30), ('Click here to unsubscribe', 10), ('unsubscribe from this list', 8),
+    ('Opt out', 6), ('Manage preferences', 8), ('Update your email preferences', 6),
+    ('Cancel your newsletter subscription', 3), ('Cancelar suscripción', 4), ('Darse de baja', 2),
+    ('Descadastrar', 3), ('Cancelar inscrição', 2), (None, 18)
+]
+
+# List-Unsubscribe header styles seen in the wild, with rough relative frequency
+HEADER_STYLES = [
+    ('one_click', 38),       # <https://...>, <mailto:...> + List-Unsubscribe-Post (RFC 8058)
+    ('https_mailto', 14),    # <mailto:...>, <https://...> without the Post header
+    ('https_only', 8),
+    ('http_only', 4),
+    ('mailto_only', 10),
+    ('mailto_params', 5),    # <mailto:...?subject=unsubscribe&body=...>
+    ('bare', 3),             # No angle brackets
+    ('x_list', 2),           # Only X-List-Unsubscribe
+    ('none', 16)             # Body link only, or nothing
+]
+
+# (charset, weight). Bodies are encoded in this charset and declared in the part's Content-Type.
+CHARSETS = [('utf-8', 70), ('iso-8859-1', 10), ('windows-1252', 8), ('iso-8859-15', 3),
+            ('shift_jis', 4), ('iso-2022-jp', 2), ('us-ascii', 3)]
+
+# MIME tree layouts, with rough relative frequency
+LAYOUTS = [('alternative', 55), ('html', 15), ('mixed', 10), ('related', 12), ('plain', 5), ('nested_mixed', 3)]
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0]
+
+def _b64url(data):
+    # Gmail returns base64url body data; trailing padding is often missing
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+def _hex_id(rng):
+    return f'{rng.getrandbits(64):016x}'
+
+# --- Generator ---
+
+class CorpusGenerator:
+    """Builds Gmail API message resources (format=full) from a seed.
+    Senders follow a Zipf-like distribution over a fixed pool, as in a real inbox where a few
+    senders account for most bulk mail. Body sizes are log-uniform between min and max bytes."""
+
+    def __init__(self, seed=1, sender_count=200, min_body_bytes=1024, max_body_bytes=1024 * 1024,
+                 start_ms=1_700_000_000_000):
+        self.seed = seed
+        self.min_body_bytes = min_body_bytes
+        self.max_body_bytes = max(max_body_bytes, min_body_bytes)
+        self.start_ms = start_ms
+        rng = random.Random(f'{seed}-senders')
+        self.senders = [self._make_sender(rng, index) for index in range(sender_count)]
+        self.sender_weights = [1 / (rank + 1) for rank in range(sender_count)]
+
+    def _make_sender(self, rng, index):
+        brand = rng.choice(BRAND_WORDS) + rng.choice(BRAND_SUFFIXES)
+        domain = f'{brand}{index}.{rng.choice(TLDS)}'
+        address = f'{rng.choice(LOCAL_PARTS)}@{rng.choice(MAIL_SUBDOMAINS)}{domain}'
+        name = brand.capitalize()
+        style = rng.random()
+        if style < 0.5:
+            from_header = f'{name} <{address}>'
+        elif style < 0.75:
+            from_header = f'"{name} News" <{address}>'
+        elif style < 0.9:
+            encoded = base64.b64encode(f'{name} ✉'.encode('utf-8')).decode('ascii')
+            from_header = f'=?UTF-8?B?{encoded}?= <{address}>'
+        else:
+            from_header = address
+        return {
+            'name': name, 'domain': domain, 'address': address, 'from': from_header,
+            'esp': rng.choice(ESP_HOSTS), 'header_style': _weighted(rng, HEADER_STYLES),
+            'charset': _weighted(rng, CHARSETS), 'layout': _weighted(rng, LAYOUTS),
+            'footer': _weighted(rng, FOOTER_TEXTS), 'wrap_links': rng.random() < 0.4
+        }
+
+    # --- Headers ---
+
+    def _unsubscribe_headers(self, rng, sender, token):
+        https = f'https://{sender["domain"]}/unsubscribe?u={token}'
+        mailto = f'mailto:unsubscribe-{token}@{sender["esp"]}'
+        style = sender['header_style']
+        if style == 'one_click':
+            return [('List-Unsubscribe', f'<{https}>, <{mailto}>'),
+                    ('List-Unsubscribe-Post', 'List-Unsubscribe=One-Click')]
+        if style == 'https_mailto':
+            return [('List-Unsubscribe', f'<{mailto}>, <{https}>')]
+        if style == 'https_only':
+            return [('List-Unsubscribe', f'<{https}>')]
+        if style == 'http_only':
+            return [('List-Unsubscribe', f'<{https.replace("https://", "http://", 1)}>')]
+        if style == 'mailto_only':
+            return [('List-Unsubscribe', f'<{mailto}>')]
+        if style == 'mailto_params':
+            return [('List-Unsubscribe', f'<{mailto}?subject=unsubscribe&body={quote("Please remove me")}>')]
+        if style == 'bare':
+            return [('List-Unsubscribe', f'{https}, {mailto}')]
+        if style == 'x_list':
+            return [('X-List-Unsubscribe', f'<{https}>')]
+        return []
+
+    def _headers(self, rng, sender, msg_id, internal_ms, subject, content_type):
+        headers = [('Delivered-To', 'me@example.org')]
+        for hop in range(rng.randint(2, 6)):
+            headers.append(('Received', f'from mta{hop}.{sender["esp"]} (mta{hop}.{sender["esp"]} '
+                                        f'[203.0.113.{rng.randint(1, 254)}]) by mx.example.org with ESMTPS id {_hex_id(rng)}'))
+        headers += [
+            ('DKIM-Signature', f'v=1; a=rsa-sha256; d={sender["domain"]}; s=s1; b={_b64url(rng.randbytes(96))}'),
+            ('From', sender['from']),
+            ('To', 'me@example.org'),
+            ('Subject', subject),
+            ('Date', formatdate(internal_ms / 1000)),
+            ('Message-ID', f'<{msg_id}@{sender["domain"]}>'),
+            ('MIME-Version', '1.0'),
+            ('Content-Type', content_type),
+            ('List-Id', f'<newsletter.{sender["domain"]}>'),
+            ('X-Mailer', sender['esp']),
+        ]
+        headers += self._unsubscribe_headers(rng, sender, msg_id)
+        return [{'name': name, 'value': value} for name, value in headers]
+
+    # --- Bodies ---
+
+    def _body_size(self, rng):
+        low, high = math.log(self.min_body_bytes), math.log(self.max_body_bytes)
+        return int(math.exp(rng.uniform(low, high)))
+
+    def _tracking_url(self, rng, sender, target=None):
+        url = f'https://{sender["esp"]}/ls/click?upn={_b64url(rng.randbytes(24))}'
+        if target:
+            url += f'&u={quote(target, safe="")}'
+        return url
+
+    def _footer(self, rng, sender, token):
+        text = sender['footer']
+        if text is None:
+            return '<p>You received this email because you signed up.</p>'
+        path = 'preferences' if 'prefer' in text.lower() or 'manage' in text.lower() else 'unsubscribe'
+        link = f'https://{sender["domain"]}/{path}?u={token}'
+        if sender['wrap_links']:
+            link = self._tracking_url(rng, sender, link) # ESP click tracking wraps the real link
+        return (f'<table><tr><td style="font-size:11px;color:#999">{sender["name"]} Inc., 1 Main St. '
+                f'<a href="https://{sender["domain"]}/privacy">Privacy</a> | '
+                f'<a href="{link}" style="color:#999"><span>{text}</span></a></td></tr></table>')
+
+    def _html_body(self, rng, sender, token, size):
+        head = (f'<html><head><meta charset="{sender["charset"]}"><style>td{{padding:4px}}</style></head>'
+                f'<body><img src="https://{sender["esp"]}/open/{token}.gif" width="1" height="1">'
+                f'<a href="https://{sender["domain"]}/"><img src="https://{sender["domain"]}/logo.png" alt="{sender["name"]}"></a>')
+        footer = self._footer(rng, sender, token) + '</body></html>'
+        blocks = []
+        length = len(head) + len(footer)
+        while length < size:
+            words = ' '.join(rng.choices(FILLER_WORDS, k=rng.randint(20, 60)))
+            link = self._tracking_url(rng, sender, f'https://{sender["domain"]}/p/{rng.randint(1, 10**6)}')
+            block = (f'<tr><td><p>{words}</p><a href="{link}" style="color:#06c">'
+                     f'{rng.choice(["Shop now", "Read more", "View deal", "Learn more"])}</a></td></tr>')
+            blocks.append(block)
+            length += len(block)
+        return head + '<table>' + ''.join(blocks) + '</table>' + footer
+
+    def _plain_body(self, rng, sender, token, size):
+        lines = []
+        length = 0
+        while length < size:
+            line = ' '.join(rng.choices(FILLER_WORDS, k=rng.randint(8, 16)))
+            if rng.random() < 0.2:
+                line += f' {self._tracking_url(rng, sender)}'
+            lines.append(line)
+            length += len(line) + 1
+        if sender['footer'] is not None:
+            lines.append(f'{sender["footer"]}: https://{sender["domain"]}/unsubscribe?u={token}')
+        return '\n'.join(lines)
+
+    def _text_part(self, mime_type, text, charset, part_id):
+        data = text.encode(charset, errors='xmlcharrefreplace' if mime_type == 'text/html' else 'replace')
+        return {
+            'partId': part_id, 'mimeType': mime_type, 'filename': '',
+            'headers': [{'name': 'Content-Type', 'value': f'{mime_type}; charset="{charset}"'},
+                        {'name': 'Content-Transfer-Encoding', 'value': 'quoted-printable'}],
+            'body': {'size': len(data), 'data': _b64url(data)}
+        }
+
+    def _attachment_part(self, rng, part_id, mime_type, filename):
+        return {
+            'partId': part_id, 'mimeType': mime_type, 'filename': filename,
+            'headers': [{'name': 'Content-Type', 'value': f'{mime_type}; name="{filename}"'},
+                        {'name': 'Content-Disposition', 'value': f'attachment; filename="{filename}"'}],
+            'body': {'attachmentId': _b64url(rng.randbytes(32)), 'size': rng.randint(10_000, 500_000)}
+        }
+
+    def _multipart(self, mime_type, part_id, parts):
+        boundary = f'{mime_type.split("/")[1]}-{part_id or "root"}'
+        return {'partId': part_id, 'mimeType': mime_type, 'filename': '',
+                'headers': [{'name': 'Content-Type', 'value': f'{mime_type}; boundary="{boundary}"'}],
+                'body': {'size': 0}, 'parts': parts}
+
+    def _payload(self, rng, sender, token, size):
+        """Returns the top-level part (without message headers)."""
+        charset = sender['charset']
+        layout = sender['layout']
+        html = lambda part_id: self._text_part('text/html', self._html_body(rng, sender, token, size), charset, part_id)
+        plain = lambda part_id, plain_size: self._text_part(
+            'text/plain', self._plain_body(rng, sender, token, plain_size), charset, part_id)
+        alternative = lambda part_id, prefix: self._multipart(
+            'multipart/alternative', part_id, [plain(f'{prefix}0', min(size // 4, 8192)), html(f'{prefix}1')])
+
+        if layout == 'html':
+            return html('')
+        if layout == 'plain':
+            return plain('', size)
+        if layout == 'alternative':
+            return alternative('', '')
+        if layout == 'related':
+            return self._multipart('multipart/related', '', [
+                alternative('0', '0.'), self._attachment_part(rng, '1', 'image/png', 'banner.png')])
+        if layout == 'mixed':
+            return self._multipart('multipart/mixed', '', [
+                alternative('0', '0.'), self._attachment_part(rng, '1', 'application/pdf', 'invoice.pdf')])
+        # nested_mixed: mixed > related > alternative, the deepest tree mail clients produce
+        return self._multipart('multipart/mixed', '', [
+            self._multipart('multipart/related', '0', [
+                alternative('0.0', '0.0.'), self._attachment_part(rng, '0.1', 'image/jpeg', 'hero.jpg')]),
+            self._attachment_part(rng, '1', 'application/pdf', 'terms.pdf')])
+
+    def message(self, index):
+        """Returns message number index as a users.messages.get (format=full) resource."""
+        rng = random.Random(f'{self.seed}-{index}')
+        sender = rng.choices(self.senders, weights=self.sender_weights)[0]
+        msg_id = _hex_id(rng)
+        internal_ms = self.start_ms - index * rng.randint(60_000, 3_600_000)
+        subject = rng.choice(SUBJECTS).format(pct=rng.choice([10, 20, 30, 50]), brand=sender['name'], name='Alex')
+        payload = self._payload(rng, sender, msg_id, self._body_size(rng))
+        content_type = next(h['value'] for h in payload['headers'] if h['name'] == 'Content-Type')
+        # The top-level part carries the message headers, as in the Gmail API
+        payload['headers'] = self._headers(rng, sender, msg_id, internal_ms, subject, content_type)
+        size = sum(part['body'].get('size', 0) for part in iter_leaves(payload))
+        return {
+            'id': msg_id,
+            'threadId': msg_id,
+            'labelIds': ['INBOX', 'UNREAD', rng.choice(['CATEGORY_PROMOTIONS', 'CATEGORY_UPDATES', 'CATEGORY_SOCIAL'])],
+            'snippet': ' '.join(rng.choices(FILLER_WORDS, k=20)),
+            'sizeEstimate': size + 2048,
+            'historyId': str(100000 + index),
+            'internalDate': str(internal_ms),
+            'payload': payload
+        }
+
+    def messages(self, count, start=0):
+        """Yields count messages, newest first."""
+        for index in range(start, start + count):
+            yield self.message(index)
+
+def iter_leaves(part):
+    if part.get('parts'):
+        for sub_part in part['parts']:
+            yield from iter_leaves(sub_part)
+    else:
+        yield part
+
+# --- Views ---
+
+def metadata_view(message, metadata_headers=None):
+    """The same message as users.messages.get returns it with format=metadata:
+    top-level headers only (filtered to metadata_headers if given), no parts or body data."""
+    wanted = {name.lower() for name in metadata_headers} if metadata_headers else None
+    headers = [header for header in message['payload']['headers']
+               if wanted is None or header['name'].lower() in wanted]
+    view = {key: value for key, value in message.items() if key != 'payload'}
+    view['payload'] = {'partId': '', 'mimeType': message['payload']['mimeType'], 'filename': '', 'headers': headers}
+    return view
+
+def minimal_view(message):
+    """The message as users.messages.get returns it with format=minimal."""
+    return {key: value for key, value in message.items() if key != 'payload'}
+
+def header_values(message, names=('list-unsubscribe', 'x-list-unsubscribe')):
+    """The message's unsubscribe header values, for header parsing benchmarks."""
+    return [header['value'] for header in message['payload']['headers'] if header['name'].lower() in names]
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic Gmail corpus as JSON lines.')
+    parser.add_argument('--messages', type=int, default=1000, help='Number of messages.')
+    parser.add_argument('--senders', type=int, default=200, help='Distinct senders.')
+    parser.add_argument('--min-body-bytes', type=int, default=1024, help='Smallest HTML body.')
+    parser.add_argument('--max-body-bytes', type=int, default=1024 * 1024, help='Largest HTML body.')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed.')
+    parser.add_argument('--out', default='-', help='Output file (default stdout).')
+    args = parser.parse_args()
+
+    generator = CorpusGenerator(seed=args.seed, sender_count=args.senders,
+                                min_body_bytes=args.min_body_bytes, max_body_bytes=args.max_body_bytes)
+    out = sys.stdout if args.out == '-' else open(args.out, 'w', encoding='utf-8')
+    try:
+        for message in generator.messages(args.messages):
+            out.write(json.dumps(message, separators=(',', ':')) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == '__main__':
+    main()
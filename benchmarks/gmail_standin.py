@@ -0,0 +1,552 @@
+# benchmarks/gmail_standin.py
+# Local stand-in for the Gmail API endpoints the app uses, backed by a synthetic corpus (corpus.py).
+# Point the app at it with GMAIL_API_BASE_URL so the real client code, including BatchHttpRequest,
+# runs offline. Latency, 429/500 injection and per-user quota ceilings are configurable.
+#
+# Endpoints: users.getProfile, messages.list (q, labelIds, pageToken), messages.get (full/metadata/minimal),
+# messages.batchModify, messages.modify, messages.send, history.list and the /batch/gmail/v1 multipart endpoint.
+# GET /_standin/stats returns call counts, statuses and quota used per user.
+#
+# Usage: python benchmarks/gmail_standin.py --port 8765 --messages 1000 --latency-ms 40 --error-rate 0.02
+#        GMAIL_API_BASE_URL=http://127.0.0.1:8765/ python -m api.index --port 5001
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from email.parser import BytesParser
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Make the api package and corpus module importable when run as a script
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from api import config # noqa: E402 (config first: it and utils import each other)
+from api import extract # noqa: E402
+import corpus # noqa: E402
+
+API_PREFIX = '/gmail/v1/users/'
+BATCH_PATHS = ('/batch/gmail/v1', '/batch')
+BATCH_LIMIT = 100 # Gmail rejects batches with more calls than this
+BATCH_MODIFY_LIMIT = 1000
+LIST_MAX_RESULTS = 500
+HISTORY_PAGE_SIZE = 100
+TAG_RE = re.compile(r'<[^>]+>')
+
+class ApiError(Exception):
+    """An error response in Gmail's JSON error format."""
+
+    STATUS_NAMES = {400: 'INVALID_ARGUMENT', 403: 'PERMISSION_DENIED', 404: 'NOT_FOUND',
+                    429: 'RESOURCE_EXHAUSTED', 500: 'INTERNAL', 503: 'UNAVAILABLE'}
+
+    def __init__(self, status, message, reason=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.reason = reason or self.STATUS_NAMES.get(status, 'error').lower()
+
+    def body(self):
+        return {'error': {'code': self.status, 'message': self.message,
+                          'errors': [{'message': self.message, 'domain': 'global', 'reason': self.reason}],
+                          'status': self.STATUS_NAMES.get(self.status, 'UNKNOWN')}}
+
+# --- Search ---
+
+def _message_text(message):
+    """Lowercased subject, snippet and decoded body text, for keyword search."""
+    texts = [header['value'] for header in message['payload']['headers'] if header['name'].lower() == 'subject']
+    texts.append(message.get('snippet', ''))
+    for part in corpus.iter_leaves(message['payload']):
+        if part.get('mimeType', '').startswith('text/'):
+            texts.append(TAG_RE.sub(' ', ''.join(extract.iter_part_text(part, max_bytes=10**9))))
+    return ' '.join(texts).lower()
+
+class SearchIndex:
+    """What messages.list can filter on, per message: From, unsubscribe headers and text."""
+
+    def __init__(self, message):
+        headers = {}
+        for header in message['payload']['headers']:
+            headers.setdefault(header['name'].lower(), header['value'])
+        self.sender = headers.get('from', '').lower()
+        self.has_list_unsubscribe = 'list-unsubscribe' in headers or 'x-list-unsubscribe' in headers
+        self.text = _message_text(message)
+
+QUERY_TOKEN_RE = re.compile(r'\s*(-\(|\(|\)|-?"[^"]*"|-?[^\s()"]+)')
+
+def parse_query(query):
+    """Compiles a subset of Gmail search syntax into a predicate(search_index, labels).
+    Supports words, "quoted phrases", OR, parentheses, -negation, from:, has:list-unsubscribe,
+    in:/label:, is:unread. Adjacent terms are ANDed; OR binds tighter, as in Gmail."""
+    tokens = [match.group(1) for match in QUERY_TOKEN_RE.finditer(query or '')]
+    position = [0]
+
+    def peek():
+        return tokens[position[0]] if position[0] < len(tokens) else None
+
+    def take():
+        token = peek()
+        position[0] += 1
+        return token
+
+    def term(token):
+        negate = token.startswith('-') and len(token) > 1
+        token = token[1:] if negate else token
+        lowered = token.lower()
+        if lowered.startswith('"'):
+            phrase = lowered.strip('"')
+            predicate = lambda index, labels: phrase in index.text
+        elif lowered.startswith('from:'):
+            value = lowered[5:]
+            predicate = lambda index, labels: value in index.sender
+        elif lowered == 'has:list-unsubscribe':
+            predicate = lambda index, labels: index.has_list_unsubscribe
+        elif lowered.startswith(('in:', 'label:')):
+            label = lowered.split(':', 1)[1].upper()
+            predicate = lambda index, labels: label in labels
+        elif lowered == 'is:unread':
+            predicate = lambda index, labels: 'UNREAD' in labels
+        else:
+            predicate = lambda index, labels: lowered in index.text
+        return (lambda index, labels: not predicate(index, labels)) if negate else predicate
+
+    def unary():
+        token = take()
+        if token is None:
+            return lambda index, labels: True
+        if token in ('(', '-('):
+            inner = conjunction()
+            if peek() == ')':
+                take()
+            return (lambda index, labels: not inner(index, labels)) if token == '-(' else inner
+        return term(token)
+
+    def disjunction():
+        options = [unary()]
+        while peek() == 'OR':
+            take()
+            options.append(unary())
+        return options[0] if len(options) == 1 else (lambda index, labels: any(o(index, labels) for o in options))
+
+    def conjunction():
+        parts = []
+        while peek() not in (None, ')'):
+            parts.append(disjunction())
+        return lambda index, labels: all(p(index, labels) for p in parts)
+
+    return conjunction()
+
+# --- Mailbox State ---
+
+class Mailbox:
+    """One user's label state and history over the shared corpus."""
+
+    def __init__(self, corpus_messages):
+        self.labels = {msg_id: set(message['labelIds']) for msg_id, message in corpus_messages.items()}
+        self.initial_history_id = max(int(m['historyId']) for m in corpus_messages.values()) + 1
+        self.history_id = self.initial_history_id
+        self.history = [] # Records with ids > initial_history_id, oldest first
+        self.lock = threading.Lock()
+
+    def change_labels(self, msg_id, thread_id, add, remove):
+        """Applies a label change and records history. Caller holds the lock."""
+        labels = self.labels[msg_id]
+        added = [label for label in add if label not in labels]
+        removed = [label for label in remove if label in labels]
+        if not added and not removed:
+            return
+        labels.update(added)
+        labels.difference_update(removed)
+        self.history_id += 1
+        record = {'id': str(self.history_id), 'messages': [{'id': msg_id, 'threadId': thread_id}]}
+        message_ref = {'id': msg_id, 'threadId': thread_id, 'labelIds': sorted(labels)}
+        if added:
+            record['labelsAdded'] = [{'message': message_ref, 'labelIds': added}]
+        if removed:
+            record['labelsRemoved'] = [{'message': message_ref, 'labelIds': removed}]
+        self.history.append(record)
+
+class QuotaBucket:
+    """Per-user quota: a token bucket of units per second, plus an optional ceiling for the run."""
+
+    def __init__(self, units_per_second, ceiling):
+        self.rate = units_per_second
+        self.ceiling = ceiling
+        self.tokens = units_per_second
+        self.updated = time.monotonic()
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def charge(self, units):
+        with self.lock:
+            if self.ceiling and self.used + units > self.ceiling:
+                raise ApiError(403, 'Quota exceeded for quota metric (run ceiling).', 'dailyLimitExceeded')
+            if self.rate:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens < units:
+                    raise ApiError(429, 'User-rate limit exceeded.', 'rateLimitExceeded')
+                self.tokens -= units
+            self.used += units
+
+class StandinState:
+    """Corpus, per-user mailboxes and quotas, fault injection and counters shared by all handler threads."""
+
+    def __init__(self, messages=1000, senders=200, seed=1, min_body_bytes=1024, max_body_bytes=128 * 1024,
+                 latency_ms=0, call_latency_ms=0, jitter_ms=0, error_rate=0.0, server_error_rate=0.0,
+                 quota_units_per_second=0, quota_ceiling=0, fault_seed=None):
+        generator = corpus.CorpusGenerator(seed=seed, sender_count=senders,
+                                           min_body_bytes=min_body_bytes, max_body_bytes=max_body_bytes)
+        self.messages = {}
+        for message in generator.messages(messages):
+            self.messages[message['id']] = message
+        self.order = list(self.messages) # Newest first, as messages.list returns them
+        self.search = {msg_id: SearchIndex(message) for msg_id, message in self.messages.items()}
+        self.latency_ms = latency_ms
+        self.call_latency_ms = call_latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.quota_units_per_second = quota_units_per_second
+        self.quota_ceiling = quota_ceiling
+        self.rng = random.Random(fault_seed)
+        self.mailboxes = {}
+        self.quotas = {}
+        self.stats = {'calls': {}, 'statuses': {}, 'batches': 0, 'batch_calls': 0}
+        self.lock = threading.Lock()
+
+    def mailbox(self, user):
+        with self.lock:
+            if user not in self.mailboxes:
+                self.mailboxes[user] = Mailbox(self.messages)
+                self.quotas[user] = QuotaBucket(self.quota_units_per_second, self.quota_ceiling)
+            return self.mailboxes[user], self.quotas[user]
+
+    def count(self, method_id, status):
+        with self.lock:
+            self.stats['calls'][method_id] = self.stats['calls'].get(method_id, 0) + 1
+            self.stats['statuses'][str(status)] = self.stats['statuses'].get(str(status), 0) + 1
+
+    def sleep(self, base_ms):
+        delay = base_ms + (self.rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def inject_fault(self):
+        with self.lock:
+            roll = self.rng.random()
+        if roll < self.error_rate:
+            raise ApiError(429, 'Too many concurrent requests for user.', 'rateLimitExceeded')
+        if roll < self.error_rate + self.server_error_rate:
+            raise ApiError(500, 'Backend Error', 'backendError')
+
+    def snapshot(self):
+        with self.lock:
+            stats = json.loads(json.dumps(self.stats))
+            stats['quota_used'] = {user: quota.used for user, quota in self.quotas.items()}
+        return stats
+
+# --- API Methods ---
+
+def _first(params, name, default=None):
+    return params.get(name, [default])[0]
+
+def _view(state, mailbox, msg_id, params):
+    message = state.messages.get(msg_id)
+    if message is None:
+        raise ApiError(404, 'Requested entity was not found.', 'notFound')
+    message_format = _first(params, 'format', 'full')
+    if message_format == 'metadata':
+        view = corpus.metadata_view(message, params.get('metadataHeaders'))
+    elif message_format == 'minimal':
+        view = corpus.minimal_view(message)
+    elif message_format == 'full':
+        view = dict(message)
+    else:
+        raise ApiError(400, f'Unsupported format: {message_format}', 'invalidArgument')
+    with mailbox.lock:
+        view['labelIds'] = sorted(mailbox.labels[msg_id])
+    return view
+
+def list_messages(state, mailbox, params):
+    label_ids = {label.upper() for label in params.get('labelIds', [])}
+    predicate = parse_query(_first(params, 'q', ''))
+    with mailbox.lock:
+        matching = [msg_id for msg_id in state.order
+                    if label_ids <= mailbox.labels[msg_id] and predicate(state.search[msg_id], mailbox.labels[msg_id])]
+    start = int(_first(params, 'pageToken', '0') or 0)
+    size = min(int(_first(params, 'maxResults', '100')), LIST_MAX_RESULTS)
+    page = matching[start:start + size]
+    response = {'messages': [{'id': msg_id, 'threadId': state.messages[msg_id]['threadId']} for msg_id in page],
+                'resultSizeEstimate': len(matching)}
+    if start + size < len(matching):
+        response['nextPageToken'] = str(start + size)
+    if not page:
+        del response['messages'] # Gmail omits the key for empty pages
+    return response
+
+def batch_modify(state, mailbox, body):
+    ids = body.get('ids') or []
+    if len(ids) > BATCH_MODIFY_LIMIT:
+        raise ApiError(400, f'Too many ids, at most {BATCH_MODIFY_LIMIT} allowed.', 'invalidArgument')
+    unknown = [msg_id for msg_id in ids if msg_id not in state.messages]
+    if unknown:
+        raise ApiError(400, 'Invalid id value', 'invalidArgument')
+    with mailbox.lock:
+        for msg_id in ids:
+            mailbox.change_labels(msg_id, state.messages[msg_id]['threadId'],
+                                  body.get('addLabelIds') or [], body.get('removeLabelIds') or [])
+    return None
+
+def modify_message(state, mailbox, msg_id, body):
+    if msg_id not in state.messages:
+        raise ApiError(404, 'Requested entity was not found.', 'notFound')
+    batch_modify(state, mailbox, dict(body, ids=[msg_id]))
+    return _view(state, mailbox, msg_id, {'format': ['minimal']})
+
+def list_history(state, mailbox, params):
+    start = int(_first(params, 'startHistoryId', '0') or 0)
+    types = set(params.get('historyTypes', []))
+    type_keys = {'messageAdded': 'messagesAdded', 'messageDeleted': 'messagesDeleted',
+                 'labelAdded': 'labelsAdded', 'labelRemoved': 'labelsRemoved'}
+    wanted_keys = {type_keys[t] for t in types if t in type_keys} or set(type_keys.values())
+    with mailbox.lock:
+        if start < mailbox.initial_history_id - 1:
+            raise ApiError(404, 'Requested entity was not found.', 'notFound')
+        records = [record for record in mailbox.history
+                   if int(record['id']) > start and wanted_keys & set(record)]
+        history_id = str(mailbox.history_id)
+    offset = int(_first(params, 'pageToken', '0') or 0)
+    page = records[offset:offset + HISTORY_PAGE_SIZE]
+    response = {'historyId': history_id}
+    if page:
+        response['history'] = page
+    if offset + HISTORY_PAGE_SIZE < len(records):
+        response['nextPageToken'] = str(offset + HISTORY_PAGE_SIZE)
+    return response
+
+# Discovery method IDs, so quota units come from the same table as the app's metrics
+ROUTES = [
+    ('GET', re.compile(r'^(?P<user>[^/]+)/profile$'), 'gmail.users.getProfile'),
+    ('GET', re.compile(r'^(?P<user>[^/]+)/messages$'), 'gmail.users.messages.list'),
+    ('POST', re.compile(r'^(?P<user>[^/]+)/messages/batchModify$'), 'gmail.users.messages.batchModify'),
+    ('POST', re.compile(r'^(?P<user>[^/]+)/messages/send$'), 'gmail.users.messages.send'),
+    ('POST', re.compile(r'^(?P<user>[^/]+)/messages/(?P<id>[^/]+)/modify$'), 'gmail.users.messages.modify'),
+    ('GET', re.compile(r'^(?P<user>[^/]+)/messages/(?P<id>[^/]+)$'), 'gmail.users.messages.get'),
+    ('GET', re.compile(r'^(?P<user>[^/]+)/history$'), 'gmail.users.history.list'),
+]
+
+def call_api(state, method, target, body, authorization):
+    """Runs one API call. Returns (status, JSON-serializable body or None)."""
+    parsed = urlparse(target)
+    params = parse_qs(parsed.query)
+    method_id = 'unknown'
+    try:
+        if not parsed.path.startswith(API_PREFIX):
+            raise ApiError(404, f'Not found: {parsed.path}', 'notFound')
+        route_path = parsed.path[len(API_PREFIX):]
+        for route_method, pattern, route_method_id in ROUTES:
+            match = pattern.match(route_path)
+            if match and route_method == method:
+                method_id = route_method_id
+                break
+        else:
+            raise ApiError(404, f'Not found: {method} {parsed.path}', 'notFound')
+
+        # Each access token is its own user, with its own labels and quota
+        mailbox, quota = state.mailbox(authorization or 'anonymous')
+        state.sleep(state.call_latency_ms)
+        state.inject_fault()
+        quota.charge(config.GMAIL_QUOTA_UNITS.get(method_id, config.GMAIL_QUOTA_UNITS_DEFAULT))
+
+        payload = json.loads(body) if body else {}
+        if method_id == 'gmail.users.getProfile':
+            with mailbox.lock:
+                history_id = str(mailbox.history_id)
+            result = {'emailAddress': 'me@example.org', 'messagesTotal': len(state.messages),
+                      'threadsTotal': len(state.messages), 'historyId': history_id}
+        elif method_id == 'gmail.users.messages.list':
+            result = list_messages(state, mailbox, params)
+        elif method_id == 'gmail.users.messages.get':
+            result = _view(state, mailbox, match.group('id'), params)
+        elif method_id == 'gmail.users.messages.batchModify':
+            result = batch_modify(state, mailbox, payload)
+        elif method_id == 'gmail.users.messages.modify':
+            result = modify_message(state, mailbox, match.group('id'), payload)
+        elif method_id == 'gmail.users.messages.send':
+            result = {'id': uuid.uuid4().hex[:16], 'threadId': uuid.uuid4().hex[:16], 'labelIds': ['SENT']}
+        else:
+            result = list_history(state, mailbox, params)
+        status = 204 if result is None else 200
+    except ApiError as e:
+        status, result = e.status, e.body()
+    except (ValueError, KeyError) as e:
+        status, result = 400, ApiError(400, f'Bad request: {e}', 'invalidArgument').body()
+    state.count(method_id, status)
+    return status, result
+
+# --- Batch Endpoint ---
+
+def parse_batch(content_type, body):
+    """Splits a multipart/mixed batch body into (content_id, method, target, headers, body) calls."""
+    message = BytesParser().parsebytes(b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body)
+    calls = []
+    for part in message.get_payload():
+        content_id = part.get('Content-ID', '')
+        raw = part.get_payload(decode=False)
+        raw = raw if isinstance(raw, str) else str(raw)
+        head, _, sub_body = raw.replace('\r\n', '\n').partition('\n\n')
+        lines = head.split('\n')
+        method, target = lines[0].split(' ')[:2]
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        calls.append((content_id, method, target, headers, sub_body.strip() or None))
+    return calls
+
+def format_batch_response(responses, boundary):
+    """Builds the multipart/mixed body for [(content_id, status, result)]."""
+    reasons = {200: 'OK', 204: 'No Content', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+               429: 'Too Many Requests', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+    chunks = []
+    for content_id, status, result in responses:
+        response_id = content_id.replace('<', '<response-', 1) if content_id else ''
+        body = json.dumps(result) if result is not None else ''
+        chunks.append(f'--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {response_id}\r\n\r\n'
+                      f'HTTP/1.1 {status} {reasons.get(status, "Error")}\r\n'
+                      f'Content-Type: application/json; charset=UTF-8\r\nContent-Length: {len(body.encode())}\r\n\r\n'
+                      f'{body}\r\n')
+    chunks.append(f'--{boundary}--\r\n')
+    return ''.join(chunks).encode('utf-8')
+
+# --- HTTP Server ---
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, as with the real API
+    server_version = 'GmailStandin/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, body=b'', content_type='application/json; charset=UTF-8'):
+        self.send_response(status)
+        if body:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _send_json(self, status, result):
+        self._send(status, json.dumps(result).encode('utf-8') if result is not None else b'')
+
+    def _handle(self, method):
+        state = self.server.state
+        body = self._read_body()
+        path = urlparse(self.path).path
+        state.sleep(state.latency_ms)
+        if path == '/_standin/stats':
+            return self._send_json(200, state.snapshot())
+        if method == 'POST' and path in BATCH_PATHS:
+            return self._handle_batch(body)
+        status, result = call_api(state, method, self.path, body.decode('utf-8') or None,
+                                  self.headers.get('Authorization'))
+        self._send_json(status, result)
+
+    def _handle_batch(self, body):
+        state = self.server.state
+        try:
+            calls = parse_batch(self.headers.get('Content-Type', ''), body)
+        except Exception as e:
+            return self._send_json(400, ApiError(400, f'Malformed batch request: {e}').body())
+        if len(calls) > BATCH_LIMIT:
+            return self._send_json(400, ApiError(400, f'A batch may contain at most {BATCH_LIMIT} calls.').body())
+        with state.lock:
+            state.stats['batches'] += 1
+            state.stats['batch_calls'] += len(calls)
+        outer_authorization = self.headers.get('Authorization')
+        responses = []
+        for content_id, method, target, headers, sub_body in calls:
+            status, result = call_api(state, method, target, sub_body,
+                                      headers.get('authorization') or outer_authorization)
+            responses.append((content_id, status, result))
+        boundary = f'batch_{uuid.uuid4().hex}'
+        self._send(200, format_batch_response(responses, boundary), f'multipart/mixed; boundary={boundary}')
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+def make_server(host='127.0.0.1', port=0, verbose=False, **options):
+    """Builds (but doesn't start) a stand-in server; options go to StandinState.
+    Port 0 picks a free port; the base URL to configure is f'http://{host}:{server.server_port}/'."""
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    server.daemon_threads = True
+    server.state = StandinState(**options)
+    server.verbose = verbose
+    return server
+
+def start_in_thread(**options):
+    """Starts a stand-in server on a background thread. Returns (server, base URL)."""
+    server = make_server(**options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f'http://{host}:{port}/'
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local Gmail API stand-in server.')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind.')
+    parser.add_argument('--port', type=int, default=8765, help='Port (0 picks a free one).')
+    parser.add_argument('--messages', type=int, default=1000, help='Mailbox size.')
+    parser.add_argument('--senders', type=int, default=200, help='Distinct senders.')
+    parser.add_argument('--seed', type=int, default=1, help='Corpus seed.')
+    parser.add_argument('--min-body-bytes', type=int, default=1024, help='Smallest HTML body.')
+    parser.add_argument('--max-body-bytes', type=int, default=128 * 1024, help='Largest HTML body.')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Added to every HTTP request.')
+    parser.add_argument('--call-latency-ms', type=float, default=0,
+                        help='Added per API call, including each call inside a batch.')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Uniform random extra latency.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of calls answered 429.')
+    parser.add_argument('--server-error-rate', type=float, default=0.0, help='Fraction of calls answered 500.')
+    parser.add_argument('--quota-units-per-second', type=float, default=0,
+                        help='Per-user quota units per second (Gmail: 250); 0 disables.')
+    parser.add_argument('--quota-ceiling', type=int, default=0,
+                        help='Per-user quota units for the whole run before 403s; 0 disables.')
+    parser.add_argument('--fault-seed', type=int, default=None, help='Seed for latency jitter and faults.')
+    parser.add_argument('--verbose', action='store_true', help='Log every request.')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    server = make_server(args.host, args.port, verbose=args.verbose, messages=args.messages, senders=args.senders,
+                         seed=args.seed, min_body_bytes=args.min_body_bytes, max_body_bytes=args.max_body_bytes,
+                         latency_ms=args.latency_ms, call_latency_ms=args.call_latency_ms, jitter_ms=args.jitter_ms,
+                         error_rate=args.error_rate, server_error_rate=args.server_error_rate,
+                         quota_units_per_second=args.quota_units_per_second, quota_ceiling=args.quota_ceiling,
+                         fault_seed=args.fault_seed)
+    host, port = server.server_address[:2]
+    print(f"Gmail stand-in: {args.messages} messages ready in {time.perf_counter() - started:.1f}s")
+    print(f"Serving on http://{host}:{port}/ (set GMAIL_API_BASE_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
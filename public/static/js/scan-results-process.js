@@ -5,6 +5,8 @@
 // Global variables for tracking unsubscribe process
 let unsubscribeUrl = ""; // Will be set from the template
 let archiveUrl = ""; // Will be set from the template
+let mailtoDispatchUrl = ""; // Set from the template when the user can send email
+let archiveSenderUrl = ""; // Set from the template when the user can archive
 
 /**
  * Set URL endpoints for API calls
@@ -16,6 +18,116 @@ function setEndpoints(unsubUrl, archUrl) {
   console.log("Endpoints set:", { unsubscribeUrl, archiveUrl });
 }
 
+/**
+ * Enable automatic mailto unsubscribes (requires the send permission)
+ * Called from the template
+ */
+function setMailtoDispatchEndpoint(url) {
+  mailtoDispatchUrl = url;
+}
+
+/**
+ * Enable archiving everything from a sender
+ * Called from the template
+ */
+function setArchiveSenderEndpoint(url) {
+  archiveSenderUrl = url;
+}
+
+/**
+ * Archives every inbox email from a sender as a server-side job.
+ * Each request advances the job for a bounded time; keep posting the job ID until it's done.
+ */
+async function archiveAllFromSender(sender, buttonId) {
+  if (!archiveSenderUrl) return;
+  if (!confirm(`Archive every inbox email from ${sender}?`)) return;
+
+  setLoading(buttonId, "Archiving...");
+  const button = document.getElementById(buttonId);
+  let jobId = null;
+  let progress = null;
+  let interruptions = 0;
+
+  try {
+    while (!progress || !progress.done) {
+      const formData = new FormData();
+      // The sender lets the server start over if the job can't be found
+      formData.append("sender", sender);
+      if (jobId) {
+        formData.append("job_id", jobId);
+      }
+      const response = await fetch(archiveSenderUrl, {
+        method: "POST",
+        body: formData,
+      });
+      progress = await response.json();
+      if (!response.ok) {
+        throw new Error(progress.error || "Archive failed.");
+      }
+      jobId = progress.job_id;
+      // Interrupted jobs resume with what's left in the inbox; give up after a few in a row
+      interruptions = progress.status === "interrupted" ? interruptions + 1 : 0;
+      if (interruptions > 3) {
+        throw new Error(progress.error || "Archive was interrupted.");
+      }
+      if (button) {
+        button.innerHTML = `<span class="spinner mr-2"></span> ${progress.archived} archived...`;
+      }
+    }
+    showModal(
+      renderSuccessModalContent(
+        `Archived ${progress.archived} emails from ${sender}.` +
+          (progress.failed ? ` ${progress.failed} failed.` : "")
+      )
+    );
+  } catch (error) {
+    console.error("Error archiving sender:", error);
+    showModal(renderErrorModalContent(error.message));
+  } finally {
+    hideLoading(buttonId);
+  }
+}
+
+/**
+ * Sends unsubscribe emails for mailto links through the backend.
+ * The backend sends a limited number per request, so keep posting the remaining IDs.
+ */
+async function dispatchMailtoUnsubscribes(emails) {
+  const linksById = {};
+  emails.forEach((email) => (linksById[email.id] = email.mailto_link));
+  let pendingIds = Object.keys(linksById);
+  const sentIds = [];
+  const failed = [];
+
+  while (pendingIds.length > 0) {
+    const formData = new FormData();
+    pendingIds.forEach((id) => {
+      formData.append("email_ids", id);
+      formData.append("mailto_links", linksById[id]);
+    });
+    try {
+      const response = await fetch(mailtoDispatchUrl, {
+        method: "POST",
+        body: formData,
+      });
+      const result = await response.json();
+      if (!response.ok) {
+        console.error("Mailto dispatch error:", result.error);
+        break;
+      }
+      sentIds.push(...result.sent_ids);
+      failed.push(...result.failed);
+      // Stop if the backend made no progress, to avoid looping forever
+      if (result.remaining_ids.length >= pendingIds.length) break;
+      pendingIds = result.remaining_ids;
+    } catch (error) {
+      console.error("Error during mailto dispatch:", error);
+      break;
+    }
+  }
+  return { sentIds, failed };
+}
+
 /**
  * Saves email details to session storage
  */
@@ -41,47 +153,45 @@ function getEmailDetailsFromStorage() {
 }
 
 /**
- * Initialize data storage for the current page's emails
- * Called on page load
+ * Decodes the columnar /scan/api/emails payload into {id: details}
+ * (see payloads.build_columnar_payload: string fields index into payload.strings, -1 is null)
  */
-function initializeEmailDataStore() {
-  const emailRows = document.querySelectorAll(".email-row");
-  const storedDetails = getEmailDetailsFromStorage(); // Get potentially existing data
-
-  emailRows.forEach((row) => {
-    const emailId = row.id.replace("email-", "");
-    const checkbox = row.querySelector(".email-checkbox");
-
-    if (!checkbox) {
-      return; // Skip if no checkbox
+function decodeEmailPayload(payload) {
+  const text = (index) => (index >= 0 ? payload.strings[index] : null);
+  const details = {};
+  let row = 0;
+  payload.senders.key.forEach((keyIndex, senderIndex) => {
+    const sender = text(keyIndex);
+    for (let i = 0; i < payload.senders.count[senderIndex]; i++, row++) {
+      const emailId = payload.emails.id[row];
+      details[emailId] = {
+        id: emailId,
+        sender: sender,
+        header_link: text(payload.emails.header_link[row]),
+        mailto_link: text(payload.emails.mailto_link[row]),
+        body_link: text(payload.emails.body_link[row]),
+        one_click: payload.emails.one_click[row] === 1,
+      };
     }
-
-    const sender = checkbox.getAttribute("data-sender");
-    if (!sender) return;
-
-    // Extract all link data from attributes
-    const headerLink = checkbox.getAttribute("data-header-link");
-    const mailtoLink = checkbox.getAttribute("data-mailto-link");
-    const bodyLink = checkbox.getAttribute("data-body-link");
-    const primaryLink = checkbox.getAttribute("data-primary-link"); // Keep this if needed
-
-    // Store or update email details with all links
-    storedDetails[emailId] = {
-      id: emailId,
-      sender: sender,
-      header_link: headerLink,
-      mailto_link: mailtoLink,
-      body_link: bodyLink,
-    };
   });
-
-  // Save the updated details to storage
-  saveEmailDetailsToStorage(storedDetails);
-  console.log(`Initialized data for ${emailRows.length} emails`);
+  return details;
 }
 
-// Call the initialize function when the page loads
-document.addEventListener("DOMContentLoaded", initializeEmailDataStore);
+/**
+ * Initialize data storage for the current page's emails
+ * Called from the template with the page's columnar payload (same layout as /scan/api/emails)
+ */
+function initializeEmailDataStore(payload) {
+  try {
+    const pageDetails = decodeEmailPayload(payload);
+    // Merge into potentially existing data from other pages
+    saveEmailDetailsToStorage({ ...getEmailDetailsFromStorage(), ...pageDetails });
+    console.log(`Initialized data for ${Object.keys(pageDetails).length} emails`);
+  } catch (error) {
+    console.error("Error loading email details:", error);
+  }
+  initializeUIState();
+}
 
 /**
  * Main function to perform unsubscribe for selected emails
@@ -103,7 +213,7 @@ async function performUnsubscribe() {
 
   // Map email IDs to their senders and collect all data needed for processing
   const senderMap = {};
-  const emailsToProcess = []; // Array of objects: {id, sender, header_link, mailto_link, body_link}
+  const emailsToProcess = []; // Array of objects: {id, sender, header_link, mailto_link, body_link, one_click}
   const emailsForBackend = []; // IDs only
 
   for (const emailId of selectedIdsFromStorage) {
@@ -118,6 +228,7 @@ async function performUnsubscribe() {
       const headerLink = checkbox.getAttribute("data-header-link");
       const mailtoLink = checkbox.getAttribute("data-mailto-link");
       const bodyLink = checkbox.getAttribute("data-body-link");
+      const oneClick = checkbox.getAttribute("data-one-click") === "true";
 
       if (!sender) {
         console.warn(
@@ -135,6 +246,7 @@ async function performUnsubscribe() {
         header_link: headerLink,
         mailto_link: mailtoLink,
         body_link: bodyLink,
+        one_click: oneClick,
       };
 
       emailsToProcess.push(emailData);
@@ -190,38 +302,59 @@ async function performUnsubscribe() {
 
   console.log(`Processing ${emailsToProcess.length} emails client-side.`);
 
-  // Process client-side emails (attempt header links)
-  const clientPromises = emailsToProcess.map(async (email) => {
-    updateSenderStatus(email.sender, "processing");
+  // Send header links to the backend, which requests them server-side
+  // (one-click POST where advertised) and reports a real status per email
+  const httpResults = {};
+  const emailsWithHeaderLinks = emailsToProcess.filter((email) => email.header_link);
+  if (emailsWithHeaderLinks.length > 0) {
+    const httpFormData = new FormData();
+    emailsWithHeaderLinks.forEach((email) => {
+      updateSenderStatus(email.sender, "processing");
+      httpFormData.append("email_ids", email.id);
+      httpFormData.append("header_links", email.header_link);
+      httpFormData.append("body_links", "null");
+      httpFormData.append("mailto_links", "null");
+      httpFormData.append("one_click", email.one_click ? "true" : "false");
+    });
+    httpFormData.append("execute_http", "true");
+    httpFormData.append("archive", "false"); // Archive handled separately
 
-    if (email.header_link) {
-      // Attempt background request with header_link
-      try {
-        console.log(
-          `Attempting header link for ${email.sender} (${email.id}): ${email.header_link}`
-        );
-        const controller = new AbortController();
-        const timeoutId = setTimeout(() => controller.abort(), 10000); // 10 sec timeout
-
-        const response = await fetch(email.header_link, {
-          method: "GET", // Or POST if header indicates
-          mode: "no-cors",
-          redirect: "follow",
-          signal: controller.signal,
-        });
-        clearTimeout(timeoutId);
-
-        // Assume success if no error (best guess with no-cors)
-        successfullyProcessedIds.push(email.id);
-        updateSenderStatus(email.sender, "completed");
-        console.log(`Header link success (assumed) for ${email.id}`);
-        return { success: true, id: email.id };
-      } catch (fetchError) {
-        console.warn(
-          `Header link fetch failed for ${email.id} (${email.header_link}): ${fetchError.message}`
+    try {
+      const httpResponse = await fetch(unsubscribeUrl, {
+        method: "POST",
+        body: httpFormData,
+      });
+      const httpResult = await httpResponse.json();
+      if (httpResponse.ok && httpResult.success) {
+        Object.assign(httpResults, httpResult.details?.http_results || {});
+      } else {
+        console.error(
+          "Server-side unsubscribe error:",
+          httpResult.error || httpResult.message
         );
-        // Fall through to check for body/mailto link
       }
+    } catch (error) {
+      console.error("Error during server-side unsubscribe:", error);
+    }
+  }
+
+  // Resolve each email from its header link result, falling back to manual links
+  const clientPromises = emailsToProcess.map(async (email) => {
+    updateSenderStatus(email.sender, "processing");
+
+    const headerResult = httpResults[email.id];
+    if (headerResult && headerResult.ok) {
+      successfullyProcessedIds.push(email.id);
+      updateSenderStatus(email.sender, "completed");
+      console.log(
+        `Header link ${headerResult.status} for ${email.id} (HTTP ${headerResult.status_code})`
+      );
+      return { success: true, id: email.id };
+    } else if (headerResult) {
+      console.warn(
+        `Header link ${headerResult.status} for ${email.id} (${email.header_link}): ${headerResult.error}`
+      );
+      // Fall through to check for body/mailto link
     }
 
     // If header link failed or wasn't present, check for body or mailto for manual action
@@ -274,6 +407,26 @@ async function performUnsubscribe() {
 
   // Wait for all client-side processing to settle
   await Promise.all(clientPromises);
+
+  // With the send permission, mail the mailto unsubscribes instead of leaving them manual
+  if (mailtoDispatchUrl) {
+    const mailtoEmails = emailsToProcess.filter(
+      (email) => email.mailto_link && !successfullyProcessedIds.includes(email.id)
+    );
+    if (mailtoEmails.length > 0) {
+      const { sentIds } = await dispatchMailtoUnsubscribes(mailtoEmails);
+      mailtoEmails
+        .filter((email) => sentIds.includes(email.id))
+        .forEach((email) => {
+          successfullyProcessedIds.push(email.id);
+          const manualIndex = manualActions.findIndex(
+            (action) => action.message_id === email.id
+          );
+          if (manualIndex !== -1) manualActions.splice(manualIndex, 1);
+          updateSenderStatus(email.sender, "completed");
+        });
+    }
+  }
   console.log("Completed client-side processing.");
 
   // Update progress based on client-side results
@@ -298,6 +451,7 @@ async function performUnsubscribe() {
       backendFormData.append("header_links", details?.header_link || "null");
       backendFormData.append("body_links", details?.body_link || "null");
       backendFormData.append("mailto_links", details?.mailto_link || "null");
+      backendFormData.append("one_click", details?.one_click ? "true" : "false");
     });
     backendFormData.append("archive", "false"); // Archive handled separately
 
@@ -694,3 +848,8 @@ window.performUnsubscribe = performUnsubscribe;
 window.performArchiveActionOnly = performArchiveActionOnly;
 window.removeProcessedEmails = removeProcessedEmails;
 window.setEndpoints = setEndpoints;
+window.setMailtoDispatchEndpoint = setMailtoDispatchEndpoint;
+window.setArchiveSenderEndpoint = setArchiveSenderEndpoint;
+window.archiveAllFromSender = archiveAllFromSender;
+window.dispatchMailtoUnsubscribes = dispatchMailtoUnsubscribes;
+window.initializeEmailDataStore = initializeEmailDataStore;
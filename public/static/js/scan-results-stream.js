@@ -0,0 +1,276 @@
+/**
+ * Streamed scan results: fills the page from /scan/emails/stream (Server-Sent Events)
+ * as each sub-batch of emails is fetched, instead of waiting for the whole page
+ */
+
+let scanStreamOptions = {}; // Set by startScanStream
+let renderedSenderCount = 0; // Picks each new sender group's color
+
+/**
+ * Same element ID scheme as the server-rendered sender groups
+ */
+function senderElementId(senderKey) {
+  return senderKey
+    .replace(/ /g, "-")
+    .replace(/[<>]/g, "")
+    .replace(/@/g, "-")
+    .replace(/\./g, "-")
+    .replace(/['"()]/g, "");
+}
+
+/**
+ * Builds an empty sender group, matching the markup in scan_results.html
+ */
+function createSenderGroup(senderKey, displayName) {
+  const senderId = senderElementId(senderKey);
+  const colors = scanStreamOptions.colors || [];
+  const group = document.createElement("div");
+  group.className = "sender-group";
+  group.id = `sender-group-${senderId}`;
+  group.setAttribute("data-sender", senderKey);
+  if (colors.length) {
+    group.style.setProperty(
+      "--sender-color-hsl",
+      colors[renderedSenderCount % colors.length]
+    );
+  }
+  renderedSenderCount += 1;
+
+  const header = document.createElement("div");
+  header.className = "sender-header";
+
+  const nameContainer = document.createElement("div");
+  nameContainer.className = "sender-name-container";
+  nameContainer.addEventListener("click", () => toggleSenderSelection(senderId));
+
+  const senderCheckbox = document.createElement("input");
+  senderCheckbox.type = "checkbox";
+  senderCheckbox.id = `select-sender-${senderId}`;
+  senderCheckbox.className =
+    "sender-checkbox form-checkbox h-4 w-4 text-brand border-border rounded focus:ring-brand";
+  senderCheckbox.setAttribute("data-sender", senderKey);
+  senderCheckbox.addEventListener("click", (event) => {
+    event.stopPropagation();
+    selectAllSenderEmails(senderCheckbox, senderId);
+  });
+  nameContainer.appendChild(senderCheckbox);
+
+  const label = document.createElement("label");
+  label.className = "sender-name ml-2";
+  label.setAttribute("data-display-name", displayName);
+  nameContainer.appendChild(label);
+
+  if (displayName !== senderKey) {
+    const keySpan = document.createElement("span");
+    keySpan.className = "ml-2 text-xs text-muted-foreground truncate";
+    keySpan.textContent = senderKey;
+    nameContainer.appendChild(keySpan);
+  }
+  header.appendChild(nameContainer);
+
+  if (
+    scanStreamOptions.canArchiveSender &&
+    (senderKey.includes("@") || scanStreamOptions.groupBy === "domain")
+  ) {
+    const archiveButton = document.createElement("button");
+    archiveButton.type = "button";
+    archiveButton.id = `archive-sender-${senderId}`;
+    archiveButton.className = "ml-auto mr-2 text-xs text-brand hover:underline focus-ring";
+    archiveButton.title = "Archive every inbox email from this sender";
+    archiveButton.textContent = "Archive all";
+    archiveButton.addEventListener("click", () =>
+      archiveAllFromSender(senderKey, archiveButton.id)
+    );
+    header.appendChild(archiveButton);
+  }
+
+  const collapseButton = document.createElement("button");
+  collapseButton.type = "button";
+  collapseButton.className = "collapse-button focus-ring";
+  collapseButton.innerHTML = `
+    <svg class="chevron-icon h-5 w-5" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
+        <path fill-rule="evenodd" d="M5.293 7.293a1 1 0 011.414 0L10 10.586l3.293-3.293a1 1 0 111.414 1.414l-4 4a1 1 0 01-1.414 0l-4-4a1 1 0 010-1.414z" clip-rule="evenodd" />
+    </svg>`;
+  collapseButton.addEventListener("click", () =>
+    toggleCollapse(senderId, collapseButton)
+  );
+  header.appendChild(collapseButton);
+
+  const emailsDiv = document.createElement("div");
+  emailsDiv.className = "sender-emails";
+  emailsDiv.id = `emails-${senderId}`;
+
+  group.appendChild(header);
+  group.appendChild(emailsDiv);
+  return group;
+}
+
+/**
+ * Builds one email row, with the same data attributes the unsubscribe flow reads
+ */
+function createEmailRow(senderKey, email) {
+  const row = document.createElement("div");
+  row.className = "email-row";
+  row.id = `email-${email.id}`;
+  row.addEventListener("click", () => toggleEmailSelection(email.id));
+
+  const left = document.createElement("div");
+  left.className = "flex items-center flex-1 min-w-0 mr-4";
+
+  const checkbox = document.createElement("input");
+  checkbox.type = "checkbox";
+  checkbox.name = "email_ids";
+  checkbox.value = email.id;
+  checkbox.className =
+    "email-checkbox form-checkbox h-4 w-4 text-brand border-border rounded focus:ring-brand mr-3";
+  checkbox.setAttribute("data-sender", senderKey);
+  if (email.header_link) checkbox.setAttribute("data-header-link", email.header_link);
+  if (email.one_click) checkbox.setAttribute("data-one-click", "true");
+  if (email.mailto_link) checkbox.setAttribute("data-mailto-link", email.mailto_link);
+  if (email.body_link) checkbox.setAttribute("data-body-link", email.body_link);
+  if (email.unsubscribe_link) checkbox.setAttribute("data-primary-link", email.unsubscribe_link);
+  checkbox.addEventListener("click", (event) => {
+    event.stopPropagation();
+    handleEmailCheckboxClick(checkbox);
+  });
+  left.appendChild(checkbox);
+
+  const subject = document.createElement("span");
+  subject.className = "email-subject text-sm text-foreground truncate";
+  subject.title = email.subject || "";
+  subject.textContent = email.subject || "";
+  left.appendChild(subject);
+
+  const date = document.createElement("span");
+  date.className = "text-xs text-muted-foreground flex-shrink-0";
+  date.textContent = email.date || "";
+
+  row.appendChild(left);
+  row.appendChild(date);
+  return row;
+}
+
+/**
+ * Adds one `senders` event to the page and to the stored email details
+ */
+function renderStreamedSenders(sendersData) {
+  const list = document.getElementById("subscription-list");
+  const storedDetails = getEmailDetailsFromStorage();
+
+  Object.entries(sendersData).forEach(([senderKey, data]) => {
+    const senderId = senderElementId(senderKey);
+    let group = document.getElementById(`sender-group-${senderId}`);
+    if (!group) {
+      group = createSenderGroup(senderKey, data.display_name || senderKey);
+      list.appendChild(group);
+    }
+    const emailsDiv = group.querySelector(".sender-emails");
+    data.emails.forEach((email) => {
+      emailsDiv.appendChild(createEmailRow(senderKey, email));
+      storedDetails[email.id] = {
+        id: email.id,
+        sender: senderKey,
+        header_link: email.header_link,
+        mailto_link: email.mailto_link,
+        body_link: email.body_link,
+        one_click: !!email.one_click,
+      };
+    });
+    const label = group.querySelector(".sender-name");
+    label.textContent = `${label.getAttribute("data-display-name")} (${emailsDiv.children.length})`;
+  });
+
+  saveEmailDetailsToStorage(storedDetails);
+  initializeUIState(); // Restore selections for the rows just added
+}
+
+/**
+ * Replaces the scanning indicator with Scan More / end of results
+ */
+function finishScanStream(result) {
+  const status = document.getElementById("scan-stream-status");
+  const footer = document.getElementById("scan-stream-footer");
+  if (status) status.remove();
+  markProcessedSenders();
+
+  if (renderedSenderCount === 0) {
+    const empty = document.createElement("p");
+    empty.className = "mt-10 text-center text-muted-foreground";
+    empty.textContent = "No emails with unsubscribe links found on this page.";
+    footer.appendChild(empty);
+  }
+
+  if (result.next_page_token) {
+    const params = new URLSearchParams({
+      token: result.next_page_token,
+      group_by: scanStreamOptions.groupBy,
+      stream: "1",
+    });
+    const wrapper = document.createElement("div");
+    wrapper.className = "mt-8 text-center";
+    const link = document.createElement("a");
+    link.href = `${scanStreamOptions.scanUrl}?${params}`;
+    link.id = "scan-more-button";
+    link.className = "btn btn-outline btn-md focus-ring btn-pulse";
+    link.textContent = "Scan More Emails";
+    link.addEventListener("click", () => setLoading("scan-more-button", "Scanning More..."));
+    wrapper.appendChild(link);
+    footer.appendChild(wrapper);
+  } else if (renderedSenderCount > 0) {
+    const end = document.createElement("div");
+    end.className = "mt-10 text-center text-muted-foreground flex flex-col items-center";
+    end.innerHTML = `
+      <svg xmlns="http://www.w3.org/2000/svg" class="h-8 w-8 mb-2" fill="none" viewBox="0 0 24 24" stroke="currentColor" stroke-width="1.5">
+          <path stroke-linecap="round" stroke-linejoin="round" d="M5 13l4 4L19 7" />
+      </svg>
+      <p>You've reached the end of the scannable emails.</p>`;
+    footer.appendChild(end);
+  }
+
+  if (result.errors) {
+    console.warn(`${result.errors} emails could not be fetched during the scan.`);
+  }
+}
+
+function showScanStreamError(message) {
+  const status = document.getElementById("scan-stream-status");
+  if (status) {
+    status.textContent = message;
+  }
+}
+
+/**
+ * Opens the scan stream and renders results as they arrive
+ * Called from the template
+ */
+function startScanStream(streamUrl, options) {
+  scanStreamOptions = options || {};
+  renderedSenderCount = 0;
+  const source = new EventSource(streamUrl);
+
+  source.addEventListener("senders", (event) => {
+    renderStreamedSenders(JSON.parse(event.data));
+  });
+
+  source.addEventListener("done", (event) => {
+    // Close before the server ends the response, or EventSource reconnects and scans again
+    source.close();
+    finishScanStream(JSON.parse(event.data));
+  });
+
+  source.addEventListener("error", (event) => {
+    source.close();
+    // Server-sent `error` events carry a message; connection failures (e.g. a 401) don't
+    let message = "The scan was interrupted. Please refresh the page to try again.";
+    if (event.data) {
+      try {
+        message = `Scan failed: ${JSON.parse(event.data).error}`;
+      } catch (e) {
+        console.error("Error parsing scan stream error:", e);
+      }
+    }
+    showScanStreamError(message);
+  });
+}
+
+window.startScanStream = startScanStream;